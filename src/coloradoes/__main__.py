@@ -0,0 +1,57 @@
+import argparse
+
+from . import Coloradoes
+from .server import Server
+
+
+def _storage(options):
+    if options.storage == 'sqlite':
+        from .storage.sqlite import Storage
+        storage = Storage(options.path or ':memory:')
+    elif options.storage == 'lsm':
+        from .storage.lsm import Storage
+        storage = Storage(options.path or 'coloradoes-data')
+    else:
+        from .storage.memory import Storage
+        storage = Storage()
+    if options.appendonly:
+        from .storage.aof import Storage as AOFStorage
+        storage = AOFStorage(options.appendonly, storage,
+                fsync=options.appendfsync)
+    return storage
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m coloradoes',
+            description='Serves a Coloradoes database over the Redis '
+            'protocol.')
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--maxclients', type=int, default=10000)
+    parser.add_argument('--client-output-limit', type=int, default=1 << 20,
+            help='stop reading from a client while it has this many bytes '
+            'of unread replies')
+    parser.add_argument('--storage', choices=('memory', 'sqlite', 'lsm'),
+            default='memory')
+    parser.add_argument('--path', help='database file or directory')
+    parser.add_argument('--appendonly', metavar='PATH',
+            help='log writes to an append only file')
+    parser.add_argument('--appendfsync', choices=('always', 'everysec', 'no'),
+            default='everysec')
+    parser.add_argument('--maxmemory', type=int)
+    options = parser.parse_args()
+
+    db = Coloradoes(_storage(options), maxmemory=options.maxmemory)
+    server = Server(db, options.bind, options.port, options.maxclients,
+            options.client_output_limit)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close_all()
+        if hasattr(db.storage, 'close'):
+            db.storage.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,12 @@
+from collections import deque
 import struct
 import time
 
-from .types import t_string, t_list, t_set, t_zset, t_hash
+from .commands import COMMANDS
+from .eviction import Evictor, POLICY_LRU
+from .expiration import ExpiryIndex
+from .pipeline import Pipeline
+from .storage import prefix_end, to_bytes
 from .errors import *
 
 
@@ -9,13 +14,59 @@ class Coloradoes(object):
     STRUCT_KEY = '!ic'
     STRUCT_KEY_VALUE = '!icd'
     STRUCT_ID = '!i'
+    # records detached from the keyspace and waiting to be freed live under
+    # this prefix, outside of any database
+    LAZYFREE_PREFIX = struct.pack('!ic', -1, 'F')
 
-    def __init__(self, storage=None):
+    def __init__(self, storage=None, maxmemory=None,
+            maxmemory_policy=POLICY_LRU, maxmemory_samples=5,
+            key_cache_size=65536, active_expire_hz=10,
+            active_expire_budget=0.0025, lazyfree=False, lazyfree_batch=128,
+            id_block_size=1024):
         if storage is None:
             raise ValueError('A storage is required')
         super(Coloradoes, self).__init__()
         self.storage = storage
         self.database = 0
+        # nesting of the commands being run, housekeeping only happens at
+        # the outermost level
+        self.call_depth = 0
+        self.maxmemory = maxmemory
+        self.evictor = None
+        self.evicted_keys = 0
+        # decoded (id, type, expire) of recently used keys, per database
+        self.key_cache = {}
+        self.key_cache_size = key_cache_size
+        self.key_cache_hits = 0
+        self.key_cache_misses = 0
+        # expiry index swept by the active expire cycle, active_expire_hz
+        # times per second for at most active_expire_budget seconds
+        self.expires = ExpiryIndex()
+        self.active_expire_hz = active_expire_hz
+        self.active_expire_budget = active_expire_budget
+        self.last_expire_cycle = 0
+        self.expired_keys = 0
+        # when lazyfree is set, deleted values are detached from the keyspace
+        # and their records are freed lazyfree_batch at a time between
+        # commands
+        self.lazyfree = lazyfree
+        self.lazyfree_batch = lazyfree_batch
+        self.lazyfree_queue = deque(k[len(self.LAZYFREE_PREFIX):]
+                for k, _ in storage.scan(self.LAZYFREE_PREFIX))
+        self.lazyfree_freed = 0
+        # ids are reserved id_block_size at a time; only the highest
+        # reserved id is stored, so ids are never reused after a restart
+        self.id_block_size = id_block_size
+        self.id_blocks = {}
+        # calls and seconds spent, per command
+        self.command_calls = {}
+        # (database, key) -> [version, watchers] for the keys watched by a
+        # pipeline; the version is bumped whenever the key is written
+        self.watched_keys = {}
+        if maxmemory is not None:
+            self.evictor = Evictor(maxmemory_policy, maxmemory_samples)
+        if self.evictor is not None or active_expire_hz > 0:
+            self._load_keyspace()
 
     def set_database(self, database):
         self.database = database
@@ -25,15 +76,52 @@ class Coloradoes(object):
         if value:
             self.storage.set(target, value)
             self.storage.delete(source)
+            self._forget_record(source)
+            self._forget_record(target)
+
+    def _cache_key(self, key, entry):
+        if self.key_cache_size <= 0:
+            return
+        cache = self.key_cache.setdefault(self.database, {})
+        if key not in cache and len(cache) >= self.key_cache_size:
+            cache.popitem()
+        cache[key] = entry
+
+    def _forget_record(self, k):
+        # drops the cached entry of a raw keyspace record
+        if k[4:5] == 'K':
+            database, = struct.unpack(self.STRUCT_ID, k[:4])
+            self.key_cache.get(database, {}).pop(k[5:], None)
+
+    def clear_key_cache(self):
+        # needed after the storage was modified behind our back
+        self.key_cache = {}
+
+    def key_cache_stats(self):
+        total = self.key_cache_hits + self.key_cache_misses
+        return {
+            'hits': self.key_cache_hits,
+            'misses': self.key_cache_misses,
+            'hit_rate': float(self.key_cache_hits) / total if total else 0.0,
+            'size': sum(len(cache) for cache in self.key_cache.values()),
+        }
 
     def increment_by(self, key, increment):
-        id = int(self.storage.get(key) or 0) + increment
-        self.storage.set(key, str(id))
-        return id
+        value = self.storage.get(key)
+        if value is None:
+            value = 0
+        elif not isinstance(value, (int, long, float)):
+            value = type(increment)(to_bytes(value))
+        value += increment
+        self.storage.set(key, value)
+        return value
 
     def get(self, key):
         return self.storage.get(key)
 
+    def get_view(self, key):
+        return self.storage.get_view(key)
+
     def set(self, key, value):
         return self.storage.set(key, value)
 
@@ -43,68 +131,402 @@ class Coloradoes(object):
     def delete(self, key):
         return self.storage.delete(key)
 
+    def get_many(self, keys):
+        return self.storage.get_many(keys)
+
+    def set_many(self, items):
+        return self.storage.set_many(items)
+
+    def delete_many(self, keys):
+        return self.storage.delete_many(keys)
+
+    def range(self, start=None, end=None, limit=None):
+        return self.storage.range(start, end, limit)
+
+    def scan(self, prefix):
+        return self.storage.scan(prefix)
+
+    def delete_range(self, start=None, end=None):
+        return self.storage.delete_range(start, end)
+
+    def _load_keyspace(self):
+        # registers the keys already in the storage
+        for database in range(0, 17):
+            prefix = struct.pack(self.STRUCT_KEY, database, 'K')
+            for k, data in self.storage.scan(prefix):
+                id, _, expire = struct.unpack(self.STRUCT_KEY_VALUE, data)
+                key = k[len(prefix):]
+                if self.evictor is not None:
+                    self.evictor.add(database, key, expire or None)
+                if expire:
+                    self.expires.add(expire, database, key, id)
+
+    def active_expire_cycle(self, now=None):
+        # Deletes keys whose expire time has passed, oldest first, until
+        # none is left or the time budget is spent
+        if now is None:
+            now = time.time()
+        self.last_expire_cycle = now
+        deadline = now + self.active_expire_budget
+        expired = 0
+        checked = 0
+        database = self.database
+        try:
+            while True:
+                entry = self.expires.pop_due(now)
+                if entry is None:
+                    break
+                expire, self.database, key, id = entry
+                if self.get_key(key, delete_expire=False)[::2] == (id, expire):
+                    self.delete_key(key)
+                    expired += 1
+                checked += 1
+                if checked % 16 == 0 and time.time() > deadline:
+                    break
+        finally:
+            self.database = database
+        self.expired_keys += expired
+        return expired
+
+    def lazyfree_step(self, batch=None):
+        # Frees up to `batch` records of detached values, returns how many
+        freed = 0
+        batch = batch or self.lazyfree_batch
+        while self.lazyfree_queue and freed < batch:
+            prefix = self.lazyfree_queue[0]
+            remaining = batch - freed
+            keys = self.storage.range(prefix, prefix_end(prefix), remaining)
+            if keys:
+                # the batch is contiguous, nothing sorts between the last key
+                # and the same key followed by a NUL
+                self.storage.delete_range(prefix, keys[-1][0] + '\0')
+                freed += len(keys)
+            if len(keys) < remaining:
+                # the range is exhausted
+                self.lazyfree_queue.popleft()
+                self.storage.delete(self.LAZYFREE_PREFIX + prefix)
+        self.lazyfree_freed += freed
+        return freed
+
+    def lazyfree_flush(self):
+        while self.lazyfree_queue:
+            self.lazyfree_step()
+
+    def lazyfree_stats(self):
+        return {
+            'pending_objects': len(self.lazyfree_queue),
+            'freed_records': self.lazyfree_freed,
+        }
+
+    def _cron(self):
+        if self.active_expire_hz > 0:
+            now = time.time()
+            if now - self.last_expire_cycle >= 1.0 / self.active_expire_hz:
+                self.active_expire_cycle(now)
+        if self.lazyfree_queue:
+            self.lazyfree_step()
+
+    def housekeeping(self):
+        # for callers that may stay idle, between commands
+        if self.call_depth > 0:
+            return
+        self.storage.begin()
+        try:
+            self._cron()
+        finally:
+            self.storage.commit()
+
+    def set_expire(self, key, expire):
+        id, type = self.get_key(key)[:2]
+        if id is None:
+            return False
+        if expire is not None and expire <= time.time():
+            self.delete_key(key, id=id, type=type)
+            return True
+        self.storage.set(struct.pack(self.STRUCT_KEY, self.database, 'K') +
+                key, struct.pack(self.STRUCT_KEY_VALUE, id, type, expire or 0))
+        self._cache_key(key, (id, type, expire))
+        if expire is not None:
+            self.expires.add(expire, self.database, key, id)
+        if self.evictor is not None:
+            self.evictor.set_expire(self.database, key, expire)
+        return True
+
+    def used_memory(self):
+        # the storage plus the eviction metadata, None when the storage does
+        # not tell
+        used = self.storage.used_memory()
+        if used is None or self.evictor is None:
+            return used
+        return used + self.evictor.used_memory()
+
+    def evict(self):
+        # Deletes sampled keys, with all their records, until the storage
+        # and the eviction metadata fit in maxmemory again
+        used = self.used_memory()
+        if used is None or used <= self.maxmemory:
+            return 0
+        evicted = 0
+        database = self.database
+        try:
+            while self.used_memory() > self.maxmemory:
+                candidate = self.evictor.candidate()
+                if candidate is None:
+                    break
+                self.database, key = candidate
+                if self.get_key(key, delete_expire=False)[0] is None:
+                    self.evictor.remove(*candidate)
+                    continue
+                # freed right away, lazily freed records would still count
+                self.delete_key(key, lazy=False)
+                evicted += 1
+        finally:
+            self.database = database
+        self.evicted_keys += evicted
+        return evicted
+
     def get_id(self):
-        return self.increment_by(struct.pack(self.STRUCT_ID, self.database)
-                + 'id', 1)
+        return self.get_ids(1)[0]
+
+    def get_ids(self, count):
+        # Takes what is left of the current block and reserves as many whole
+        # blocks as needed for the rest with a single counter update
+        block = self.id_blocks.get(self.database)
+        ids = []
+        if block is not None and block[0] <= block[1]:
+            taken = min(count, block[1] - block[0] + 1)
+            ids = range(block[0], block[0] + taken)
+            block[0] += taken
+        needed = count - len(ids)
+        if needed > 0:
+            size = -(-needed // self.id_block_size) * self.id_block_size
+            last = self.increment_by(struct.pack(self.STRUCT_ID,
+                        self.database) + 'id', size)
+            first = last - size + 1
+            ids.extend(range(first, first + needed))
+            self.id_blocks[self.database] = [first + needed, last]
+        return ids
 
-    def set_key(self, key, type, expire=None):
-        self.command_del(key)
+    def set_key(self, key, type, expire=None, check=True):
+        # check=False skips deleting the previous value, for callers that
+        # just found the key missing
+        if check:
+            self.command_del(key)
         id = self.get_id()
         k = struct.pack(self.STRUCT_KEY, self.database, 'K') + key
         self.storage.set(k, struct.pack(self.STRUCT_KEY_VALUE, id, type,
                     expire or 0))
+        self._cache_key(key, (id, type, expire))
+        if expire:
+            self.expires.add(expire, self.database, key, id)
+        if self.evictor is not None:
+            self.evictor.add(self.database, key, expire)
         return id
 
-    def delete_key(self, key, id=None, type=None):
+    def set_keys(self, keys, type):
+        # set_key(check=False) for many missing keys, without expire time,
+        # writing their records at once
+        ids = self.get_ids(len(keys))
+        prefix = struct.pack(self.STRUCT_KEY, self.database, 'K')
+        self.storage.set_many([(prefix + key, struct.pack(
+                    self.STRUCT_KEY_VALUE, id, type, 0))
+                for key, id in zip(keys, ids)])
+        for key, id in zip(keys, ids):
+            self._cache_key(key, (id, type, None))
+            if self.evictor is not None:
+                self.evictor.add(self.database, key, None)
+        return ids
+
+    def delete_key(self, key, id=None, type=None, lazy=None):
         if id is None or type is None:
             id, type = self.get_key(key, delete_expire=False)[:2]
-        self.storage.delete(struct.pack(self.STRUCT_KEY, self.database, 'K') +
-                key)
-        # Do any type cleanup here
-        # TODO: call type-specific clean up method
-        self.storage.delete(struct.pack('!ici', self.database, type, id))
+        self.delete_keys([(key, id, type)], lazy=lazy)
+
+    def delete_keys(self, entries, lazy=None):
+        # Deletes (key, id, type) entries, the keyspace records and inline
+        # strings with a single storage call
+        if lazy is None:
+            lazy = self.lazyfree
+        key_prefix = struct.pack(self.STRUCT_KEY, self.database, 'K')
+        records = []
+        for key, id, type in entries:
+            records.append(key_prefix + key)
+            # Every record of a value lives under its (database, type, id)
+            # prefix
+            prefix = struct.pack('!ici', self.database, type, id)
+            if type == 'S' and self.storage.exists(prefix):
+                # an inline string is a single record at the prefix itself
+                records.append(prefix)
+            elif lazy:
+                # ids are never reused, so the records are unreachable from
+                # now on; the queue is persisted to survive restarts
+                self.storage.set(self.LAZYFREE_PREFIX + prefix, '')
+                self.lazyfree_queue.append(prefix)
+            else:
+                self.storage.delete_range(prefix, prefix_end(prefix))
+            self._cache_key(key, (None, None, None))
+            if self.evictor is not None:
+                self.evictor.remove(self.database, key)
+        self.storage.delete_many(records)
+        if self.watched_keys:
+            # covers expired and evicted keys too
+            self.touch_keys([key for key, _, _ in entries])
 
     def get_key(self, key, delete_expire=True):
-        data = self.storage.get(struct.pack(self.STRUCT_KEY, self.database,
-                'K') + key)
-        id, type, expire = None, None, None
-        if data is not None:
-            id, type, expire = struct.unpack(self.STRUCT_KEY_VALUE, data)
-            if expire == 0:
-                expire = None
+        entry = self.key_cache.get(self.database, {}).get(key)
+        if entry is None:
+            self.key_cache_misses += 1
+            entry = self._key_entry(self.storage.get(struct.pack(
+                        self.STRUCT_KEY, self.database, 'K') + key))
+            self._cache_key(key, entry)
+        else:
+            self.key_cache_hits += 1
 
+        id, type, expire = entry
+        if id is not None:
             if delete_expire is True and (expire is not None and
                     expire < time.time()):
-                id, type, expire = None, None, None
                 self.delete_key(key=key, id=id, type=type)
+                id, type, expire = None, None, None
+            elif delete_expire is True and self.evictor is not None:
+                self.evictor.touch(self.database, key, expire)
 
         return id, type, expire
 
-    def command_select(self, database):
-        d = int(database)
-        if d >= 0 and d < 17:
-            self.set_database(d)
-            return True
-        else:
-            raise ValueError(INVALID_DB_INDEX)
-
-    def command_type(self, key):
-        type = self.get_key(key)[1]
-        if type is None:
-            return 'none'
-        if type == 'S':
-            return 'string'
-        if type == 'L':
-            return 'list'
-        raise Exception('Unknown type "%s"', type)
+    def get_keys(self, keys):
+        # get_key for many keys, the ones missing from the cache being read
+        # with a single storage call
+        cache = self.key_cache.get(self.database, {})
+        entries = [cache.get(key) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        self.key_cache_hits += len(keys) - len(missing)
+        self.key_cache_misses += len(missing)
+        if missing:
+            prefix = struct.pack(self.STRUCT_KEY, self.database, 'K')
+            records = self.storage.get_many([prefix + keys[i]
+                    for i in missing])
+            for i, data in zip(missing, records):
+                entries[i] = self._key_entry(data)
+                self._cache_key(keys[i], entries[i])
+
+        now = time.time()
+        expired = set()
+        for i, key in enumerate(keys):
+            id, type, expire = entries[i]
+            if id is None:
+                continue
+            if key in expired or (expire is not None and expire < now):
+                if key not in expired:
+                    self.delete_key(key=key, id=id, type=type)
+                    expired.add(key)
+                entries[i] = (None, None, None)
+            elif self.evictor is not None:
+                self.evictor.touch(self.database, key, expire)
+        return entries
+
+    def _key_entry(self, data):
+        # (id, type, expire) of a keyspace record
+        if data is None:
+            return (None, None, None)
+        entry = struct.unpack(self.STRUCT_KEY_VALUE, data)
+        if entry[2] == 0:
+            entry = entry[:2] + (None, )
+        return entry
+
+    def watch_key(self, database, key):
+        entry = self.watched_keys.setdefault((database, key), [0, 0])
+        entry[1] += 1
+        return entry[0]
+
+    def unwatch_key(self, database, key):
+        item = (database, key)
+        entry = self.watched_keys[item]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.watched_keys[item]
+
+    def key_version(self, database, key):
+        entry = self.watched_keys.get((database, key))
+        return None if entry is None else entry[0]
+
+    def touch_keys(self, keys):
+        for key in keys:
+            entry = self.watched_keys.get((self.database, key))
+            if entry is not None:
+                entry[0] += 1
+
+    def execute_many(self, commands, watched=None):
+        # Runs (name, args, kwargs) commands in a single storage batch, or
+        # nothing, returning None, when a watched key changed version
+        if watched and any(self.key_version(database, key) != version
+                for (database, key), version in watched.iteritems()):
+            return None
+        replies = []
+        self.storage.begin()
+        # housekeeping runs once, after the whole batch
+        self.call_depth += 1
+        try:
+            for name, args, kwargs in commands:
+                # the commands run nested, below the depth execute evicts at
+                if self.evictor is not None:
+                    self.evict()
+                try:
+                    replies.append(self.execute(name, *args, **kwargs))
+                except Exception as e:
+                    # like a failed command outside a batch, it does not
+                    # stop the others
+                    replies.append(e)
+        finally:
+            self.call_depth -= 1
+            if self.call_depth == 0:
+                self._cron()
+            self.storage.commit()
+        return replies
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def execute(self, name, *args, **kwargs):
+        command = COMMANDS.get(name)
+        if command is None:
+            raise ValueError(UNKNOWN_COMMAND.format(name))
+        if not command.check_arity(len(args)):
+            raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format(name.upper()))
+        # all the writes of a command are committed together
+        self.storage.begin()
+        self.call_depth += 1
+        start = time.time()
+        try:
+            if self.call_depth == 1 and self.evictor is not None:
+                self.evict()
+            if self.watched_keys and command.write:
+                self.touch_keys(command.keys(args))
+            return command.handler(self, *args, **kwargs)
+        finally:
+            stats = self.command_calls.get(name)
+            if stats is None:
+                stats = self.command_calls[name] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += time.time() - start
+            self.call_depth -= 1
+            if self.call_depth == 0:
+                self._cron()
+            self.storage.commit()
+
+    def command_stats(self):
+        return dict((name, {
+            'calls': calls,
+            'usec': int(elapsed * 1000000),
+            'usec_per_call': elapsed * 1000000 / calls,
+        }) for name, (calls, elapsed) in self.command_calls.iteritems())
 
     def __getattr__(self, attrName):
-        if attrName not in self.__dict__:
-            if attrName.startswith('command_'):
-                for t in (t_string, t_list, t_set, t_zset, t_hash):
-                    if hasattr(t, attrName):
-                        def func(*args, **kwargs):
-                            return getattr(t, attrName)(self, *args, **kwargs)
-                        return func
-            raise AttributeError()
-        return self.__dict__[attrName]
+        if attrName.startswith('command_') and attrName[8:] in COMMANDS:
+            name = attrName[8:]
+
+            def func(*args, **kwargs):
+                return self.execute(name, *args, **kwargs)
+            # the next lookups find it in the instance and skip __getattr__
+            self.__dict__[attrName] = func
+            return func
+        raise AttributeError(attrName)
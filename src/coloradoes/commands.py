@@ -0,0 +1,196 @@
+from collections import namedtuple
+import inspect
+
+from .types import t_keyspace, t_string, t_bitmap, t_hyperloglog, t_list, \
+        t_set, t_zset, t_hash, t_bloom
+
+READ = 'r'
+WRITE = 'w'
+# the reply is a number returned as a string or a boolean, sent to clients
+# as an integer
+INTEGER = 'i'
+# the reply only tells the command succeeded, sent to clients as +OK
+STATUS = 's'
+
+
+class Command(namedtuple('Command', ('name', 'handler', 'arity', 'flags',
+        'first_key', 'last_key', 'step', 'max_args'))):
+    # Arity counts the command name like Redis does, a negative arity is a
+    # minimum; max_args is the most arguments the handler takes, None when
+    # it takes any number of them. Keys are the arguments from first_key to
+    # last_key (negative counts from the end) every step arguments,
+    # positions counting the command name as 0; a first_key of 0 means the
+    # command has no keys.
+    __slots__ = ()
+
+    def check_arity(self, count):
+        # count does not include the command name
+        count += 1
+        if self.arity < 0:
+            return count >= -self.arity and (self.max_args is None or
+                    count - 1 <= self.max_args)
+        return count == self.arity
+
+    def keys(self, args):
+        if self.first_key == 0:
+            return []
+        last = self.last_key
+        if last < 0:
+            last += len(args) + 1
+        return list(args[self.first_key - 1:last:self.step])
+
+    @property
+    def write(self):
+        return WRITE in self.flags
+
+    def reply(self, value):
+        # the value sent to clients for a reply of the handler
+        if INTEGER in self.flags and isinstance(value, (str, bool)):
+            return int(value)
+        if STATUS in self.flags and value is not None and \
+                not isinstance(value, Exception):
+            return True
+        return value
+
+
+# (module, commands), every command being
+# (name, arity, flags, first key, last key, step)
+TABLE = (
+    (t_keyspace, (
+        ('select', 2, READ, 0, 0, 0),
+        ('type', 2, READ, 1, 1, 1),
+        ('expire', 3, WRITE, 1, 1, 1),
+        ('pexpire', 3, WRITE, 1, 1, 1),
+        ('expireat', 3, WRITE, 1, 1, 1),
+        ('persist', 2, WRITE, 1, 1, 1),
+        ('pttl', 2, READ, 1, 1, 1),
+    )),
+    # implemented with the strings, but they work on keys of any type
+    (t_string, (
+        ('ttl', 2, READ, 1, 1, 1),
+        ('del', -2, WRITE, 1, -1, 1),
+        ('unlink', -2, WRITE, 1, -1, 1),
+    )),
+    (t_string, (
+        ('setex', 4, WRITE, 1, 1, 1),
+        ('psetex', 4, WRITE, 1, 1, 1),
+        ('setnx', 3, WRITE + INTEGER, 1, 1, 1),
+        ('set', -3, WRITE, 1, 1, 1),
+        ('get', 2, READ, 1, 1, 1),
+        ('append', 3, WRITE, 1, 1, 1),
+        ('getrange', -2, READ, 1, 1, 1),
+        ('setrange', 4, WRITE, 1, 1, 1),
+        ('getset', 3, WRITE, 1, 1, 1),
+        ('incrby', 3, WRITE + INTEGER, 1, 1, 1),
+        ('incr', 2, WRITE + INTEGER, 1, 1, 1),
+        ('decr', 2, WRITE + INTEGER, 1, 1, 1),
+        ('decrby', 3, WRITE + INTEGER, 1, 1, 1),
+        ('incrbyfloat', 3, WRITE, 1, 1, 1),
+        ('strlen', 2, READ, 1, 1, 1),
+        ('mget', -2, READ, 1, -1, 1),
+        ('mset', -3, WRITE + STATUS, 1, -1, 2),
+        ('msetnx', -3, WRITE, 1, -1, 2),
+    )),
+    (t_bitmap, (
+        ('bitcount', -2, READ, 1, 1, 1),
+        ('bitop', -4, WRITE, 2, -1, 1),
+        ('getbit', 3, READ, 1, 1, 1),
+        ('setbit', 4, WRITE, 1, 1, 1),
+        ('bitpos', -3, READ, 1, 1, 1),
+        ('bitfield', -2, WRITE, 1, 1, 1),
+    )),
+    # PFCOUNT writes the cardinality it caches
+    (t_hyperloglog, (
+        ('pfadd', -2, WRITE, 1, 1, 1),
+        ('pfcount', -2, WRITE, 1, -1, 1),
+        ('pfmerge', -2, WRITE, 1, -1, 1),
+    )),
+    (t_list, (
+        ('lpush', 3, WRITE, 1, 1, 1),
+        ('rpush', 3, WRITE, 1, 1, 1),
+        ('lpushx', 3, WRITE, 1, 1, 1),
+        ('rpushx', 3, WRITE, 1, 1, 1),
+        ('lrange', 4, READ, 1, 1, 1),
+        ('lindex', 3, READ, 1, 1, 1),
+        ('linsert', 5, WRITE, 1, 1, 1),
+        ('llen', 2, READ, 1, 1, 1),
+        ('lpop', 2, WRITE, 1, 1, 1),
+        ('rpop', 2, WRITE, 1, 1, 1),
+        ('rpoplpush', 3, WRITE, 1, 2, 1),
+        ('lrem', 4, WRITE, 1, 1, 1),
+        ('lset', 4, WRITE, 1, 1, 1),
+        ('ltrim', 4, WRITE, 1, 1, 1),
+    )),
+    (t_set, (
+        ('sadd', -3, WRITE, 1, 1, 1),
+        ('smembers', 2, READ, 1, 1, 1),
+        ('scard', 2, READ, 1, 1, 1),
+        ('sismember', 3, READ + INTEGER, 1, 1, 1),
+        ('srandmember', -2, READ, 1, 1, 1),
+        ('spop', -2, WRITE, 1, 1, 1),
+        ('srem', -3, WRITE, 1, 1, 1),
+        ('smove', 4, WRITE, 1, 2, 1),
+        ('sunion', -2, READ, 1, -1, 1),
+        ('sunionstore', -3, WRITE, 1, -1, 1),
+        ('sinter', -2, READ, 1, -1, 1),
+        ('sinterstore', -3, WRITE, 1, -1, 1),
+        ('sdiff', -2, READ, 1, -1, 1),
+        ('sdiffstore', -3, WRITE, 1, -1, 1),
+    )),
+    (t_zset, (
+        ('zadd', -4, WRITE, 1, 1, 1),
+        ('zrem', 3, WRITE, 1, 1, 1),
+        ('zrange', -4, READ, 1, 1, 1),
+    )),
+    (t_hash, (
+        ('hset', 4, WRITE + INTEGER, 1, 1, 1),
+        ('hsetnx', 4, WRITE + INTEGER, 1, 1, 1),
+        ('hget', 3, READ, 1, 1, 1),
+        ('hdel', -3, WRITE, 1, 1, 1),
+        ('hexists', 3, READ + INTEGER, 1, 1, 1),
+        ('hgetall', 2, READ, 1, 1, 1),
+        ('hincrby', 4, WRITE, 1, 1, 1),
+        ('hincrbyfloat', 4, WRITE, 1, 1, 1),
+        ('hkeys', 2, READ, 1, 1, 1),
+        ('hlen', 2, READ, 1, 1, 1),
+        ('hmget', -3, READ, 1, 1, 1),
+        ('hmset', -4, WRITE, 1, 1, 1),
+        ('hvals', 2, READ, 1, 1, 1),
+    )),
+    # clients send these with a dot, BF.ADD being bf_add
+    (t_bloom, (
+        ('bf_reserve', -4, WRITE, 1, 1, 1),
+        ('bf_add', 3, WRITE, 1, 1, 1),
+        ('bf_madd', -3, WRITE, 1, 1, 1),
+        ('bf_exists', 3, READ, 1, 1, 1),
+        ('bf_mexists', -3, READ, 1, 1, 1),
+    )),
+)
+
+
+def _max_args(handler):
+    # the arguments of a handler, not counting db
+    spec = inspect.getargspec(handler)
+    return None if spec.varargs else len(spec.args) - 1
+
+
+def _build(table):
+    commands = {}
+    for module, entries in table:
+        for name, arity, flags, first_key, last_key, step in entries:
+            handler = getattr(module, 'command_' + name)
+            commands[name] = Command(name, handler, arity, flags, first_key,
+                    last_key, step, _max_args(handler))
+    return commands
+
+COMMANDS = _build(TABLE)
+
+
+def command_name(name):
+    # registry name of a command as sent by a client
+    return name.lower().replace('.', '_')
+
+
+def lookup(name):
+    # name as sent by a client, returns None for unknown commands
+    return COMMANDS.get(command_name(name))
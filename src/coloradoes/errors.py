@@ -4,3 +4,23 @@ WRONG_TYPE = 'Operation against a key holding the wrong kind of value'
 WRONG_NUMBER_OF_ARGUMENTS = 'wrong number of arguments for {}'
 INVALID_DB_INDEX = 'invalid DB index'
 OUT_OF_RANGE = '{} out of range'
+INVALID_SNAPSHOT = 'invalid snapshot: {}'
+INVALID_EVICTION_POLICY = 'invalid maxmemory policy "{}"'
+UNKNOWN_COMMAND = 'unknown command "{}"'
+WATCH_INSIDE_MULTI = 'WATCH inside MULTI is not allowed'
+CROSS_SLOT = '{} keys must hash to the same shard'
+PROTOCOL_ERROR = 'Protocol error: {}'
+NOT_AN_INTEGER = 'value is not an integer or out of range'
+INVALID_BIT_OFFSET = 'bit offset is not an integer or out of range'
+INVALID_BIT_VALUE = 'bit is not an integer or out of range'
+INVALID_BITFIELD_TYPE = 'Invalid bitfield type. Use something like i16 u8. ' \
+        'Note that u64 is not supported but i64 is.'
+NOT_A_FLOAT = 'value is not a valid float'
+INCREMENT_OVERFLOW = 'increment or decrement would overflow'
+INVALID_FLOAT_INCREMENT = 'increment would produce NaN or Infinity'
+INVALID_HLL = 'Key is not a valid HyperLogLog string value.'
+ITEM_EXISTS = 'item exists'
+FILTER_FULL = 'non scaling filter is full'
+INVALID_ERROR_RATE = 'error rate must be a number between 0 and 1'
+INVALID_CAPACITY = 'capacity must be larger than 0'
+INVALID_EXPIRE_TIME = "invalid expire time in '{}' command"
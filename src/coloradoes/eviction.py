@@ -0,0 +1,151 @@
+import random
+import time
+
+from .errors import *
+
+POLICY_LRU = 'allkeys-lru'
+POLICY_LFU = 'allkeys-lfu'
+POLICY_VOLATILE_TTL = 'volatile-ttl'
+POLICIES = (POLICY_LRU, POLICY_LFU, POLICY_VOLATILE_TTL)
+
+# Logarithmic access counter, as in Redis: a new key starts at LFU_INIT, the
+# probability of incrementing shrinks as the counter grows and the counter
+# decays by one every LFU_DECAY_TIME seconds without access.
+LFU_INIT = 5
+LFU_MAX = 255
+LFU_LOG_FACTOR = 10
+LFU_DECAY_TIME = 60
+
+# positions in the per-key metadata list
+ACCESS_TIME = 0
+COUNTER = 1
+EXPIRE = 2
+# Memory taken by the metadata of a key besides the key itself, as measured
+# on CPython 2.7 64 bits: the (database, key) tuple, the metadata list and
+# its access time, and their entries in the dict and the sample set
+KEY_METADATA_SIZE = 320
+
+
+class SampleSet(object):
+    # A set supporting O(1) add, discard and random sampling
+    def __init__(self):
+        super(SampleSet, self).__init__()
+        self.items = []
+        self.positions = {}
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        position = self.positions.pop(item, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.positions[last] = position
+
+    def sample(self, count):
+        if len(self.items) <= count:
+            return list(self.items)
+        return [random.choice(self.items) for _ in range(0, count)]
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _lfu_decay(metadata, now):
+    periods = int((now - metadata[ACCESS_TIME]) / LFU_DECAY_TIME)
+    return max(0, metadata[COUNTER] - periods)
+
+
+def _lfu_increment(counter):
+    if counter >= LFU_MAX:
+        return counter
+    base = max(0, counter - LFU_INIT)
+    if random.random() < 1.0 / (base * LFU_LOG_FACTOR + 1):
+        return counter + 1
+    return counter
+
+
+class Evictor(object):
+    # Tracks access metadata for every user key, identified by its
+    # (database, key) pair, and picks eviction candidates by sampling. The
+    # metadata lives in memory, next to the storage rather than in the
+    # keyspace records, so reads do not turn into storage writes; the memory
+    # it takes is reported by used_memory() and counted against maxmemory.
+    def __init__(self, policy=POLICY_LRU, samples=5):
+        if policy not in POLICIES:
+            raise ValueError(INVALID_EVICTION_POLICY.format(policy))
+        super(Evictor, self).__init__()
+        self.policy = policy
+        self.samples = samples
+        self.metadata = {}
+        self.keys = SampleSet()
+        self.volatile = SampleSet()
+        self.used = 0
+
+    def used_memory(self):
+        return self.used
+
+    def add(self, database, key, expire=None):
+        item = (database, key)
+        if item not in self.metadata:
+            self.used += KEY_METADATA_SIZE + len(key)
+        self.metadata[item] = [time.time(), LFU_INIT, expire]
+        self.keys.add(item)
+        if expire is None:
+            self.volatile.discard(item)
+        else:
+            self.volatile.add(item)
+
+    def remove(self, database, key):
+        item = (database, key)
+        if self.metadata.pop(item, None) is not None:
+            self.used -= KEY_METADATA_SIZE + len(key)
+        self.keys.discard(item)
+        self.volatile.discard(item)
+
+    def set_expire(self, database, key, expire):
+        item = (database, key)
+        metadata = self.metadata.get(item)
+        if metadata is None:
+            self.add(database, key, expire)
+            return
+        metadata[EXPIRE] = expire
+        if expire is None:
+            self.volatile.discard(item)
+        else:
+            self.volatile.add(item)
+
+    def touch(self, database, key, expire=None):
+        metadata = self.metadata.get((database, key))
+        if metadata is None:
+            # a key that was already in the storage
+            self.add(database, key, expire)
+            return
+        now = time.time()
+        if self.policy == POLICY_LFU:
+            metadata[COUNTER] = _lfu_increment(_lfu_decay(metadata, now))
+        metadata[ACCESS_TIME] = now
+
+    def _score(self, metadata, now):
+        # the candidate with the lowest score is evicted first
+        if self.policy == POLICY_LFU:
+            return (_lfu_decay(metadata, now), metadata[ACCESS_TIME])
+        if self.policy == POLICY_VOLATILE_TTL:
+            return metadata[EXPIRE]
+        return metadata[ACCESS_TIME]
+
+    def candidate(self):
+        pool = self.volatile if self.policy == POLICY_VOLATILE_TTL else \
+                self.keys
+        now = time.time()
+        best, best_score = None, None
+        for item in pool.sample(self.samples):
+            score = self._score(self.metadata[item], now)
+            if best is None or score < best_score:
+                best, best_score = item, score
+        return best
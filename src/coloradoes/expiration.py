@@ -0,0 +1,25 @@
+import heapq
+
+
+class ExpiryIndex(object):
+    # Min-heap of (expire, database, key, id). Entries are never removed
+    # eagerly: a key that was deleted, overwritten or given another expire
+    # leaves a stale entry behind, which the caller recognizes by comparing
+    # the id and the expire with the keyspace record when it pops out.
+    def __init__(self):
+        super(ExpiryIndex, self).__init__()
+        self.heap = []
+
+    def add(self, expire, database, key, id):
+        heapq.heappush(self.heap, (expire, database, key, id))
+
+    def next_expire(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        if self.heap and self.heap[0][0] <= now:
+            return heapq.heappop(self.heap)
+        return None
+
+    def __len__(self):
+        return len(self.heap)
@@ -0,0 +1,126 @@
+import threading
+
+
+class RWLock(object):
+    # Shared/exclusive lock; waiting writers block new readers so writes are
+    # not starved by a steady stream of reads
+    def __init__(self):
+        super(RWLock, self).__init__()
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.condition.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+
+class _Held(object):
+    def __init__(self, locks, write):
+        super(_Held, self).__init__()
+        self.locks = locks
+        self.write = write
+
+    def release(self):
+        for lock in reversed(self.locks):
+            if self.write:
+                lock.release_write()
+            else:
+                lock.release_read()
+        self.locks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class StripedLocks(object):
+    # A fixed set of RWLocks shared by all the keys. Locks are always taken
+    # in stripe order, so commands locking several keys cannot deadlock.
+    def __init__(self, stripes=256):
+        super(StripedLocks, self).__init__()
+        self.stripes = [RWLock() for _ in range(0, stripes)]
+
+    def acquire(self, items, write):
+        count = len(self.stripes)
+        locks = [self.stripes[i] for i in
+                sorted(set(hash(item) % count for item in items))]
+        held = []
+        try:
+            for lock in locks:
+                if write:
+                    lock.acquire_write()
+                else:
+                    lock.acquire_read()
+                held.append(lock)
+        except BaseException:
+            _Held(held, write).release()
+            raise
+        return _Held(held, write)
+
+    def acquire_all(self):
+        return self.acquire(range(0, len(self.stripes)), True)
+
+
+class Synchronized(object):
+    # Proxy serializing every method call of the wrapped object
+    def __init__(self, wrapped, lock=None):
+        super(Synchronized, self).__init__()
+        self._wrapped = wrapped
+        self._lock = threading.RLock() if lock is None else lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._wrapped, name)
+        if not callable(attr):
+            return attr
+        lock = self._lock
+
+        def method(*args, **kwargs):
+            with lock:
+                return attr(*args, **kwargs)
+        self.__dict__[name] = method
+        return method
+
+
+class SynchronizedTransactions(Synchronized):
+    # Synchronized proxy of a storage whose begin()/commit() batch is shared
+    # by every thread: the lock is also held from begin() to the matching
+    # commit(), so a batch only holds the writes of one thread, is committed
+    # when its command returns and is not read by the others before
+    def begin(self):
+        self._lock.acquire()
+        try:
+            self._wrapped.begin()
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def commit(self):
+        try:
+            self._wrapped.commit()
+        finally:
+            self._lock.release()
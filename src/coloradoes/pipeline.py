@@ -0,0 +1,66 @@
+from .commands import COMMANDS
+from .errors import *
+
+
+class Pipeline(object):
+    # Queues commands and runs them in one go, inside a single storage
+    # batch, so persistent storages commit once per batch instead of once
+    # per command. Keys watched before execute() make it abort, returning
+    # None, if another client modified them in the meantime.
+    def __init__(self, db):
+        super(Pipeline, self).__init__()
+        self.db = db
+        self.queue = []
+        self.watched = {}
+
+    def watch(self, *keys):
+        if self.queue:
+            raise ValueError(WATCH_INSIDE_MULTI)
+        for key in keys:
+            item = (self.db.database, key)
+            if item not in self.watched:
+                self.watched[item] = self.db.watch_key(*item)
+        return True
+
+    def unwatch(self):
+        for database, key in self.watched:
+            self.db.unwatch_key(database, key)
+        self.watched = {}
+        return True
+
+    def queue_command(self, name, *args, **kwargs):
+        command = COMMANDS.get(name)
+        if command is None:
+            raise ValueError(UNKNOWN_COMMAND.format(name))
+        if not command.check_arity(len(args)):
+            raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format(name.upper()))
+        self.queue.append((name, args, kwargs))
+        return self
+
+    def discard(self):
+        self.queue = []
+        self.unwatch()
+        return True
+
+    def execute(self):
+        # Replies come back in order; a command that fails has the raised
+        # exception as its reply and does not stop the others
+        queue, watched = self.queue, self.watched
+        self.queue, self.watched = [], {}
+        try:
+            return self.db.execute_many(queue, watched)
+        finally:
+            for database, key in watched:
+                self.db.unwatch_key(database, key)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __getattr__(self, attrName):
+        if attrName.startswith('command_') and attrName[8:] in COMMANDS:
+            name = attrName[8:]
+
+            def func(*args, **kwargs):
+                return self.queue_command(name, *args, **kwargs)
+            return func
+        raise AttributeError(attrName)
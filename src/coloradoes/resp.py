@@ -0,0 +1,155 @@
+from .errors import *
+
+CRLF = '\r\n'
+NULL = {2: '$-1\r\n', 3: '_\r\n'}
+NULL_ARRAY = {2: '*-1\r\n', 3: '_\r\n'}
+
+
+class ProtocolError(ValueError):
+    # commands parsed before the bad frame, answered before the error
+    commands = ()
+
+
+class Reader(object):
+    # Incremental request parser. Received data is appended to a single
+    # bytearray and parsed in place through a memoryview, keeping the offset
+    # of the first unparsed byte; a frame split across reads is simply
+    # parsed again once the rest of it has arrived. Parsed bytes are dropped
+    # once per feed() instead of once per command. Arguments are copied out
+    # exactly once, as the str the commands work with.
+    # Both multibulk requests and inline commands are accepted.
+    def __init__(self):
+        super(Reader, self).__init__()
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def feed(self, data):
+        if self.offset:
+            del self.buffer[:self.offset]
+            self.offset = 0
+        self.buffer += data
+
+    def gets(self):
+        # Returns the next complete command, or None until more data arrives
+        commands = self._parse(1)
+        return commands[0] if commands else None
+
+    def parse(self):
+        # Returns every complete command received so far
+        return self._parse(None)
+
+    def _parse(self, limit):
+        buffer = self.buffer
+        size = len(buffer)
+        view = memoryview(buffer)
+        commands = []
+        offset = self.offset
+        error = None
+        while offset < size and (limit is None or len(commands) < limit):
+            end = buffer.find(CRLF, offset)
+            if end == -1:
+                break
+            if buffer[offset] != 42:  # '*'
+                args = str(view[offset:end].tobytes()).split()
+                offset = end + 2
+                if args:
+                    commands.append(args)
+                continue
+            try:
+                count = int(buffer[offset + 1:end])
+            except ValueError:
+                error = ProtocolError(PROTOCOL_ERROR.format('invalid '
+                        'multibulk length'))
+                break
+            position = end + 2
+            args = []
+            for _ in xrange(0, count):
+                end = buffer.find(CRLF, position)
+                if end == -1:
+                    break
+                if buffer[position] != 36:  # '$'
+                    error = ProtocolError(PROTOCOL_ERROR.format("expected "
+                            "'$', got '%s'" % chr(buffer[position])))
+                    break
+                try:
+                    length = int(buffer[position + 1:end])
+                except ValueError:
+                    error = ProtocolError(PROTOCOL_ERROR.format('invalid '
+                            'bulk length'))
+                    break
+                start = end + 2
+                position = start + length + 2
+                if position > size:
+                    break
+                args.append(view[start:start + length].tobytes())
+            else:
+                offset = position
+                if args:
+                    commands.append(args)
+                continue
+            # incomplete frame, or a bad one
+            break
+        self.offset = offset
+        if error is not None:
+            # the commands before the bad frame are answered first
+            error.commands = commands
+            raise error
+        return commands
+
+
+def encode_error(message):
+    return '-' + message.replace(CRLF, ' ') + CRLF
+
+
+def encode_into(out, value, protocol=2):
+    # Appends the reply for a Python value to the `out` bytearray: True is
+    # +OK, numbers are integers, floats are doubles on RESP3 and bulk
+    # strings on RESP2, dicts are maps on RESP3 and flat arrays on RESP2,
+    # None is a null and exceptions are errors. Items of
+    # lists are written one after the other, without intermediate strings.
+    if value is None:
+        out += NULL[protocol]
+    elif value is True:
+        out += '+OK\r\n'
+    elif value is False:
+        out += ':0\r\n'
+    elif isinstance(value, (int, long)):
+        out += ':%d\r\n' % value
+    elif isinstance(value, str):
+        out += '$%d\r\n' % len(value)
+        out += value
+        out += CRLF
+    elif isinstance(value, dict):
+        # a map on RESP3, a flat array of keys and values on RESP2
+        out += '%%%d\r\n' % len(value) if protocol == 3 else \
+                '*%d\r\n' % (len(value) * 2)
+        for key, item in value.iteritems():
+            encode_into(out, key, protocol)
+            encode_into(out, item, protocol)
+    elif isinstance(value, (list, tuple, set)):
+        out += '*%d\r\n' % len(value)
+        for item in value:
+            if isinstance(item, str):
+                out += '$%d\r\n' % len(item)
+                out += item
+                out += CRLF
+            else:
+                encode_into(out, item, protocol)
+    elif isinstance(value, float):
+        if protocol == 3:
+            out += ',%r\r\n' % value
+        else:
+            encode_into(out, repr(value), protocol)
+    elif isinstance(value, Exception):
+        message = str(value)
+        if message == WRONG_TYPE:
+            out += encode_error('WRONGTYPE ' + message)
+        else:
+            out += encode_error('ERR ' + message)
+    else:
+        encode_into(out, str(value), protocol)
+    return out
+
+
+def encode(value, protocol=2):
+    return str(encode_into(bytearray(), value, protocol))
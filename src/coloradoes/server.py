@@ -0,0 +1,247 @@
+from collections import OrderedDict
+import asyncore
+import socket
+
+from .commands import COMMANDS, command_name
+from .errors import *
+from .resp import CRLF, NULL_ARRAY, ProtocolError, Reader, encode, \
+        encode_error, encode_into
+
+READ_SIZE = 65536
+
+
+class Connection(asyncore.dispatcher):
+    # A client. Every complete command in the input is run as soon as it is
+    # read, so pipelined requests are answered in one write; input is not
+    # read while more than output_limit bytes of replies wait to be sent.
+    def __init__(self, server, sock):
+        asyncore.dispatcher.__init__(self, sock, map=server.map)
+        self.server = server
+        self.reader = Reader()
+        # replies are encoded straight into this buffer
+        self.output = bytearray()
+        self.database = 0
+        self.protocol = 2
+        self.pipeline = None
+        self.multi = False
+        self.multi_error = False
+        self.closing = False
+
+    def readable(self):
+        return not self.closing and \
+                len(self.output) < self.server.output_limit
+
+    def writable(self):
+        return len(self.output) > 0
+
+    def handle_read(self):
+        data = self.recv(READ_SIZE)
+        if not data:
+            return
+        self.reader.feed(data)
+        error = None
+        try:
+            commands = self.reader.parse()
+        except ProtocolError as e:
+            # the commands before the bad frame still run
+            commands = e.commands
+            error = e
+        for args in commands:
+            if self.closing:
+                break
+            self.server.dispatch(self, args)
+        if error is not None and not self.closing:
+            self.output += encode_error('ERR ' + str(error))
+            self.closing = True
+        if self.closing and not self.output:
+            self.handle_close()
+
+    def handle_write(self):
+        sent = self.send(memoryview(self.output))
+        del self.output[:sent]
+        if self.closing and not self.output:
+            self.handle_close()
+
+    def handle_close(self):
+        if self.pipeline is not None:
+            self.pipeline.discard()
+            self.pipeline = None
+        self.server.clients.discard(self)
+        self.close()
+
+    def handle_error(self):
+        self.handle_close()
+
+
+class Server(asyncore.dispatcher):
+    # RESP server in front of a single Coloradoes. Clients are served one
+    # command at a time from a single thread, each with its own selected
+    # database, protocol version and MULTI state.
+    def __init__(self, db, host='127.0.0.1', port=6379, maxclients=10000,
+            output_limit=1 << 20):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+        self.db = db
+        self.maxclients = maxclients
+        self.output_limit = output_limit
+        self.clients = set()
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(511)
+        self.address = self.socket.getsockname()
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is None:
+            return
+        sock, _ = pair
+        if len(self.clients) >= self.maxclients:
+            try:
+                sock.sendall(encode_error('ERR max number of clients '
+                        'reached'))
+            finally:
+                sock.close()
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.clients.add(Connection(self, sock))
+
+    def serve_forever(self, timeout=0.1):
+        # keys expire and lazily freed values are reclaimed even when no
+        # command comes in
+        while self.map:
+            asyncore.loop(timeout, True, self.map, 1)
+            self.db.housekeeping()
+
+    def close_all(self):
+        for client in list(self.clients):
+            client.handle_close()
+        self.close()
+
+    def dispatch(self, connection, args):
+        # runs a command and writes its reply to the connection
+        connection.output += self._run(connection, args)
+
+    def _run(self, connection, args):
+        # returns the encoded reply, or '' when it was already encoded into
+        # the output buffer
+        name = command_name(args[0])
+        args = args[1:]
+        handler = getattr(self, 'server_' + name, None)
+        if handler is not None:
+            if connection.multi and name not in ('exec', 'discard', 'multi',
+                    'watch'):
+                connection.multi_error = True
+                return encode_error('ERR %s is not allowed in MULTI' %
+                        name.upper())
+            try:
+                return handler(connection, *args)
+            except TypeError:
+                return encode_error('ERR ' +
+                        WRONG_NUMBER_OF_ARGUMENTS.format(name.upper()))
+        if name not in COMMANDS:
+            connection.multi_error = connection.multi
+            return encode_error('ERR unknown command \'%s\'' % name)
+        if not COMMANDS[name].check_arity(len(args)):
+            connection.multi_error = connection.multi
+            return encode_error('ERR ' +
+                    WRONG_NUMBER_OF_ARGUMENTS.format(name.upper()))
+        if connection.multi:
+            connection.pipeline.queue_command(name, *args)
+            return '+QUEUED' + CRLF
+        db = self.db
+        db.set_database(connection.database)
+        try:
+            reply = COMMANDS[name].reply(db.execute(name, *args))
+        except Exception as e:
+            reply = e
+        finally:
+            connection.database = db.database
+        encode_into(connection.output, reply, connection.protocol)
+        return ''
+
+    # Commands handled by the server itself
+
+    def server_ping(self, connection, message=None):
+        if message is None:
+            return '+PONG' + CRLF
+        return encode(message)
+
+    def server_echo(self, connection, message):
+        return encode(message)
+
+    def server_quit(self, connection):
+        connection.closing = True
+        return '+OK' + CRLF
+
+    def server_hello(self, connection, protocol=None, *args):
+        if protocol is not None:
+            if protocol not in ('2', '3'):
+                return encode_error('NOPROTO unsupported protocol version')
+            connection.protocol = int(protocol)
+        return encode(OrderedDict((('server', 'coloradoes'),
+                    ('proto', connection.protocol))), connection.protocol)
+
+    def server_command(self, connection, *args):
+        return encode([])
+
+    def server_config(self, connection, *args):
+        # no runtime configuration, but benchmarks ask for it
+        return encode([])
+
+    def server_multi(self, connection):
+        if connection.multi:
+            return encode_error('ERR MULTI calls can not be nested')
+        if connection.pipeline is None:
+            connection.pipeline = self.db.pipeline()
+        connection.multi = True
+        connection.multi_error = False
+        return '+OK' + CRLF
+
+    def server_exec(self, connection):
+        if not connection.multi:
+            return encode_error('ERR EXEC without MULTI')
+        pipeline = connection.pipeline
+        connection.multi = False
+        connection.pipeline = None
+        if connection.multi_error:
+            pipeline.discard()
+            return encode_error('EXECABORT Transaction discarded because of '
+                    'previous errors.')
+        commands = [COMMANDS[name] for name, _, _ in pipeline.queue]
+        db = self.db
+        db.set_database(connection.database)
+        try:
+            replies = pipeline.execute()
+        finally:
+            connection.database = db.database
+        if replies is None:
+            return NULL_ARRAY[connection.protocol]
+        replies = [command.reply(reply)
+                for command, reply in zip(commands, replies)]
+        encode_into(connection.output, replies, connection.protocol)
+        return ''
+
+    def server_discard(self, connection):
+        if not connection.multi:
+            return encode_error('ERR DISCARD without MULTI')
+        connection.pipeline.discard()
+        connection.pipeline = None
+        connection.multi = False
+        return '+OK' + CRLF
+
+    def server_watch(self, connection, *keys):
+        if connection.multi:
+            return encode_error('ERR ' + WATCH_INSIDE_MULTI)
+        if not keys:
+            return encode_error('ERR ' +
+                    WRONG_NUMBER_OF_ARGUMENTS.format('WATCH'))
+        if connection.pipeline is None:
+            connection.pipeline = self.db.pipeline()
+        self.db.set_database(connection.database)
+        return encode(connection.pipeline.watch(*keys))
+
+    def server_unwatch(self, connection):
+        if connection.pipeline is not None and not connection.multi:
+            connection.pipeline.unwatch()
+        return '+OK' + CRLF
@@ -0,0 +1,181 @@
+from multiprocessing.pool import ThreadPool
+
+from .coloradoes import Coloradoes
+from .commands import COMMANDS
+from .errors import *
+
+SLOTS = 16384
+
+
+def _crc16_table():
+    # CRC16-CCITT (XMODEM), the variant Redis Cluster uses for key slots
+    table = []
+    for byte in range(0, 256):
+        crc = byte << 8
+        for _ in range(0, 8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xffff
+            else:
+                crc = (crc << 1) & 0xffff
+        table.append(crc)
+    return table
+
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data):
+    crc = 0
+    table = CRC16_TABLE
+    for c in data:
+        crc = ((crc << 8) & 0xffff) ^ table[(crc >> 8) ^ ord(c)]
+    return crc
+
+
+def key_slot(key):
+    # Only the part between the first { and the following } is hashed when
+    # it is not empty, so keys sharing a {tag} end up in the same slot
+    start = key.find('{')
+    if start != -1:
+        end = key.find('}', start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return crc16(key) % SLOTS
+
+
+def _concat(shards, replies, positions, count):
+    # puts the replies of every shard back in the order of the keys
+    values = [None] * count
+    for shard, reply in zip(shards, replies):
+        for position, value in zip(positions[shard], reply):
+            values[position] = value
+    return values
+
+
+def _union(replies):
+    values = set()
+    for reply in replies:
+        values.update(reply)
+    return list(values)
+
+
+def _intersection(replies):
+    values = set(replies[0])
+    for reply in replies[1:]:
+        values.intersection_update(reply)
+    return list(values)
+
+
+class ShardedColoradoes(object):
+    # Routes every key to one of several Coloradoes instances, each with its
+    # own storage and ID counter, by hash slot. Slots are split in contiguous
+    # ranges between the shards.
+    # Commands whose keys live in a single shard run there. MGET, MSET, DEL,
+    # UNLINK, SUNION, SINTER and SDIFF are split per shard and the parts run
+    # in parallel; any other command spanning several shards is refused, use
+    # hash tags to keep those keys together.
+    def __init__(self, storages, **kwargs):
+        if not storages:
+            raise ValueError('At least one storage is required')
+        super(ShardedColoradoes, self).__init__()
+        self.shards = [Coloradoes(storage, **kwargs) for storage in storages]
+        self.slots = [slot * len(self.shards) // SLOTS
+                for slot in range(0, SLOTS)]
+        self.pool = ThreadPool(len(self.shards)) if len(self.shards) > 1 \
+                else None
+
+    def shard_for(self, key):
+        return self.shards[self.slots[key_slot(key)]]
+
+    def _run(self, calls):
+        # calls are (shard, name, args); each shard appears at most once so
+        # no instance is used by two threads at the same time
+        if self.pool is None or len(calls) == 1:
+            return [shard.execute(name, *args) for shard, name, args in calls]
+        return self.pool.map(lambda call: call[0].execute(call[1], *call[2]),
+                calls)
+
+    def _split(self, keys):
+        # shard -> positions of its keys, in first appearance order
+        positions = {}
+        order = []
+        for position, key in enumerate(keys):
+            shard = self.shard_for(key)
+            if shard not in positions:
+                positions[shard] = []
+                order.append(shard)
+            positions[shard].append(position)
+        return order, positions
+
+    def _mget(self, args):
+        order, positions = self._split(args)
+        replies = self._run([(shard, 'mget', [args[p] for p in
+                positions[shard]]) for shard in order])
+        return _concat(order, replies, positions, len(args))
+
+    def _mset(self, args):
+        if len(args) % 2 == 1:
+            raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format('MSET'))
+        order, positions = self._split(args[::2])
+        calls = []
+        for shard in order:
+            pairs = []
+            for p in positions[shard]:
+                pairs.extend(args[p * 2:p * 2 + 2])
+            calls.append((shard, 'mset', pairs))
+        return sum(self._run(calls))
+
+    def _per_shard(self, name, args):
+        order, positions = self._split(args)
+        return self._run([(shard, name, [args[p] for p in positions[shard]])
+                for shard in order])
+
+    def _sdiff(self, args):
+        first = self.shard_for(args[0])
+        replies = self._run([(first, 'smembers', [args[0]])])
+        if len(args) == 1:
+            return replies[0]
+        others = _union(self._per_shard('sunion', args[1:]))
+        return list(set(replies[0]).difference(others))
+
+    def execute(self, name, *args, **kwargs):
+        command = COMMANDS.get(name)
+        if command is None:
+            raise ValueError(UNKNOWN_COMMAND.format(name))
+        if not command.check_arity(len(args)):
+            raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format(name.upper()))
+        keys = command.keys(args)
+        if not keys:
+            # SELECT and other keyless commands apply to every shard
+            return self._run([(shard, name, args)
+                    for shard in self.shards])[0]
+        shards = set(self.shard_for(key) for key in keys)
+        if len(shards) == 1:
+            return shards.pop().execute(name, *args, **kwargs)
+        if name == 'mget':
+            return self._mget(args)
+        if name == 'mset':
+            return self._mset(args)
+        if name in ('del', 'unlink'):
+            return sum(self._per_shard(name, args))
+        if name == 'sunion':
+            return _union(self._per_shard(name, args))
+        if name == 'sinter':
+            return _intersection(self._per_shard(name, args))
+        if name == 'sdiff':
+            return self._sdiff(args)
+        raise ValueError(CROSS_SLOT.format(name.upper()))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+    def __getattr__(self, attrName):
+        if attrName.startswith('command_') and attrName[8:] in COMMANDS:
+            name = attrName[8:]
+
+            def func(*args, **kwargs):
+                return self.execute(name, *args, **kwargs)
+            self.__dict__[attrName] = func
+            return func
+        raise AttributeError(attrName)
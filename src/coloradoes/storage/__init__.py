@@ -0,0 +1,16 @@
+def prefix_end(prefix):
+    # Smallest key greater than every key starting with prefix, or None when
+    # there is no such key (empty prefix or a prefix made only of '\xff').
+    prefix = prefix.rstrip('\xff')
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def to_bytes(value):
+    # Serialized form of a value, for backends that cannot keep objects
+    if isinstance(value, str):
+        return value
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return str(value)
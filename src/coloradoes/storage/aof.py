@@ -0,0 +1,266 @@
+import os
+import struct
+import threading
+import time
+
+from . import to_bytes
+from .base import BaseStorage
+from .memory import Storage as MemoryStorage
+
+FSYNC_ALWAYS = 'always'
+FSYNC_EVERYSEC = 'everysec'
+FSYNC_NO = 'no'
+
+# operation, first argument length, second argument length
+STRUCT_RECORD = '!cII'
+RECORD_HEADER_SIZE = struct.calcsize(STRUCT_RECORD)
+OP_SET = 'S'
+OP_DELETE = 'D'
+OP_DELETE_RANGE = 'R'
+# length used for a missing delete_range bound
+NO_BOUND = 0xffffffff
+
+READ_CHUNK = 1 << 20
+
+
+def _fsync(fd):
+    try:
+        os.fsync(fd)
+    except OSError:
+        # the file was replaced by a rewrite in the meantime
+        pass
+
+
+def _record(op, first, second=''):
+    if second is None:
+        return struct.pack(STRUCT_RECORD, op, len(first), NO_BOUND) + first
+    return struct.pack(STRUCT_RECORD, op, len(first), len(second)) + \
+            first + second
+
+
+class Storage(BaseStorage):
+    # Wraps another storage and logs every write to an append only file.
+    # Writes are buffered between begin() and commit() and reach the file
+    # together, so a command costs at most one write and one fsync.
+    transactional = True
+
+    def __init__(self, path, storage=None, fsync=FSYNC_EVERYSEC,
+            rewrite_percentage=100, rewrite_min_size=64 << 20):
+        if fsync not in (FSYNC_ALWAYS, FSYNC_EVERYSEC, FSYNC_NO):
+            raise ValueError('Invalid fsync policy "%s"' % fsync)
+        super(Storage, self).__init__()
+        self.storage = MemoryStorage() if storage is None else storage
+        self.path = path
+        self.fsync = fsync
+        self.rewrite_percentage = rewrite_percentage
+        self.rewrite_min_size = rewrite_min_size
+        self.buffer = []
+        self.batch_depth = 0
+        self.lock = threading.Lock()
+        self.last_fsync = time.time()
+        self.fsync_thread = None
+        self.rewrite_thread = None
+        self.rewrite_buffer = None
+        self.replay()
+        self.file = open(path, 'ab')
+        self.size = self.base_size = self.file.tell()
+
+    def replay(self):
+        if not os.path.exists(self.path):
+            return 0
+        replayed = 0
+        valid = 0
+        sets = []
+        with open(self.path, 'rb') as fp:
+            data = ''
+            offset = 0
+            while True:
+                chunk = fp.read(READ_CHUNK)
+                if not chunk:
+                    break
+                data = data[offset:] + chunk
+                offset = 0
+                while len(data) - offset >= RECORD_HEADER_SIZE:
+                    op, first_len, second_len = struct.unpack_from(
+                            STRUCT_RECORD, data, offset)
+                    end = offset + RECORD_HEADER_SIZE + first_len
+                    if second_len != NO_BOUND:
+                        end += second_len
+                    if end > len(data):
+                        break
+                    start = offset + RECORD_HEADER_SIZE
+                    first = data[start:start + first_len]
+                    if op == OP_SET:
+                        # consecutive sets are applied in one batch
+                        sets.append((first, data[start + first_len:end]))
+                    else:
+                        if sets:
+                            self.storage.set_many(sets)
+                            sets = []
+                        if op == OP_DELETE:
+                            self.storage.delete(first)
+                        elif second_len == NO_BOUND:
+                            self.storage.delete_range(first or None, None)
+                        else:
+                            self.storage.delete_range(first or None,
+                                    data[start + first_len:end])
+                    offset = end
+                    valid += end - start + RECORD_HEADER_SIZE
+                    replayed += 1
+        if sets:
+            self.storage.set_many(sets)
+        if valid < os.path.getsize(self.path):
+            # a crash left a partial record at the end, drop it
+            with open(self.path, 'r+b') as fp:
+                fp.truncate(valid)
+        return replayed
+
+    def _log(self, record):
+        self.buffer.append(record)
+        if self.batch_depth == 0:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        data = ''.join(self.buffer)
+        self.buffer = []
+        with self.lock:
+            self.file.write(data)
+            self.file.flush()
+            self.size += len(data)
+            if self.rewrite_buffer is not None:
+                self.rewrite_buffer.append(data)
+            if self.fsync == FSYNC_ALWAYS:
+                os.fsync(self.file.fileno())
+            elif self.fsync == FSYNC_EVERYSEC:
+                self._fsync_everysec()
+        if (self.rewrite_min_size and self.size >= self.rewrite_min_size and
+                self.size - self.base_size >=
+                self.base_size * self.rewrite_percentage / 100):
+            self.rewrite()
+
+    def _fsync_everysec(self):
+        now = time.time()
+        if now - self.last_fsync < 1:
+            return
+        if self.fsync_thread is not None and self.fsync_thread.is_alive():
+            # the previous fsync is still running, do not pile up
+            return
+        self.last_fsync = now
+        self.fsync_thread = threading.Thread(target=_fsync,
+                args=(self.file.fileno(), ))
+        self.fsync_thread.daemon = True
+        self.fsync_thread.start()
+
+    def begin(self):
+        self.batch_depth += 1
+
+    def commit(self):
+        self.batch_depth -= 1
+        if self.batch_depth == 0:
+            self._flush()
+
+    def set(self, key, value):
+        value = to_bytes(value)
+        self.storage.set(key, value)
+        self._log(_record(OP_SET, key, value))
+
+    def set_many(self, items):
+        items = [(key, to_bytes(value)) for key, value in items]
+        self.storage.set_many(items)
+        self.buffer.extend(_record(OP_SET, key, value)
+                for key, value in items)
+        if self.batch_depth == 0:
+            self._flush()
+
+    def get_view(self, key):
+        return self.storage.get_view(key)
+
+    def used_memory(self):
+        return self.storage.used_memory()
+
+    def get(self, key):
+        return self.storage.get(key)
+
+    def get_many(self, keys):
+        return self.storage.get_many(keys)
+
+    def exists(self, key):
+        return self.storage.exists(key)
+
+    def delete(self, key):
+        if not self.storage.delete(key):
+            return False
+        self._log(_record(OP_DELETE, key))
+        return True
+
+    def delete_many(self, keys):
+        deleted = 0
+        for key in keys:
+            deleted += int(self.delete(key))
+        return deleted
+
+    def range(self, start=None, end=None, limit=None):
+        return self.storage.range(start, end, limit)
+
+    def scan(self, prefix):
+        return self.storage.scan(prefix)
+
+    def delete_range(self, start=None, end=None):
+        deleted = self.storage.delete_range(start, end)
+        if deleted:
+            self._log(_record(OP_DELETE_RANGE, start or '', end))
+        return deleted
+
+    def rewrite(self, background=True):
+        # Compacts the log into one set per live key. Writes committed while
+        # the new file is being written are kept aside and appended to it
+        # before it replaces the current log.
+        with self.lock:
+            if self.rewrite_buffer is not None:
+                return False
+            self.rewrite_buffer = []
+        items = self.storage.range()
+        if background:
+            self.rewrite_thread = threading.Thread(target=self._rewrite,
+                    args=(items, ))
+            self.rewrite_thread.daemon = True
+            self.rewrite_thread.start()
+        else:
+            self._rewrite(items)
+        return True
+
+    def _rewrite(self, items):
+        temp_path = self.path + '.rewrite'
+        with open(temp_path, 'wb') as fp:
+            chunk = []
+            for key, value in items:
+                chunk.append(_record(OP_SET, key, value))
+                if len(chunk) >= 1024:
+                    fp.write(''.join(chunk))
+                    chunk = []
+            fp.write(''.join(chunk))
+            with self.lock:
+                fp.write(''.join(self.rewrite_buffer))
+                fp.flush()
+                os.fsync(fp.fileno())
+                os.rename(temp_path, self.path)
+                self.file.close()
+                self.file = open(self.path, 'ab')
+                self.size = self.base_size = self.file.tell()
+                self.rewrite_buffer = None
+
+    def wait_rewrite(self):
+        if self.rewrite_thread is not None:
+            self.rewrite_thread.join()
+            self.rewrite_thread = None
+
+    def close(self):
+        self._flush()
+        self.wait_rewrite()
+        with self.lock:
+            self.file.flush()
+            if self.fsync != FSYNC_NO:
+                os.fsync(self.file.fileno())
+            self.file.close()
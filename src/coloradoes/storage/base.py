@@ -0,0 +1,43 @@
+from . import prefix_end, to_bytes
+
+
+class BaseStorage(object):
+    # Default implementations of the optional parts of the storage contract,
+    # built on top of get/set/delete. Backends that can do better (a single
+    # round trip, a single transaction) override them.
+
+    # whether begin() and commit() group the writes of every caller into a
+    # single transaction or buffer
+    transactional = False
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def used_memory(self):
+        # bytes held by the backend, or None when it cannot tell
+        return None
+
+    def get_view(self, key):
+        # A read-only buffer over the value; backends keeping values in
+        # memory return it without copying
+        value = self.get(key)
+        return None if value is None else memoryview(to_bytes(value))
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set_many(self, items):
+        for key, value in items:
+            self.set(key, value)
+
+    def delete_many(self, keys):
+        deleted = 0
+        for key in keys:
+            deleted += int(bool(self.delete(key)))
+        return deleted
+
+    def scan(self, prefix):
+        return self.range(prefix, prefix_end(prefix))
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+
+from . import to_bytes
+from .base import BaseStorage
+from .memory import SortedKeys
+
+_MISSING = object()
+
+
+class Storage(BaseStorage):
+    # Bounded LRU cache in front of another storage. Reads are served from
+    # the cache when possible (missing keys are cached too), writes go to
+    # the backend and update the cached entry, so the cache never holds a
+    # stale value. Keyspace records and collection info records are re-read
+    # by almost every command and end up being served from here.
+    def __init__(self, storage, size=65536):
+        super(Storage, self).__init__()
+        self.storage = storage
+        self.size = size
+        self.cache = OrderedDict()
+        # the cached keys in order, so delete_range only visits the ones in
+        # the range
+        self.index = SortedKeys()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        value = self.cache.pop(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            # move to the most recently used end
+            self.cache[key] = value
+        return value
+
+    def _store(self, key, value):
+        if self.cache.pop(key, _MISSING) is _MISSING:
+            self.index.add(key)
+        self.cache[key] = value
+        if len(self.cache) > self.size:
+            self.index.remove(self.cache.popitem(last=False)[0])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / total if total else 0.0,
+            'size': len(self.cache),
+        }
+
+    @property
+    def transactional(self):
+        return self.storage.transactional
+
+    def begin(self):
+        self.storage.begin()
+
+    def commit(self):
+        self.storage.commit()
+
+    def get_view(self, key):
+        return self.storage.get_view(key)
+
+    def used_memory(self):
+        return self.storage.used_memory()
+
+    def get(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            value = self.storage.get(key)
+            self._store(key, value)
+        return value
+
+    def get_many(self, keys):
+        values = [self._lookup(key) for key in keys]
+        missing = [key for key, value in zip(keys, values)
+                if value is _MISSING]
+        if missing:
+            fetched = dict(zip(missing, self.storage.get_many(missing)))
+            for key, value in fetched.iteritems():
+                self._store(key, value)
+            values = [fetched[key] if value is _MISSING else value
+                    for key, value in zip(keys, values)]
+        return values
+
+    def exists(self, key):
+        value = self.cache.get(key, _MISSING)
+        if value is _MISSING:
+            return self.storage.exists(key)
+        return value is not None
+
+    def set(self, key, value):
+        self.storage.set(key, value)
+        self._store(key, to_bytes(value))
+
+    def set_many(self, items):
+        items = list(items)
+        self.storage.set_many(items)
+        for key, value in items:
+            self._store(key, to_bytes(value))
+
+    def delete(self, key):
+        self._store(key, None)
+        return self.storage.delete(key)
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        for key in keys:
+            self._store(key, None)
+        return self.storage.delete_many(keys)
+
+    def range(self, start=None, end=None, limit=None):
+        return self.storage.range(start, end, limit)
+
+    def scan(self, prefix):
+        return self.storage.scan(prefix)
+
+    def delete_range(self, start=None, end=None):
+        for key in self.index.delete_range(start, end):
+            del self.cache[key]
+        return self.storage.delete_range(start, end)
@@ -0,0 +1,409 @@
+import bisect
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import struct
+import threading
+
+from . import to_bytes
+from .base import BaseStorage
+from .memory import Storage as MemoryStorage
+
+# Run file layout:
+#   records: (key length, value length, key, value)*, sorted by key; a value
+#            length of TOMBSTONE marks a deleted key. They are grouped in
+#            blocks of about BLOCK_SIZE bytes.
+#   index:   (key length, block offset, key) for the first record of every
+#            block
+#   bloom:   bit array
+#   footer:  index offset, bloom offset, record count, bloom hash count
+STRUCT_RECORD = '!II'
+RECORD_HEADER_SIZE = struct.calcsize(STRUCT_RECORD)
+STRUCT_INDEX = '!IQ'
+INDEX_HEADER_SIZE = struct.calcsize(STRUCT_INDEX)
+STRUCT_FOOTER = '!QQQI'
+FOOTER_SIZE = struct.calcsize(STRUCT_FOOTER)
+TOMBSTONE = 0xffffffff
+BLOCK_SIZE = 4096
+MANIFEST = 'MANIFEST'
+
+
+class BloomFilter(object):
+    def __init__(self, capacity=None, error_rate=0.01, bits=None, hashes=None):
+        super(BloomFilter, self).__init__()
+        if bits is None:
+            capacity = max(capacity, 1)
+            size = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+            bits = bytearray((size + 7) // 8)
+            hashes = max(1, int(round(float(size) / capacity * math.log(2))))
+        self.bits = bits
+        self.size = len(bits) * 8
+        self.hashes = hashes
+
+    def _positions(self, key):
+        # double hashing over the two halves of an md5 digest
+        h1, h2 = struct.unpack('!QQ', hashlib.md5(key).digest())
+        return [(h1 + i * h2) % self.size for i in range(0, self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class Run(object):
+    # An immutable sorted run file. Only the first key of every block and the
+    # bloom filter are kept in memory: a lookup reads a single block and a
+    # range reads the blocks it covers one at a time, so runs and
+    # compactions are not bound by the available memory.
+    def __init__(self, path):
+        super(Run, self).__init__()
+        self.path = path
+        self.name = os.path.basename(path)
+        self.fp = open(path, 'rb')
+        self.fp.seek(-FOOTER_SIZE, os.SEEK_END)
+        index_offset, bloom_offset, count, hashes = struct.unpack(
+                STRUCT_FOOTER, self.fp.read(FOOTER_SIZE))
+        self.index_offset = index_offset
+        self.count = count
+        self.size = os.path.getsize(path)
+        self.fp.seek(index_offset)
+        data = self.fp.read(bloom_offset - index_offset)
+        # first key and offset of every block
+        self.keys = []
+        self.offsets = []
+        offset = 0
+        while offset < len(data):
+            key_len, block_offset = struct.unpack_from(STRUCT_INDEX, data,
+                    offset)
+            offset += INDEX_HEADER_SIZE
+            self.keys.append(data[offset:offset + key_len])
+            self.offsets.append(block_offset)
+            offset += key_len
+        self.offsets.append(index_offset)
+        self.fp.seek(bloom_offset)
+        self.bloom = BloomFilter(bits=bytearray(self.fp.read(
+                        self.size - FOOTER_SIZE - bloom_offset)),
+                hashes=hashes)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def write(cls, path, items, error_rate, capacity):
+        # items is a sorted iterable of (key, value or None), written as it
+        # is consumed; capacity is at least the number of items, for the
+        # bloom filter
+        bloom = BloomFilter(capacity, error_rate)
+        index = []
+        count = 0
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as fp:
+            offset = 0
+            block = []
+            block_size = 0
+            for key, value in items:
+                if block_size >= BLOCK_SIZE:
+                    fp.write(''.join(block))
+                    block = []
+                    block_size = 0
+                if not block:
+                    index.append(struct.pack(STRUCT_INDEX, len(key), offset) +
+                            key)
+                bloom.add(key)
+                if value is None:
+                    record = struct.pack(STRUCT_RECORD, len(key), TOMBSTONE
+                            ) + key
+                else:
+                    record = struct.pack(STRUCT_RECORD, len(key), len(value)
+                            ) + key + value
+                block.append(record)
+                block_size += len(record)
+                offset += len(record)
+                count += 1
+            fp.write(''.join(block))
+            index_offset = offset
+            index_data = ''.join(index)
+            fp.write(index_data)
+            fp.write(str(bloom.bits))
+            fp.write(struct.pack(STRUCT_FOOTER, index_offset,
+                        index_offset + len(index_data), count,
+                        bloom.hashes))
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.rename(temp_path, path)
+        return cls(path)
+
+    def _block(self, number):
+        # the (key, value or None) records of a block
+        with self.lock:
+            self.fp.seek(self.offsets[number])
+            data = self.fp.read(self.offsets[number + 1] -
+                    self.offsets[number])
+        records = []
+        offset = 0
+        while offset < len(data):
+            key_len, value_len = struct.unpack_from(STRUCT_RECORD, data,
+                    offset)
+            offset += RECORD_HEADER_SIZE
+            key = data[offset:offset + key_len]
+            offset += key_len
+            if value_len == TOMBSTONE:
+                records.append((key, None))
+            else:
+                records.append((key, data[offset:offset + value_len]))
+                offset += value_len
+        return records
+
+    def _first_block(self, key):
+        # the block that would hold key
+        if key is None:
+            return 0
+        return max(0, bisect.bisect_right(self.keys, key) - 1)
+
+    def lookup(self, key):
+        # Returns (found, value); a found tombstone has a None value
+        if key not in self.bloom or not self.keys:
+            return False, None
+        for record_key, value in self._block(self._first_block(key)):
+            if record_key == key:
+                return True, value
+            if record_key > key:
+                break
+        return False, None
+
+    def range(self, start=None, end=None):
+        for number in xrange(self._first_block(start), len(self.keys)):
+            if end is not None and self.keys[number] >= end:
+                return
+            for key, value in self._block(number):
+                if start is not None and key < start:
+                    continue
+                if end is not None and key >= end:
+                    return
+                yield key, value
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.fp.close()
+
+
+def _tagged(age, items):
+    for key, value in items:
+        yield key, age, value
+
+
+def _merge(sources, start=None, end=None):
+    # sources are ordered newest first; for duplicated keys the newest wins
+    iterators = [_tagged(age, source.range(start, end))
+            for age, source in enumerate(sources)]
+    last = None
+    for key, _, value in heapq.merge(*iterators):
+        if key == last:
+            continue
+        last = key
+        yield key, value
+
+
+class _Memtable(MemoryStorage):
+    # A memory storage that keeps None values as tombstones
+    def set(self, key, value):
+        if key not in self.keys:
+            self.index.add(key)
+        self.keys[key] = value
+
+
+class Storage(BaseStorage):
+    # Log-structured merge tree: writes go to an in-memory table that is
+    # flushed to immutable sorted runs. Level 0 holds freshly flushed runs
+    # and is compacted once it has more than `fanout` of them; every deeper
+    # level is a single run `fanout` times larger than the previous one,
+    # merged into the next level when it outgrows that size.
+    # Writes still in the memtable are lost on a crash unless flush() was
+    # called; wrap the engine in storage.aof.Storage for a write-ahead log.
+    def __init__(self, path, memtable_size=4 << 20, fanout=4,
+            error_rate=0.01, background_compaction=True):
+        super(Storage, self).__init__()
+        self.path = path
+        self.memtable_size = memtable_size
+        self.fanout = fanout
+        self.error_rate = error_rate
+        self.background_compaction = background_compaction
+        self.memtable = _Memtable()
+        self.memtable_bytes = 0
+        self.lock = threading.RLock()
+        self.compaction_thread = None
+        self.levels = []
+        self.sequence = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        manifest = os.path.join(self.path, MANIFEST)
+        if not os.path.exists(manifest):
+            return
+        with open(manifest) as fp:
+            for line in fp:
+                names = line.split()
+                self.levels.append([Run(os.path.join(self.path, name))
+                        for name in names])
+                for name in names:
+                    self.sequence = max(self.sequence, int(name.split('.')[0]))
+
+    def _write_manifest(self):
+        manifest = os.path.join(self.path, MANIFEST)
+        with open(manifest + '.tmp', 'w') as fp:
+            for level in self.levels:
+                fp.write(' '.join(run.name for run in level) + '\n')
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.rename(manifest + '.tmp', manifest)
+
+    def _new_run_path(self):
+        self.sequence += 1
+        return os.path.join(self.path, '%012d.run' % self.sequence)
+
+    def _runs(self):
+        # newest first: level 0 from its last run, then deeper levels
+        runs = []
+        for level in self.levels:
+            runs.extend(reversed(level))
+        return runs
+
+    def _put(self, key, value):
+        if key in self.memtable.keys:
+            self.memtable_bytes -= len(key) + len(self.memtable.keys[key] or '')
+        self.memtable.set(key, value)
+        self.memtable_bytes += len(key) + len(value or '')
+        if self.memtable_bytes >= self.memtable_size:
+            self.flush()
+
+    def set(self, key, value):
+        with self.lock:
+            self._put(key, to_bytes(value))
+
+    def set_many(self, items):
+        with self.lock:
+            for key, value in items:
+                self._put(key, to_bytes(value))
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memtable.keys:
+                return self.memtable.keys[key]
+            for run in self._runs():
+                found, value = run.lookup(key)
+                if found:
+                    return value
+        return None
+
+    def exists(self, key):
+        return self.get(key) is not None
+
+    def delete(self, key):
+        with self.lock:
+            if self.get(key) is None:
+                return False
+            self._put(key, None)
+            return True
+
+    def range(self, start=None, end=None, limit=None):
+        with self.lock:
+            sources = [self.memtable] + self._runs()
+            items = ((key, value) for key, value in
+                    _merge(sources, start, end) if value is not None)
+            return list(itertools.islice(items, limit))
+
+    def delete_range(self, start=None, end=None):
+        with self.lock:
+            keys = [key for key, _ in self.range(start, end)]
+            for key in keys:
+                self._put(key, None)
+            return len(keys)
+
+    def flush(self):
+        with self.lock:
+            if not self.memtable.keys:
+                return
+            run = Run.write(self._new_run_path(), self.memtable.range(),
+                    self.error_rate, len(self.memtable.keys))
+            if not self.levels:
+                self.levels.append([])
+            self.levels[0].append(run)
+            self._write_manifest()
+            self.memtable = _Memtable()
+            self.memtable_bytes = 0
+        self._maybe_compact()
+
+    def _needs_compaction(self, number):
+        level = self.levels[number]
+        if number == 0:
+            return len(level) > self.fanout
+        return sum(run.size for run in level) > \
+                self.memtable_size * self.fanout ** (number + 1)
+
+    def _maybe_compact(self):
+        if not any(self._needs_compaction(number)
+                for number in range(0, len(self.levels))):
+            return
+        if not self.background_compaction:
+            self.compact()
+            return
+        if self.compaction_thread is not None and \
+                self.compaction_thread.is_alive():
+            return
+        self.compaction_thread = threading.Thread(target=self.compact)
+        self.compaction_thread.daemon = True
+        self.compaction_thread.start()
+
+    def compact(self):
+        while True:
+            with self.lock:
+                for number in range(0, len(self.levels)):
+                    if self._needs_compaction(number):
+                        break
+                else:
+                    return
+                if number + 1 == len(self.levels):
+                    self.levels.append([])
+                runs = list(self.levels[number])
+                target = list(self.levels[number + 1])
+                # nothing older can be shadowed, tombstones can be dropped
+                last = all(len(deeper) == 0
+                        for deeper in self.levels[number + 2:])
+                path = self._new_run_path()
+            items = _merge(list(reversed(runs)) + target)
+            if last:
+                items = ((key, value) for key, value in items
+                        if value is not None)
+            run = Run.write(path, items, self.error_rate,
+                    sum(len(run) for run in runs + target))
+            with self.lock:
+                # level 0 may have received new runs in the meantime
+                del self.levels[number][:len(runs)]
+                self.levels[number + 1] = [run]
+                self._write_manifest()
+                for old in runs + target:
+                    old.close()
+                    os.remove(old.path)
+
+    def wait_compaction(self):
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+            self.compaction_thread = None
+
+    def close(self):
+        self.flush()
+        self.wait_compaction()
+        for level in self.levels:
+            for run in level:
+                run.close()
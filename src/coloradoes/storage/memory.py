@@ -1,19 +1,242 @@
-class Storage(object):
+import bisect
+
+from .base import BaseStorage
+
+# Values of these types are kept as they are: binary data is neither copied
+# nor converted and numbers stay numbers
+NATIVE_TYPES = (str, bytearray, memoryview, int, long, float)
+NUMBER_SIZE = 8
+
+
+def _native(value):
+    return value if isinstance(value, NATIVE_TYPES) else str(value)
+
+
+def _size(value):
+    if isinstance(value, (int, long, float)):
+        return NUMBER_SIZE
+    return len(value)
+
+
+class SortedKeys(object):
+    # Keys in order, split in blocks of LOAD to 2 * LOAD keys, with the last
+    # key of every block in a separate list: finding a key takes two
+    # bisections, adding or removing one only shifts its block and a range
+    # walks the blocks it covers, whatever the number of keys.
+    LOAD = 1000
+
+    def __init__(self):
+        super(SortedKeys, self).__init__()
+        self.blocks = []
+        self.maxes = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for block in self.blocks:
+            for key in block:
+                yield key
+
+    def add(self, key):
+        blocks, maxes = self.blocks, self.maxes
+        self.size += 1
+        if not maxes:
+            blocks.append([key])
+            maxes.append(key)
+            return
+        i = bisect.bisect_left(maxes, key)
+        if i == len(maxes):
+            i -= 1
+            blocks[i].append(key)
+            maxes[i] = key
+        else:
+            bisect.insort(blocks[i], key)
+        block = blocks[i]
+        if len(block) > 2 * self.LOAD:
+            half = self.LOAD
+            blocks[i:i + 1] = [block[:half], block[half:]]
+            maxes[i:i + 1] = [block[half - 1], block[-1]]
+
+    def update(self, keys):
+        keys = sorted(keys)
+        if len(keys) * 8 < self.size:
+            for key in keys:
+                self.add(key)
+            return
+        # a large batch is merged with everything at once, timsort merging
+        # the two sorted runs in linear time
+        keys = list(self) + keys
+        keys.sort()
+        load = self.LOAD
+        self.blocks = [keys[i:i + load] for i in xrange(0, len(keys), load)]
+        self.maxes = [block[-1] for block in self.blocks]
+        self.size = len(keys)
+
+    def remove(self, key):
+        # the key must be there
+        blocks, maxes = self.blocks, self.maxes
+        i = bisect.bisect_left(maxes, key)
+        block = blocks[i]
+        del block[bisect.bisect_left(block, key)]
+        self.size -= 1
+        if len(block) >= self.LOAD // 2 or len(blocks) == 1:
+            self._shrunk(i)
+            return
+        # a small block is merged with a neighbour
+        j = i - 1 if i > 0 else i
+        merged = blocks[j] + blocks[j + 1]
+        blocks[j:j + 2] = [merged]
+        maxes[j:j + 2] = [merged[-1]]
+        if len(merged) > 2 * self.LOAD:
+            half = self.LOAD
+            blocks[j:j + 1] = [merged[:half], merged[half:]]
+            maxes[j:j + 1] = [merged[half - 1], merged[-1]]
+
+    def _shrunk(self, i):
+        # updates block i after keys were removed from it
+        if i >= len(self.blocks):
+            return
+        if self.blocks[i]:
+            self.maxes[i] = self.blocks[i][-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+
+    def _position(self, key):
+        # (block, offset) of the first key not lower than key
+        if key is None:
+            return 0, 0
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return i, 0
+        return i, bisect.bisect_left(self.blocks[i], key)
+
+    def range(self, start=None, end=None, limit=None):
+        # keys from start included to end excluded
+        blocks, maxes = self.blocks, self.maxes
+        i, j = self._position(start)
+        keys = []
+        while i < len(blocks) and (limit is None or len(keys) < limit):
+            block = blocks[i]
+            if end is not None and maxes[i] >= end:
+                keys.extend(block[j:bisect.bisect_left(block, end)])
+                break
+            keys.extend(block[j:])
+            i, j = i + 1, 0
+        if limit is not None:
+            del keys[limit:]
+        return keys
+
+    def delete_range(self, start=None, end=None):
+        # removes and returns the keys from start included to end excluded
+        blocks, maxes = self.blocks, self.maxes
+        i, j = self._position(start)
+        if end is None:
+            k, l = len(blocks), 0
+        else:
+            k, l = self._position(end)
+        if (i, j) >= (k, l):
+            return []
+        if i == k:
+            removed = blocks[i][j:l]
+            del blocks[i][j:l]
+        else:
+            removed = blocks[i][j:]
+            del blocks[i][j:]
+            for block in blocks[i + 1:k]:
+                removed.extend(block)
+            if k < len(blocks):
+                removed.extend(blocks[k][:l])
+                del blocks[k][:l]
+            del blocks[i + 1:k]
+            del maxes[i + 1:k]
+            self._shrunk(i + 1)
+        self._shrunk(i)
+        self.size -= len(removed)
+        return removed
+
+
+class Storage(BaseStorage):
     def __init__(self):
         super(Storage, self).__init__()
         self.keys = {}
+        # the keys in order, for ranges
+        self.index = SortedKeys()
+        # bytes held by keys and values
+        self.used = 0
+
+    def used_memory(self):
+        return self.used
 
     def set(self, key, value):
-        self.keys[key] = str(value)
+        value = _native(value)
+        if key not in self.keys:
+            self.index.add(key)
+            self.used += len(key)
+        else:
+            self.used -= _size(self.keys[key])
+        self.used += _size(value)
+        self.keys[key] = value
 
     def get(self, key):
         return self.keys[key] if key in self.keys else None
 
+    def get_view(self, key):
+        value = self.keys.get(key)
+        if value is None:
+            return None
+        if isinstance(value, memoryview):
+            return value
+        if isinstance(value, (str, bytearray)):
+            return memoryview(value)
+        return memoryview(str(value))
+
     def exists(self, key):
         return key in self.keys
 
     def delete(self, key):
         if key not in self.keys:
             return False
-        del self.keys[key]
+        self.used -= len(key) + _size(self.keys.pop(key))
+        self.index.remove(key)
         return True
+
+    def get_many(self, keys):
+        get = self.keys.get
+        return [get(key) for key in keys]
+
+    def set_many(self, items):
+        keys = self.keys
+        added = []
+        used = 0
+        for key, value in items:
+            value = _native(value)
+            if key not in keys:
+                added.append(key)
+                used += len(key)
+            else:
+                used -= _size(keys[key])
+            used += _size(value)
+            keys[key] = value
+        self.used += used
+        if added:
+            self.index.update(added)
+
+    def delete_many(self, keys):
+        existing = [key for key in set(keys) if key in self.keys]
+        for key in existing:
+            self.used -= len(key) + _size(self.keys.pop(key))
+            self.index.remove(key)
+        return len(existing)
+
+    def range(self, start=None, end=None, limit=None):
+        return [(key, self.keys[key])
+                for key in self.index.range(start, end, limit)]
+
+    def delete_range(self, start=None, end=None):
+        removed = self.index.delete_range(start, end)
+        for key in removed:
+            self.used -= len(key) + _size(self.keys.pop(key))
+        return len(removed)
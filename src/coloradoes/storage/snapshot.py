@@ -0,0 +1,133 @@
+import os
+import struct
+import zlib
+
+from . import to_bytes
+from ..errors import *
+
+MAGIC = 'CLRDSNAP'
+VERSION = 1
+STRUCT_HEADER = '!8sH'
+HEADER_SIZE = struct.calcsize(STRUCT_HEADER)
+# key length, value length
+STRUCT_RECORD = '!II'
+RECORD_HEADER_SIZE = struct.calcsize(STRUCT_RECORD)
+STRUCT_CHECKSUM = '!I'
+CHECKSUM_SIZE = struct.calcsize(STRUCT_CHECKSUM)
+# key length of the record closing the snapshot
+END_OF_SNAPSHOT = 0xffffffff
+
+WRITE_CHUNK = 1 << 20
+READ_CHUNK = 1 << 20
+LOAD_BATCH = 4096
+
+
+class SnapshotWriter(object):
+    # Streams raw (key, value) records to a file object, keeping a running
+    # CRC32 of everything written so far.
+    def __init__(self, fp):
+        super(SnapshotWriter, self).__init__()
+        self.fp = fp
+        self.crc = 0
+        self.chunk = []
+        self.chunk_size = 0
+        self.count = 0
+        self._write(struct.pack(STRUCT_HEADER, MAGIC, VERSION))
+
+    def _write(self, data):
+        self.chunk.append(data)
+        self.chunk_size += len(data)
+        if self.chunk_size >= WRITE_CHUNK:
+            self.flush()
+
+    def flush(self):
+        data = ''.join(self.chunk)
+        self.crc = zlib.crc32(data, self.crc)
+        self.fp.write(data)
+        self.chunk = []
+        self.chunk_size = 0
+
+    def write(self, key, value):
+        value = to_bytes(value)
+        self._write(struct.pack(STRUCT_RECORD, len(key), len(value)) + key +
+                value)
+        self.count += 1
+
+    def close(self):
+        self._write(struct.pack(STRUCT_RECORD, END_OF_SNAPSHOT, 0))
+        self.flush()
+        self.fp.write(struct.pack(STRUCT_CHECKSUM, self.crc & 0xffffffff))
+        self.fp.flush()
+
+
+def dump(storage, path):
+    # The snapshot is written next to its destination and renamed over it
+    # once complete, so a crash never leaves a truncated snapshot behind.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as fp:
+        writer = SnapshotWriter(fp)
+        for key, value in storage.range():
+            writer.write(key, value)
+        writer.close()
+        os.fsync(fp.fileno())
+    os.rename(temp_path, path)
+    return writer.count
+
+
+def load(storage, path):
+    # Records are inserted in batches through set_many while the checksum is
+    # computed, so a ValueError at the end means the storage holds a partial
+    # copy and must be discarded.
+    count = 0
+    with open(path, 'rb') as fp:
+        data = fp.read(READ_CHUNK)
+        if len(data) < HEADER_SIZE or struct.unpack_from(STRUCT_HEADER,
+                data)[0] != MAGIC:
+            raise ValueError(INVALID_SNAPSHOT.format('bad header'))
+        version = struct.unpack_from(STRUCT_HEADER, data)[1]
+        if version != VERSION:
+            raise ValueError(INVALID_SNAPSHOT.format('unknown version %d' %
+                        version))
+        crc = 0
+        offset = HEADER_SIZE
+        batch = []
+        while True:
+            if len(data) - offset < RECORD_HEADER_SIZE:
+                chunk = fp.read(READ_CHUNK)
+                if not chunk:
+                    raise ValueError(INVALID_SNAPSHOT.format('truncated'))
+                crc = zlib.crc32(buffer(data, 0, offset), crc)
+                data, offset = data[offset:] + chunk, 0
+                continue
+            key_len, value_len = struct.unpack_from(STRUCT_RECORD, data,
+                    offset)
+            if key_len == END_OF_SNAPSHOT:
+                offset += RECORD_HEADER_SIZE
+                break
+            start = offset + RECORD_HEADER_SIZE
+            end = start + key_len + value_len
+            if end > len(data):
+                chunk = fp.read(max(READ_CHUNK, end - len(data)))
+                if not chunk:
+                    raise ValueError(INVALID_SNAPSHOT.format('truncated'))
+                crc = zlib.crc32(buffer(data, 0, offset), crc)
+                data, offset = data[offset:] + chunk, 0
+                continue
+            batch.append((data[start:start + key_len],
+                        data[start + key_len:end]))
+            offset = end
+            if len(batch) >= LOAD_BATCH:
+                storage.set_many(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            storage.set_many(batch)
+            count += len(batch)
+        crc = zlib.crc32(buffer(data, 0, offset), crc)
+        checksum = data[offset:offset + CHECKSUM_SIZE]
+        if len(checksum) < CHECKSUM_SIZE:
+            checksum += fp.read(CHECKSUM_SIZE - len(checksum))
+        if len(checksum) < CHECKSUM_SIZE or struct.unpack(STRUCT_CHECKSUM,
+                checksum)[0] != crc & 0xffffffff:
+            raise ValueError(INVALID_SNAPSHOT.format('checksum mismatch'))
+    return count
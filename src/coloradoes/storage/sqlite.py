@@ -0,0 +1,103 @@
+import sqlite3
+
+from . import to_bytes
+from .base import BaseStorage
+
+# SQLite caps the number of host parameters in a statement
+MAX_PARAMETERS = 500
+
+
+class Storage(BaseStorage):
+    # Keys and values are stored as BLOBs in a WITHOUT ROWID table, so rows
+    # are clustered by key and range queries are index scans. Writes made
+    # between begin() and commit() share a single transaction; writes made
+    # outside of one are committed on their own.
+    transactional = True
+
+    def __init__(self, path=':memory:', synchronous='NORMAL'):
+        super(Storage, self).__init__()
+        # transactions are managed explicitly through begin/commit
+        self.connection = sqlite3.connect(path, isolation_level=None,
+                check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=%s' % synchronous)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS storage ('
+                'key BLOB PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID')
+        self.batch_depth = 0
+
+    def begin(self):
+        if self.batch_depth == 0:
+            self.connection.execute('BEGIN')
+        self.batch_depth += 1
+
+    def commit(self):
+        self.batch_depth -= 1
+        if self.batch_depth == 0:
+            self.connection.execute('COMMIT')
+
+    def set(self, key, value):
+        self.connection.execute('INSERT OR REPLACE INTO storage (key, value) '
+                'VALUES (?, ?)', (buffer(key), buffer(to_bytes(value))))
+
+    def set_many(self, items):
+        self.connection.executemany('INSERT OR REPLACE INTO storage (key, '
+                'value) VALUES (?, ?)', ((buffer(key), buffer(to_bytes(value)))
+                    for key, value in items))
+
+    def get(self, key):
+        row = self.connection.execute('SELECT value FROM storage WHERE key = ?',
+                (buffer(key), )).fetchone()
+        return None if row is None else str(row[0])
+
+    def get_many(self, keys):
+        keys = list(keys)
+        values = {}
+        for i in range(0, len(keys), MAX_PARAMETERS):
+            chunk = keys[i:i + MAX_PARAMETERS]
+            values.update((str(key), str(value)) for key, value in
+                    self.connection.execute('SELECT key, value FROM storage '
+                        'WHERE key IN (%s)' % ','.join('?' * len(chunk)),
+                        [buffer(key) for key in chunk]))
+        return [values.get(key) for key in keys]
+
+    def exists(self, key):
+        return self.connection.execute('SELECT 1 FROM storage WHERE key = ?',
+                (buffer(key), )).fetchone() is not None
+
+    def delete(self, key):
+        return self.connection.execute('DELETE FROM storage WHERE key = ?',
+                (buffer(key), )).rowcount > 0
+
+    def delete_many(self, keys):
+        return self.connection.executemany('DELETE FROM storage WHERE key = ?',
+                ((buffer(key), ) for key in keys)).rowcount
+
+    def _where(self, start, end):
+        clauses, parameters = [], []
+        if start is not None:
+            clauses.append('key >= ?')
+            parameters.append(buffer(start))
+        if end is not None:
+            clauses.append('key < ?')
+            parameters.append(buffer(end))
+        if not clauses:
+            return '', parameters
+        return ' WHERE ' + ' AND '.join(clauses), parameters
+
+    def range(self, start=None, end=None, limit=None):
+        where, parameters = self._where(start, end)
+        if limit is not None:
+            where += ' ORDER BY key LIMIT %d' % limit
+        else:
+            where += ' ORDER BY key'
+        return [(str(key), str(value)) for key, value in
+                self.connection.execute('SELECT key, value FROM storage' +
+                    where, parameters)]
+
+    def delete_range(self, start=None, end=None):
+        where, parameters = self._where(start, end)
+        return self.connection.execute('DELETE FROM storage' + where,
+                parameters).rowcount
+
+    def close(self):
+        self.connection.close()
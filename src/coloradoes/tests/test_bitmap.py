@@ -0,0 +1,97 @@
+import unittest
+
+from .. import Coloradoes
+from ..storage.memory import Storage
+
+
+class TestBitmap(unittest.TestCase):
+    def setUp(self):
+        super(TestBitmap, self).setUp()
+        self.database = Coloradoes(Storage())
+        self.values = []
+
+    def test_setbit_extends(self):
+        self.values.append(self.database.command_setbit('key', 7, '1'))
+        self.values.append(self.database.command_setbit('key', 17, 1))
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.command_getbit('key', 17))
+        self.values.append(self.database.command_getbit('key', 1000))
+        self.assertEqual(self.values, [1, 3, '\x01\x00\x40', 1, 0])
+
+    def test_setbit_keeps_id(self):
+        self.database.command_set('key', 'abc')
+        id = self.database.get_key('key')[0]
+        self.database.command_setbit('key', 100, '1')
+        self.values.append(self.database.get_key('key')[0] == id)
+        self.values.append(self.database.command_strlen('key'))
+        self.assertEqual(self.values, [True, 13])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.database.command_setbit, 'key',
+                -1, '1')
+        self.assertRaises(ValueError, self.database.command_setbit, 'key',
+                1, '2')
+        self.database.command_rpush('list', 'a')
+        self.assertRaises(ValueError, self.database.command_getbit, 'list', 1)
+
+    def test_bitcount_range(self):
+        self.database.command_set('key', 'foobar')
+        self.values.append(self.database.command_bitcount('key', 0, 0))
+        self.values.append(self.database.command_bitcount('key', 1, 1))
+        self.values.append(self.database.command_bitcount('key', -2, -1))
+        self.values.append(self.database.command_bitcount('missing'))
+        self.assertEqual(self.values, [4, 6, 7, 0])
+
+    def test_large(self):
+        # one bit every 8 bits over 8MB
+        self.database.command_set('key', '\x01' * (8 << 20))
+        self.values.append(self.database.command_bitcount('key'))
+        self.values.append(self.database.command_bitop('not', 'dest', 'key'))
+        self.values.append(self.database.command_bitcount('dest'))
+        self.assertEqual(self.values, [8 << 20, 8 << 20, 7 * (8 << 20)])
+
+    def test_bitop_padding(self):
+        self.database.command_set('a', '\xff\xff')
+        self.database.command_set('b', '\x0f')
+        self.values.append(self.database.command_bitop('and', 'dest', 'a',
+                'b', 'missing'))
+        self.values.append(self.database.command_get('dest'))
+        self.values.append(self.database.command_bitop('or', 'dest', 'a',
+                'b'))
+        self.values.append(self.database.command_get('dest'))
+        self.assertEqual(self.values, [2, '\x00\x00', 2, '\xff\xff'])
+
+    def test_bitpos(self):
+        self.database.command_set('key', '\xff\xf0\x00')
+        self.values.append(self.database.command_bitpos('key', 0))
+        self.values.append(self.database.command_bitpos('key', 1, 2))
+        self.values.append(self.database.command_bitpos('key', 0, 2, -1))
+        self.database.command_set('ones', '\xff\xff')
+        self.values.append(self.database.command_bitpos('ones', 0))
+        self.values.append(self.database.command_bitpos('ones', 0, 0, -1))
+        self.values.append(self.database.command_bitpos('missing', 0))
+        self.values.append(self.database.command_bitpos('missing', 1))
+        self.assertEqual(self.values, [12, -1, 16, 16, -1, 0, -1])
+
+    def test_bitfield(self):
+        self.values.append(self.database.command_bitfield('key',
+                'SET', 'i8', 0, 100, 'GET', 'u4', 0, 'INCRBY', 'i8', 0, 100))
+        self.values.append(self.database.command_bitfield('key',
+                'OVERFLOW', 'SAT', 'INCRBY', 'i8', 0, 100,
+                'INCRBY', 'i8', 0, 100,
+                'OVERFLOW', 'FAIL', 'INCRBY', 'u2', '#5', 5, 'GET', 'u2', '#5'))
+        self.values.append(self.database.command_bitfield('key',
+                'SET', 'u8', 4, 255, 'GET', 'u16', 0))
+        self.values.append(self.database.command_bitfield('missing',
+                'GET', 'i64', 0))
+        self.values.append(self.database.get_key('missing')[0])
+        self.assertEqual(self.values, [[0, 6, -56], [44, 127, None, 0],
+                [0xf0, 0x7ff0], [0], None])
+
+    def test_bitfield_errors(self):
+        self.assertRaises(ValueError, self.database.command_bitfield, 'key',
+                'GET', 'u64', 0)
+        self.assertRaises(ValueError, self.database.command_bitfield, 'key',
+                'SET', 'u8', 0)
+        self.assertRaises(ValueError, self.database.command_bitfield, 'key',
+                'OVERFLOW', 'NOPE')
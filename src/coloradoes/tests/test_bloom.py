@@ -0,0 +1,86 @@
+import unittest
+
+from .. import Coloradoes
+from ..storage.memory import Storage
+from ..types.t_bloom import _get_info
+
+
+class TestBloom(unittest.TestCase):
+    def setUp(self):
+        super(TestBloom, self).setUp()
+        self.storage = Storage()
+        self.database = Coloradoes(self.storage)
+        self.values = []
+
+    def info(self, key):
+        return _get_info(self.database, self.database.get_key(key)[0])
+
+    def test_add_exists(self):
+        self.values.append(self.database.command_bf_exists('key', 'a'))
+        self.values.append(self.database.command_bf_add('key', 'a'))
+        self.values.append(self.database.command_bf_add('key', 'a'))
+        self.values.append(self.database.command_bf_exists('key', 'a'))
+        self.values.append(self.database.command_bf_madd('key', 'b', 'a',
+                    'c', 'b'))
+        self.values.append(self.database.command_bf_mexists('key', 'a', 'b',
+                    'c', 'd'))
+        self.values.append(self.database.command_type('key'))
+        self.assertEqual(self.values, [0, 1, 0, 1, [1, 0, 1, 0],
+                [1, 1, 1, 0], 'MBbloom--'])
+
+    def test_reserve(self):
+        self.values.append(self.database.command_bf_reserve('key', '0.001',
+                    '1000'))
+        error_rate, expansion, filters = self.info('key')
+        self.values.append((error_rate, expansion, len(filters)))
+        self.values.append(filters[0][:2])
+        self.values.append(filters[0][2] >= 14378)
+        self.values.append(filters[0][3])
+        self.assertRaises(ValueError, self.database.command_bf_reserve,
+                'key', '0.01', '10')
+        for args in (('0', '10'), ('1.5', '10'), ('x', '10'), ('0.1', '0'),
+                ('0.1', '10', 'EXPANSION'), ('0.1', '10', 'EXPANSION', '0'),
+                ('0.1', '10', 'NOPE')):
+            self.assertRaises(ValueError, self.database.command_bf_reserve,
+                    'other', *args)
+        self.assertEqual(self.values, [True, (0.001, 2, 1), [1000, 0], True,
+                10])
+
+    def test_scaling(self):
+        self.database.command_bf_reserve('key', '0.01', '100', 'EXPANSION',
+                '4')
+        items = ['item%d' % i for i in range(0, 1000)]
+        self.values.append(sum(self.database.command_bf_madd('key', *items))
+                > 990)
+        error_rate, expansion, filters = self.info('key')
+        self.values.append([f[0] for f in filters])
+        self.values.append(sum(f[1] for f in filters) > 990)
+        self.values.append(self.database.command_bf_mexists('key', *items))
+        false_positives = sum(self.database.command_bf_mexists('key',
+                    *['other%d' % i for i in range(0, 1000)]))
+        self.values.append(false_positives < 50)
+        self.assertEqual(self.values, [True, [100, 400, 1600], True,
+                [1] * 1000, True])
+
+    def test_nonscaling(self):
+        self.database.command_bf_reserve('key', '0.01', '2', 'NONSCALING')
+        result = self.database.command_bf_madd('key', 'a', 'b', 'c')
+        self.values.append(result[:2])
+        self.values.append(isinstance(result[2], ValueError))
+        self.assertEqual(self.values, [[1, 1], True])
+        self.assertRaises(ValueError, self.database.command_bf_add, 'key',
+                'd')
+
+    def test_wrong_type(self):
+        self.database.command_set('key', 'value')
+        self.assertRaises(ValueError, self.database.command_bf_add, 'key',
+                'a')
+        self.assertRaises(ValueError, self.database.command_bf_exists, 'key',
+                'a')
+
+    def test_delete(self):
+        self.database.command_bf_madd('key', *range(0, 500))
+        self.values.append(self.database.command_del('key'))
+        self.values.append(len(self.storage.keys))
+        self.values.append(self.database.command_bf_exists('key', 1))
+        self.assertEqual(self.values, [1, 1, 0])
@@ -0,0 +1,74 @@
+import unittest
+
+from .. import Coloradoes
+from ..commands import COMMANDS, lookup
+from ..errors import *
+from ..storage.memory import Storage
+
+
+class TestCommands(unittest.TestCase):
+    def setUp(self):
+        super(TestCommands, self).setUp()
+        self.database = Coloradoes(Storage())
+        self.values = []
+
+    def test_lookup(self):
+        self.values.append(lookup('GET').handler.__name__)
+        self.values.append(lookup('get').write)
+        self.values.append(lookup('set').write)
+        self.values.append(lookup('bitcount').max_args)
+        self.values.append(lookup('mset').max_args)
+        self.values.append(lookup('nosuchcommand'))
+        self.assertEqual(self.values, ['command_get', False, True, 3, None,
+                None])
+
+    def test_keys(self):
+        self.values.append(COMMANDS['get'].keys(['key']))
+        self.values.append(COMMANDS['mset'].keys(['k1', 'v1', 'k2', 'v2']))
+        self.values.append(COMMANDS['bitop'].keys(['AND', 'dest', 'k1', 'k2']))
+        self.values.append(COMMANDS['smove'].keys(['src', 'dst', 'member']))
+        self.values.append(COMMANDS['select'].keys(['1']))
+        self.assertEqual(self.values, [['key'], ['k1', 'k2'],
+                ['dest', 'k1', 'k2'], ['src', 'dst'], []])
+
+    def test_execute(self):
+        self.values.append(self.database.execute('set', 'key', 'value'))
+        self.values.append(self.database.execute('get', 'key'))
+        self.values.append(self.database.command_type('key'))
+        self.assertEqual(self.values, [True, 'value', 'string'])
+
+    def test_wrong_arity(self):
+        with self.assertRaises(ValueError) as context:
+            self.database.command_get('key', 'other')
+        self.assertEqual(str(context.exception),
+                WRONG_NUMBER_OF_ARGUMENTS.format('GET'))
+        self.assertRaises(ValueError, self.database.command_sadd, 'key')
+        for name, args in (('bitcount', ('key', 0, 1, 2)),
+                ('getrange', ('key', 0, 1, 2)), ('spop', ('key', 1, 2)),
+                ('zrange', ('key', 0, 1, 'WITHSCORES', 'x'))):
+            with self.assertRaises(ValueError) as context:
+                self.database.execute(name, *args)
+            self.assertEqual(str(context.exception),
+                    WRONG_NUMBER_OF_ARGUMENTS.format(name.upper()))
+        self.assertRaises(ValueError, self.database.execute, 'nosuchcommand')
+
+    def test_unknown_attribute(self):
+        self.assertRaises(AttributeError, getattr, self.database,
+                'command_nosuchcommand')
+
+    def test_zset_type(self):
+        self.database.command_zadd('key', 1, 'a')
+        self.values.append(self.database.command_type('key'))
+        self.assertEqual(self.values, ['zset'])
+        # zsets no longer share the type code of sets
+        self.assertRaises(ValueError, self.database.command_sadd, 'key', 'b')
+
+    def test_stats(self):
+        self.database.command_set('key', 'value')
+        self.database.command_get('key')
+        self.database.command_get('key')
+        stats = self.database.command_stats()
+        self.values.append(stats['get']['calls'])
+        self.values.append(stats['set']['calls'])
+        self.values.append('hget' in stats)
+        self.assertEqual(self.values, [2, 1, False])
@@ -0,0 +1,119 @@
+import time
+import unittest
+
+from .. import Coloradoes
+from ..eviction import KEY_METADATA_SIZE, POLICY_LFU, POLICY_VOLATILE_TTL, \
+        SampleSet
+from ..storage.memory import Storage
+
+
+class TestEviction(unittest.TestCase):
+    def setUp(self):
+        super(TestEviction, self).setUp()
+        self.values = []
+
+    def fill(self, database, count):
+        for i in range(0, count):
+            database.command_set('key%d' % i, 'x' * 100)
+            time.sleep(0.001)
+
+    def test_lru(self):
+        database = Coloradoes(Storage(), maxmemory=450 + 3 * KEY_METADATA_SIZE)
+        self.fill(database, 3)
+        database.command_get('key0')
+        database.command_set('key3', 'x' * 100)
+        database.command_get('key3')
+        self.values.append(database.evicted_keys)
+        self.values.append(database.command_mget('key0', 'key1', 'key2',
+                    'key3'))
+        self.assertEqual(self.values, [1, ['x' * 100, None, 'x' * 100,
+                'x' * 100]])
+
+    def test_pipeline(self):
+        database = Coloradoes(Storage(), maxmemory=5000)
+        pipeline = database.pipeline()
+        for i in range(0, 1000):
+            pipeline.command_set('key%d' % i, 'x' * 100)
+        pipeline.execute()
+        self.values.append(database.evicted_keys > 900)
+        self.values.append(database.used_memory() < 5500)
+        self.assertEqual(self.values, [True, True])
+
+    def test_lfu(self):
+        database = Coloradoes(Storage(), maxmemory=450 + 3 * KEY_METADATA_SIZE,
+                maxmemory_policy=POLICY_LFU)
+        self.fill(database, 3)
+        for _ in range(0, 100):
+            database.command_get('key0')
+            database.command_get('key2')
+        database.command_set('key3', 'x' * 100)
+        database.command_get('key3')
+        self.values.append(database.command_get('key1'))
+        self.assertEqual(self.values, [None])
+
+    def test_volatile_ttl(self):
+        database = Coloradoes(Storage(), maxmemory=450 + 3 * KEY_METADATA_SIZE,
+                maxmemory_policy=POLICY_VOLATILE_TTL)
+        database.command_set('key0', 'x' * 100)
+        database.command_setex('key1', 100, 'x' * 100)
+        database.command_setex('key2', 50, 'x' * 100)
+        database.command_set('key3', 'x' * 100)
+        database.command_get('key3')
+        self.values.append(database.command_mget('key0', 'key1', 'key2'))
+        self.assertEqual(self.values, [['x' * 100, 'x' * 100, None]])
+
+    def test_evicts_collection_records(self):
+        storage = Storage()
+        database = Coloradoes(storage, maxmemory=200 + KEY_METADATA_SIZE)
+        for i in range(0, 20):
+            database.command_rpush('list', 'x' * 20)
+        database.command_set('key', 'value')
+        self.values.append(database.command_llen('list'))
+        self.values.append(database.command_get('key'))
+        self.values.append(storage.used_memory() <= 200)
+        self.values.append(database.used_memory() <=
+                200 + KEY_METADATA_SIZE)
+        self.assertEqual(self.values, [0, 'value', True, True])
+
+    def test_lazyfree(self):
+        database = Coloradoes(Storage(), maxmemory=10 ** 6, lazyfree=True)
+        for i in range(0, 10):
+            for _ in range(0, 20):
+                database.command_rpush('list%d' % i, 'x' * 100)
+            time.sleep(0.001)
+        database.maxmemory = database.used_memory() - 1000
+        database.command_set('key', 'value')
+        self.values.append(database.evicted_keys)
+        self.values.append(database.command_get('key'))
+        self.values.append(database.used_memory() <= database.maxmemory)
+        self.values.append(len(database.lazyfree_queue))
+        self.assertEqual(self.values, [1, 'value', True, 0])
+
+    def test_existing_keys_are_tracked(self):
+        storage = Storage()
+        Coloradoes(storage).command_set('key', 'x' * 100)
+        database = Coloradoes(storage, maxmemory=100 + KEY_METADATA_SIZE)
+        database.command_set('other', 'value')
+        self.assertEqual(database.command_get('key'), None)
+
+    def test_used_memory_counts_metadata(self):
+        database = Coloradoes(Storage(), maxmemory=10 ** 6)
+        database.command_set('key', 'value')
+        used = database.storage.used_memory()
+        self.values.append(database.used_memory() - used)
+        database.command_set('key', 'other')
+        database.command_del('key')
+        self.values.append(database.evictor.used_memory())
+        self.assertEqual(self.values, [KEY_METADATA_SIZE + 3, 0])
+
+
+class TestSampleSet(unittest.TestCase):
+    def test_add_discard_sample(self):
+        items = SampleSet()
+        for i in range(0, 10):
+            items.add(i)
+        items.discard(3)
+        items.discard(9)
+        items.discard(42)
+        self.assertEqual(sorted(items.sample(20)), [0, 1, 2, 4, 5, 6, 7, 8])
+        self.assertTrue(set(items.sample(3)) <= set(items.items))
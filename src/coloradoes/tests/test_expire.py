@@ -25,3 +25,62 @@ class TestStorage(unittest.TestCase):
         self.assertGreater(self.database.command_ttl('key'), now + 1.0)
         self.assertLess(self.database.command_ttl('key'), now + 2.0)
         self.assertEqual(self.database.command_get('key'), 'value')
+
+    def test_active_expire(self):
+        self.database.command_psetex('key1', '1', 'value')
+        self.database.command_psetex('key2', '100000', 'value')
+        self.database.command_set('key3', 'value')
+        time.sleep(0.01)
+        self.values.append(self.database.active_expire_cycle())
+        self.values.append(self.database.expired_keys)
+        self.values.append(len(self.database.expires))
+        self.values.append(self.database.command_get('key2'))
+        self.assertEqual(self.values, [1, 1, 1, 'value'])
+
+    def test_active_expire_stale_entries(self):
+        self.database.command_psetex('key1', '1', 'value')
+        self.database.command_set('key1', 'value2')
+        self.database.command_psetex('key2', '1', 'value')
+        self.database.command_persist('key2')
+        time.sleep(0.01)
+        self.values.append(self.database.active_expire_cycle())
+        self.values.append(self.database.command_mget('key1', 'key2'))
+        self.assertEqual(self.values, [0, ['value2', 'value']])
+
+    def test_active_expire_runs_between_commands(self):
+        database = Coloradoes(Storage(), active_expire_hz=1000)
+        database.command_psetex('key', '1', 'value')
+        time.sleep(0.01)
+        database.command_set('other', 'value')
+        self.values.append(database.expired_keys)
+        self.values.append(len(database.storage.keys))
+        self.assertEqual(self.values, [1, 3])
+
+    def test_expire_pexpire_pttl(self):
+        self.database.command_set('key', 'value')
+        self.values.append(self.database.command_pttl('key'))
+        self.values.append(self.database.command_expire('key', 10))
+        self.values.append(9000 < self.database.command_pttl('key') <= 10000)
+        self.values.append(self.database.command_pexpire('key', 500))
+        self.values.append(0 < self.database.command_pttl('key') <= 500)
+        self.values.append(self.database.command_persist('key'))
+        self.values.append(self.database.command_persist('key'))
+        self.values.append(self.database.command_pttl('key'))
+        self.values.append(self.database.command_pttl('missing'))
+        self.values.append(self.database.command_expire('missing', 10))
+        self.assertEqual(self.values, [-1, 1, True, 1, True, 1, 0, -1, -2, 0])
+
+    def test_expireat(self):
+        self.database.command_set('key', 'value')
+        self.values.append(self.database.command_expireat('key',
+                    time.time() - 1))
+        self.values.append(self.database.command_get('key'))
+        self.assertEqual(self.values, [1, None])
+
+    def test_expiry_index_reloaded(self):
+        storage = Storage()
+        Coloradoes(storage).command_psetex('key', '1', 'value')
+        time.sleep(0.01)
+        database = Coloradoes(storage)
+        self.values.append(database.active_expire_cycle())
+        self.assertEqual(self.values, [1])
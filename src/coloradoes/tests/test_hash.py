@@ -101,3 +101,23 @@ class TestHash(unittest.TestCase):
                     'value2'))
         self.values.append(self.database.command_hvals('key'))
         self.assertEqual(self.values, [True, True, ['value1', 'value2']])
+
+    def test_hdel_hgetall(self):
+        self.values.append(self.database.command_hmset('key', 'field1',
+                    'value1', 'field2', 'value2', 'field3', 'value3'))
+        self.values.append(self.database.command_hdel('key', 'field1'))
+        self.values.append(self.database.command_hexists('key', 'field1'))
+        self.values.append(self.database.command_hgetall('key'))
+        self.values.append(self.database.command_hlen('key'))
+        self.values.append(self.database.command_hdel('key', 'field2',
+                    'field3'))
+        self.values.append(self.database.command_hlen('key'))
+        self.assertEqual(self.values, [True, 1, False, ['field3', 'value3',
+                'field2', 'value2'], 2, 2, 0])
+
+    def test_del_removes_fields(self):
+        self.database.command_hmset('key', 'field1', 'value1', 'field2',
+                'value2')
+        self.values.append(self.database.command_del('key'))
+        self.values.append(len(self.database.storage.keys))
+        self.assertEqual(self.values, [1, 1])  # only the id counter is left
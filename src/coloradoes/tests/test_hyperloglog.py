@@ -0,0 +1,97 @@
+import random
+import unittest
+
+from .. import Coloradoes
+from ..storage.memory import Storage
+from ..types.t_hyperloglog import HEADER_SIZE, REGISTERS, _merge
+from ..types.t_string import _str_key
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def setUp(self):
+        super(TestHyperLogLog, self).setUp()
+        self.database = Coloradoes(Storage())
+        self.values = []
+
+    def assertNear(self, count, expected):
+        # the standard error is 0.81%
+        self.assertTrue(abs(count - expected) <= expected * 0.03,
+                '%d is too far from %d' % (count, expected))
+
+    def test_pfadd(self):
+        self.values.append(self.database.command_pfadd('key'))
+        self.values.append(self.database.command_pfadd('key', 'a', 'b'))
+        self.values.append(self.database.command_pfadd('key', 'a'))
+        self.values.append(self.database.command_pfcount('key'))
+        self.values.append(self.database.command_pfcount('missing'))
+        self.values.append(self.database.command_type('key'))
+        self.assertEqual(self.values, [1, 1, 0, 2, 0, 'string'])
+
+    def test_sparse_to_dense(self):
+        self.database.command_pfadd('key', *range(0, 100))
+        sparse = len(self.database.command_get('key'))
+        self.database.command_pfadd('key', *range(100, 5000))
+        self.values.append(sparse < 400)
+        self.values.append(len(self.database.command_get('key')))
+        self.assertEqual(self.values, [True, HEADER_SIZE + REGISTERS])
+        self.assertNear(self.database.command_pfcount('key'), 5000)
+
+    def test_large(self):
+        for i in range(0, 100000, 1000):
+            self.database.command_pfadd('key', *range(i, i + 1000))
+        self.assertNear(self.database.command_pfcount('key'), 100000)
+
+    def test_cached_cardinality(self):
+        self.database.command_pfadd('key', *range(0, 50))
+        before = self.database.command_get('key')
+        count = self.database.command_pfcount('key')
+        cached = self.database.command_get('key')
+        self.values.append(before == cached)
+        self.values.append(self.database.command_pfcount('key') == count)
+        self.values.append(self.database.command_get('key') == cached)
+        self.database.command_pfadd('key', 'new')
+        self.values.append(self.database.command_pfcount('key') - count)
+        self.assertEqual(self.values, [False, True, True, 1])
+
+    def test_merge(self):
+        self.database.command_pfadd('a', *range(0, 3000))
+        self.database.command_pfadd('b', *range(2000, 6000))
+        self.database.command_pfadd('c', *range(5000, 5100))
+        self.assertNear(self.database.command_pfcount('a', 'b', 'c'), 6000)
+        self.values.append(self.database.command_pfmerge('dest', 'a', 'b',
+                    'c'))
+        self.values.append(self.database.command_pfcount('dest') ==
+                self.database.command_pfcount('a', 'b', 'c'))
+        self.values.append(self.database.command_pfmerge('c', 'missing'))
+        self.values.append(self.database.command_pfcount('c') > 90)
+        self.assertEqual(self.values, [True, True, True, True])
+
+    def test_dense_merge(self):
+        generator = random.Random(1)
+        counters = [bytearray(HEADER_SIZE) + bytearray(generator.randint(0,
+                            51) for _ in range(0, REGISTERS))
+                for _ in range(0, 3)]
+        sparse = {0: 60, 5: 1}
+        merged = _merge(counters + [sparse])
+        expected = bytearray(map(max, *[registers[HEADER_SIZE:]
+                        for registers in counters]))
+        expected[0] = 60
+        expected[5] = max(expected[5], 1)
+        self.assertEqual(merged[HEADER_SIZE:], expected)
+
+    def test_dense_add_in_place(self):
+        self.database.command_pfadd('key', *range(0, 5000))
+        str_key = _str_key(self.database, self.database.get_key('key')[0])
+        value = self.database.storage.get(str_key)
+        self.database.command_pfadd('key', *range(5000, 6000))
+        self.values.append(self.database.storage.get(str_key) is value)
+        self.assertEqual(self.values, [True])
+        self.assertNear(self.database.command_pfcount('key'), 6000)
+
+    def test_invalid(self):
+        self.database.command_set('key', 'not a counter')
+        self.database.command_rpush('list', 'a')
+        self.assertRaises(ValueError, self.database.command_pfadd, 'key', 'a')
+        self.assertRaises(ValueError, self.database.command_pfcount, 'key')
+        self.assertRaises(ValueError, self.database.command_pfmerge, 'dest',
+                'list')
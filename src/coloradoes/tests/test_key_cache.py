@@ -0,0 +1,56 @@
+import time
+import unittest
+
+from .. import Coloradoes
+from ..storage.memory import Storage
+
+
+class TestKeyCache(unittest.TestCase):
+    def setUp(self):
+        super(TestKeyCache, self).setUp()
+        self.database = Coloradoes(Storage())
+        self.values = []
+
+    def test_hits(self):
+        self.database.command_hmset('key', 'field1', 'value1', 'field2',
+                'value2')
+        hits = self.database.key_cache_hits
+        self.database.command_hget('key', 'field1')
+        self.database.command_hget('key', 'field2')
+        self.values.append(self.database.key_cache_hits - hits)
+        self.values.append(self.database.key_cache_stats()['size'])
+        self.assertEqual(self.values, [2, 1])
+
+    def test_coherence(self):
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.command_set('key', 'value'))
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.command_del('key'))
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.command_rpush('key', 'value'))
+        self.values.append(self.database.command_type('key'))
+        self.assertEqual(self.values, [None, True, 'value', 1, None, None,
+                'list'])
+
+    def test_per_database(self):
+        self.database.command_set('key', 'value0')
+        self.database.command_select(1)
+        self.values.append(self.database.command_get('key'))
+        self.database.command_select(0)
+        self.values.append(self.database.command_get('key'))
+        self.assertEqual(self.values, [None, 'value0'])
+
+    def test_expire(self):
+        self.database.command_psetex('key', '1', 'value')
+        time.sleep(0.01)
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.key_cache_stats()['size'])
+        self.assertEqual(self.values, [None, 1])
+
+    def test_size_limit(self):
+        database = Coloradoes(Storage(), key_cache_size=2)
+        for i in range(0, 10):
+            database.command_set('key%d' % i, str(i))
+        self.values.append(database.key_cache_stats()['size'])
+        self.values.append(database.command_mget('key0', 'key9'))
+        self.assertEqual(self.values, [2, ['0', '9']])
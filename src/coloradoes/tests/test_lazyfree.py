@@ -0,0 +1,59 @@
+import unittest
+
+from .. import Coloradoes
+from ..storage.memory import Storage
+
+
+class TestLazyFree(unittest.TestCase):
+    def setUp(self):
+        super(TestLazyFree, self).setUp()
+        self.storage = Storage()
+        self.database = Coloradoes(self.storage, lazyfree_batch=10)
+        self.values = []
+
+    def fill(self, database, key, count):
+        database.command_hmset(key, *sum((('field%d' % i, 'value')
+                    for i in range(0, count)), ()))
+
+    def test_unlink(self):
+        self.fill(self.database, 'key', 100)
+        records = len(self.storage.keys)
+        # large enough to free everything right after the command
+        self.database.lazyfree_batch = 1000
+        self.values.append(self.database.command_unlink('key', 'missing'))
+        self.values.append(self.database.command_hgetall('key'))
+        self.values.append(self.database.lazyfree_stats())
+        self.assertEqual(self.values, [1, [], {'pending_objects': 0,
+                    'freed_records': records - 2}])
+
+    def test_incremental(self):
+        self.fill(self.database, 'key', 100)
+        self.database.command_unlink('key')
+        self.values.append(self.database.lazyfree_stats()['freed_records'])
+        self.database.command_set('other', 'value')
+        self.values.append(self.database.lazyfree_stats()['freed_records'])
+        self.database.lazyfree_flush()
+        self.values.append(self.database.lazyfree_stats())
+        self.values.append(len(self.storage.keys))
+        self.assertEqual(self.values, [10, 20, {'pending_objects': 0,
+                    'freed_records': 201}, 3])
+
+    def test_lazyfree_overwrite(self):
+        database = Coloradoes(self.storage, lazyfree=True, lazyfree_batch=5)
+        self.fill(database, 'key', 10)
+        database.command_set('key', 'value')
+        self.values.append(database.command_get('key'))
+        self.values.append(database.lazyfree_stats()['pending_objects'])
+        database.lazyfree_flush()
+        self.values.append(len(self.storage.keys))
+        self.assertEqual(self.values, ['value', 1, 3])
+
+    def test_queue_survives_restart(self):
+        self.fill(self.database, 'key', 100)
+        self.database.lazyfree_batch = 1
+        self.database.command_unlink('key')
+        database = Coloradoes(self.storage)
+        self.values.append(database.lazyfree_stats()['pending_objects'])
+        database.lazyfree_flush()
+        self.values.append(len(self.storage.keys))
+        self.assertEqual(self.values, [1, 1])
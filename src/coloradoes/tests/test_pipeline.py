@@ -0,0 +1,103 @@
+import unittest
+
+from .. import Coloradoes
+from ..storage.memory import Storage
+
+
+class CountingStorage(Storage):
+    def __init__(self):
+        super(CountingStorage, self).__init__()
+        self.commits = 0
+        self.depth = 0
+
+    def begin(self):
+        self.depth += 1
+
+    def commit(self):
+        self.depth -= 1
+        if self.depth == 0:
+            self.commits += 1
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        super(TestPipeline, self).setUp()
+        self.storage = CountingStorage()
+        self.database = Coloradoes(self.storage)
+        self.values = []
+
+    def test_execute(self):
+        pipeline = self.database.pipeline()
+        pipeline.command_set('key', 'value').command_get('key')
+        pipeline.command_rpush('list', 'a')
+        pipeline.command_lrange('list', 0, -1)
+        self.values.append(len(pipeline))
+        self.values.append(pipeline.execute())
+        self.values.append(self.storage.commits)
+        self.values.append(len(pipeline))
+        self.assertEqual(self.values, [4, [True, 'value', None, ['a']], 1, 0])
+
+    def test_errors(self):
+        pipeline = self.database.pipeline()
+        pipeline.command_set('key', 'value')
+        pipeline.command_rpush('key', 'a')
+        pipeline.command_get('key')
+        replies = pipeline.execute()
+        self.values.append(replies[0])
+        self.values.append(isinstance(replies[1], ValueError))
+        self.values.append(replies[2])
+        self.assertEqual(self.values, [True, True, 'value'])
+        # not only ValueErrors
+        pipeline.command_set('a', '1')
+        pipeline.command_sadd('set', 1)
+        pipeline.command_set('b', '2')
+        replies = pipeline.execute()
+        self.assertTrue(isinstance(replies[1], TypeError))
+        self.assertEqual(self.database.command_mget('a', 'b'), ['1', '2'])
+        self.assertRaises(ValueError, pipeline.command_get, 'a', 'b')
+        self.assertRaises(ValueError, pipeline.queue_command, 'nosuchcommand')
+
+    def test_watch(self):
+        self.database.command_set('key', 'value')
+        pipeline = self.database.pipeline()
+        pipeline.watch('key')
+        self.database.command_set('key', 'other')
+        pipeline.command_set('key', 'mine')
+        self.values.append(pipeline.execute())
+        self.values.append(self.database.command_get('key'))
+        pipeline.watch('key')
+        pipeline.command_set('key', 'mine')
+        self.values.append(pipeline.execute())
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.watched_keys)
+        self.assertEqual(self.values, [None, 'other', [True], 'mine', {}])
+
+    def test_watch_other_database(self):
+        pipeline = self.database.pipeline()
+        pipeline.watch('key')
+        self.database.command_select(1)
+        self.database.command_set('key', 'value')
+        self.database.command_select(0)
+        pipeline.command_get('key')
+        self.values.append(pipeline.execute())
+        self.assertEqual(self.values, [[None]])
+
+    def test_watch_expired(self):
+        self.database.command_set('key', 'value')
+        self.database.command_pexpire('key', 1)
+        pipeline = self.database.pipeline()
+        pipeline.watch('key')
+        self.database.active_expire_cycle(now=self.database.expires
+                .next_expire() + 1)
+        pipeline.command_get('key')
+        self.values.append(pipeline.execute())
+        self.assertEqual(self.values, [None])
+
+    def test_discard(self):
+        pipeline = self.database.pipeline()
+        pipeline.watch('key')
+        pipeline.command_set('key', 'value')
+        self.values.append(pipeline.discard())
+        self.values.append(pipeline.execute())
+        self.values.append(self.database.command_get('key'))
+        self.assertEqual(self.values, [True, [], None])
@@ -0,0 +1,198 @@
+from collections import OrderedDict
+import socket
+import threading
+import unittest
+
+from .. import Coloradoes
+from ..resp import ProtocolError, Reader, encode, encode_into
+from ..server import Server
+from ..storage.memory import Storage
+
+
+def command(*args):
+    return '*%d\r\n%s' % (len(args), ''.join('$%d\r\n%s\r\n' % (len(arg), arg)
+                for arg in args))
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        super(TestServer, self).setUp()
+        self.database = Coloradoes(Storage())
+        self.server = Server(self.database, port=0, maxclients=2)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                args=(0.01, ))
+        self.thread.daemon = True
+        self.thread.start()
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.server.close_all()
+        self.thread.join(5)
+        super(TestServer, self).tearDown()
+
+    def connect(self):
+        sock = socket.create_connection(self.server.address)
+        sock.settimeout(5)
+        self.sockets.append(sock)
+        return sock
+
+    def request(self, sock, data, expected):
+        sock.sendall(data)
+        received = ''
+        while len(received) < len(expected):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            received += chunk
+        return received
+
+    def test_pipelining(self):
+        sock = self.connect()
+        expected = '+OK\r\n$5\r\nvalue\r\n:1\r\n$-1\r\n+PONG\r\n'
+        self.assertEqual(self.request(sock, command('SET', 'key', 'value') +
+                command('GET', 'key') + command('DEL', 'key') +
+                command('GET', 'key') + 'PING\r\n', expected), expected)
+
+    def test_errors(self):
+        sock = self.connect()
+        self.request(sock, command('SET', 'key', 'value'), '+OK\r\n')
+        expected = '-WRONGTYPE Operation against a key holding the wrong ' \
+                'kind of value\r\n-ERR unknown command \'nope\'\r\n' \
+                '-ERR wrong number of arguments for GET\r\n'
+        self.assertEqual(self.request(sock, command('LPUSH', 'key', 'a') +
+                command('NOPE') + command('GET'), expected), expected)
+
+    def test_protocol_error_after_commands(self):
+        sock = self.connect()
+        expected = '+OK\r\n$5\r\nvalue\r\n' \
+                "-ERR Protocol error: expected '$', got '+'\r\n"
+        self.assertEqual(self.request(sock, command('SET', 'key', 'value') +
+                command('GET', 'key') + '*1\r\n+PING\r\n' +
+                command('DEL', 'key'), expected + 'more'), expected)
+        self.assertEqual(sock.recv(65536), '')
+
+    def test_dotted_commands(self):
+        sock = self.connect()
+        expected = ':1\r\n*2\r\n:0\r\n:1\r\n'
+        self.assertEqual(self.request(sock, command('BF.ADD', 'key', 'a') +
+                command('bf.mexists', 'key', 'b', 'a'), expected), expected)
+
+    def test_integer_replies(self):
+        sock = self.connect()
+        expected = ':1\r\n:6\r\n$1\r\n6\r\n+OK\r\n+QUEUED\r\n' \
+                '*1\r\n:5\r\n'
+        self.assertEqual(self.request(sock, command('INCR', 'key') +
+                command('INCRBY', 'key', '5') + command('GET', 'key') +
+                command('MULTI') + command('DECR', 'key') + command('EXEC'),
+                expected), expected)
+
+    def test_boolean_replies(self):
+        sock = self.connect()
+        expected = ':1\r\n:0\r\n:1\r\n:0\r\n:1\r\n:0\r\n:1\r\n' \
+                ':1\r\n:0\r\n+OK\r\n'
+        self.assertEqual(self.request(sock, command('SETNX', 'key', 'a') +
+                command('SETNX', 'key', 'b') + command('HSET', 'h', 'f', 'v') +
+                command('HSETNX', 'h', 'f', 'w') +
+                command('HEXISTS', 'h', 'f') + command('HEXISTS', 'h', 'g') +
+                command('SADD', 's', 'm') +
+                command('SISMEMBER', 's', 'm') +
+                command('SISMEMBER', 's', 'n') +
+                command('MSET', 'k1', 'v1', 'k2', 'v2'), expected), expected)
+
+    def test_select_per_connection(self):
+        first, second = self.connect(), self.connect()
+        self.request(first, command('SELECT', '1') +
+                command('SET', 'key', 'one'), '+OK\r\n+OK\r\n')
+        self.assertEqual(self.request(second, command('GET', 'key'),
+                    '$-1\r\n'), '$-1\r\n')
+        self.assertEqual(self.request(first, command('GET', 'key'),
+                    '$3\r\none\r\n'), '$3\r\none\r\n')
+
+    def test_maxclients(self):
+        self.connect()
+        self.connect()
+        sock = self.connect()
+        expected = '-ERR max number of clients reached\r\n'
+        self.assertEqual(self.request(sock, '', expected), expected)
+
+    def test_multi(self):
+        sock = self.connect()
+        expected = '+OK\r\n+QUEUED\r\n+QUEUED\r\n*2\r\n+OK\r\n:1\r\n'
+        self.assertEqual(self.request(sock, command('MULTI') +
+                command('SET', 'key', 'value') + command('DEL', 'key') +
+                command('EXEC'), expected), expected)
+
+    def test_watch(self):
+        first, second = self.connect(), self.connect()
+        self.request(first, command('WATCH', 'key') + command('MULTI'),
+                '+OK\r\n+OK\r\n')
+        self.request(second, command('SET', 'key', 'other'), '+OK\r\n')
+        expected = '+QUEUED\r\n*-1\r\n'
+        self.assertEqual(self.request(first, command('SET', 'key', 'mine') +
+                command('EXEC'), expected), expected)
+
+    def test_resp3(self):
+        sock = self.connect()
+        expected = '%2\r\n$6\r\nserver\r\n$10\r\ncoloradoes\r\n' \
+                '$5\r\nproto\r\n:3\r\n'
+        self.assertEqual(self.request(sock, command('HELLO', '3'), expected),
+                expected)
+        self.assertEqual(self.request(sock, command('GET', 'key'), '_\r\n'),
+                '_\r\n')
+
+
+class TestResp(unittest.TestCase):
+    def test_reader(self):
+        reader = Reader()
+        data = command('SET', 'key', 'a\r\nb') + 'PING\r\n'
+        values = []
+        for c in data:
+            reader.feed(c)
+            args = reader.gets()
+            if args is not None:
+                values.append(args)
+        self.assertEqual(values, [['SET', 'key', 'a\r\nb'], ['PING']])
+
+    def test_batch(self):
+        reader = Reader()
+        data = ''.join(command('INCR', 'key%d' % i) for i in range(0, 100))
+        reader.feed(data[:1000])
+        first = reader.parse()
+        reader.feed(data[1000:])
+        second = reader.parse()
+        self.assertEqual(first + second, [['INCR', 'key%d' % i]
+                for i in range(0, 100)])
+        # the commands parsed by the first call were dropped by the feed
+        self.assertEqual(reader.offset, len(reader.buffer))
+        self.assertTrue(len(reader.buffer) < len(data) - 900)
+
+    def test_protocol_error(self):
+        reader = Reader()
+        reader.feed('*1\r\n+PING\r\n')
+        self.assertRaises(ProtocolError, reader.parse)
+        reader = Reader()
+        reader.feed(command('PING') + '*x\r\n')
+        with self.assertRaises(ProtocolError) as context:
+            reader.parse()
+        self.assertEqual(context.exception.commands, [['PING']])
+        self.assertRaises(ProtocolError, reader.parse)
+
+    def test_encode_into(self):
+        out = bytearray('+OK\r\n')
+        encode_into(out, ['a', ['b', 2]])
+        self.assertEqual(str(out), '+OK\r\n*2\r\n$1\r\na\r\n*2\r\n$1\r\nb\r\n'
+                ':2\r\n')
+
+    def test_encode_map(self):
+        value = OrderedDict((('a', 1), ('b', None)))
+        self.assertEqual(encode(value), '*4\r\n$1\r\na\r\n:1\r\n$1\r\nb\r\n'
+                '$-1\r\n')
+        self.assertEqual(encode(value, 3), '%2\r\n$1\r\na\r\n:1\r\n$1\r\n'
+                'b\r\n_\r\n')
+
+    def test_encode(self):
+        self.assertEqual(encode([1, 'a', None, 1.5]),
+                '*4\r\n:1\r\n$1\r\na\r\n$-1\r\n$3\r\n1.5\r\n')
+        self.assertEqual(encode([None, 1.5], 3), '*2\r\n_\r\n,1.5\r\n')
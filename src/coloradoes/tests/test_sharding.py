@@ -0,0 +1,70 @@
+import unittest
+
+from ..sharding import ShardedColoradoes, crc16, key_slot
+from ..storage.memory import Storage
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        super(TestSharding, self).setUp()
+        self.storages = [Storage() for _ in range(0, 4)]
+        self.database = ShardedColoradoes(self.storages)
+        self.values = []
+
+    def tearDown(self):
+        self.database.close()
+        super(TestSharding, self).tearDown()
+
+    def test_key_slot(self):
+        self.values.append(crc16('123456789'))
+        self.values.append(key_slot('foo'))
+        self.values.append(key_slot('{user1000}.following') ==
+                key_slot('{user1000}.followers'))
+        self.values.append(key_slot('foo{{bar}}zap') == key_slot('{bar'))
+        self.values.append(key_slot('{}foo') == key_slot('foo'))
+        self.assertEqual(self.values, [0x31c3, 12182, True, True, False])
+
+    def test_distribution(self):
+        for i in range(0, 100):
+            self.database.command_set('key%d' % i, i)
+        self.values.append(all(storage.keys for storage in self.storages))
+        self.values.append(self.database.command_get('key42'))
+        self.assertEqual(self.values, [True, '42'])
+
+    def test_multi_key(self):
+        keys = ['key%d' % i for i in range(0, 20)]
+        args = []
+        for key in keys:
+            args.extend([key, key.upper()])
+        self.values.append(self.database.command_mset(*args))
+        self.values.append(self.database.command_mget(*(keys + ['missing'])))
+        self.values.append(self.database.command_del(*(keys[:10] +
+                ['missing'])))
+        self.values.append(self.database.command_mget(*keys[8:12]))
+        self.assertEqual(self.values, [20, [key.upper() for key in keys] +
+                [None], 10, [None, None, 'KEY10', 'KEY11']])
+
+    def test_sets(self):
+        self.database.command_sadd('a', '1', '2', '3')
+        self.database.command_sadd('b', '2', '3', '4')
+        self.database.command_sadd('c', '3', '5')
+        self.values.append(sorted(self.database.command_sunion('a', 'b', 'c')))
+        self.values.append(self.database.command_sinter('a', 'b', 'c'))
+        self.values.append(sorted(self.database.command_sdiff('a', 'c')))
+        self.assertEqual(self.values, [['1', '2', '3', '4', '5'], ['3'],
+                ['1', '2']])
+
+    def test_cross_slot(self):
+        self.database.command_sadd('a', '1')
+        self.assertRaises(ValueError, self.database.command_sunionstore,
+                'dest', 'a', 'b')
+        self.database.command_sadd('{tag}a', '1')
+        self.database.command_sadd('{tag}b', '2')
+        self.values.append(self.database.command_sunionstore('{tag}dest',
+                '{tag}a', '{tag}b'))
+        self.assertEqual(self.values, [2])
+
+    def test_select(self):
+        self.values.append(self.database.command_select(1))
+        self.values.append([shard.database for shard in self.database.shards])
+        self.assertEqual(self.values, [True, [1, 1, 1, 1]])
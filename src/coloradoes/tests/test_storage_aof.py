@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import Coloradoes
+from ..storage.aof import Storage
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        super(TestStorage, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'appendonly.aof')
+        self.storage = Storage(self.path, fsync='always')
+        self.values = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestStorage, self).tearDown()
+
+    def reopen(self):
+        self.storage.close()
+        self.storage = Storage(self.path, fsync='always')
+
+    def test_replay(self):
+        self.storage.set('key1', 'value1')
+        self.storage.set_many([('key2', 'value2'), ('key3', 3)])
+        self.storage.delete('key1')
+        self.reopen()
+        self.values.append(self.storage.get('key1'))
+        self.values.append(self.storage.get('key2'))
+        self.values.append(self.storage.get('key3'))
+        self.assertEqual(self.values, [None, 'value2', '3'])
+
+    def test_replay_delete_range(self):
+        for key in ('a', 'b', 'c', 'd'):
+            self.storage.set(key, key)
+        self.storage.delete_range('b', 'd')
+        self.reopen()
+        self.assertEqual(self.storage.range(), [('a', 'a'), ('d', 'd')])
+
+    def test_group_commit(self):
+        self.storage.begin()
+        self.storage.set('key1', 'value1')
+        self.storage.set('key2', 'value2')
+        self.values.append(os.path.getsize(self.path))
+        self.storage.commit()
+        self.values.append(os.path.getsize(self.path) > 0)
+        self.assertEqual(self.values, [0, True])
+
+    def test_truncated_tail(self):
+        self.storage.set('key1', 'value1')
+        self.storage.set('key2', 'value2')
+        self.storage.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(size - 3)
+        self.storage = Storage(self.path)
+        self.values.append(self.storage.get('key1'))
+        self.values.append(self.storage.get('key2'))
+        self.storage.set('key2', 'value3')
+        self.reopen()
+        self.values.append(self.storage.get('key2'))
+        self.assertEqual(self.values, ['value1', None, 'value3'])
+
+    def test_rewrite(self):
+        for i in range(0, 100):
+            self.storage.set('key', str(i))
+        size = os.path.getsize(self.path)
+        self.storage.rewrite()
+        self.storage.set('key2', 'value2')
+        self.storage.wait_rewrite()
+        self.values.append(os.path.getsize(self.path) < size)
+        self.reopen()
+        self.values.append(self.storage.get('key'))
+        self.values.append(self.storage.get('key2'))
+        self.assertEqual(self.values, [True, '99', 'value2'])
+
+    def test_coloradoes_restart(self):
+        database = Coloradoes(self.storage)
+        database.command_rpush('list', 'a')
+        database.command_rpush('list', 'b')
+        database.command_hmset('hash', 'field', 'value')
+        database.command_del('hash')
+        self.reopen()
+        database = Coloradoes(self.storage)
+        self.values.append(database.command_lrange('list', 0, -1))
+        self.values.append(database.command_hgetall('hash'))
+        self.assertEqual(self.values, [['a', 'b'], []])
+
+    def test_id_blocks_survive_restart(self):
+        database = Coloradoes(self.storage, id_block_size=16)
+        database.command_sadd('a', '1')
+        database.command_sadd('b', '1')
+        ids = [database.get_key('a')[0], database.get_key('b')[0]]
+        self.reopen()
+        database = Coloradoes(self.storage, id_block_size=16)
+        database.command_sadd('c', '1')
+        self.values.append(ids)
+        self.values.append(database.get_key('c')[0])
+        self.values.append(database.command_smembers('a'))
+        self.assertEqual(self.values, [[1, 2], 17, ['1']])
@@ -0,0 +1,58 @@
+import unittest
+
+from .. import Coloradoes
+from ..storage.cache import Storage
+from ..storage.memory import Storage as MemoryStorage
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        super(TestStorage, self).setUp()
+        self.backend = MemoryStorage()
+        self.storage = Storage(self.backend, size=2)
+        self.values = []
+
+    def test_hits_misses(self):
+        self.values.append(self.storage.get('key'))
+        self.values.append(self.storage.get('key'))
+        self.storage.set('key', 'value')
+        self.values.append(self.storage.get('key'))
+        self.values.append(self.storage.get_many(['key', 'other']))
+        self.values.append((self.storage.hits, self.storage.misses))
+        self.assertEqual(self.values, [None, None, 'value',
+                ['value', None], (3, 2)])
+
+    def test_write_through(self):
+        self.storage.set('key', 'value')
+        self.values.append(self.backend.get('key'))
+        self.storage.delete('key')
+        self.values.append(self.backend.get('key'))
+        self.values.append(self.storage.get('key'))
+        self.values.append(self.storage.exists('key'))
+        self.assertEqual(self.values, ['value', None, None, False])
+
+    def test_lru_eviction(self):
+        self.storage.set('a', '1')
+        self.storage.set('b', '2')
+        self.storage.get('a')
+        self.storage.set('c', '3')
+        self.values.append(sorted(self.storage.cache.keys()))
+        self.values.append(list(self.storage.index))
+        self.assertEqual(self.values, [['a', 'c'], ['a', 'c']])
+
+    def test_delete_range(self):
+        self.storage.set('a', '1')
+        self.storage.set('b', '2')
+        self.values.append(self.storage.delete_range('a', 'b'))
+        self.values.append(self.storage.get('a'))
+        self.values.append(self.storage.get('b'))
+        self.values.append(list(self.storage.index))
+        self.assertEqual(self.values, [1, None, '2', ['a', 'b']])
+
+    def test_coloradoes(self):
+        database = Coloradoes(Storage(self.backend))
+        database.command_rpush('key', 'value1')
+        database.command_rpush('key', 'value2')
+        self.values.append(database.command_lrange('key', 0, -1))
+        self.values.append(database.storage.stats()['hits'] > 0)
+        self.assertEqual(self.values, [['value1', 'value2'], True])
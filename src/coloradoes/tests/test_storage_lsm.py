@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import Coloradoes
+from ..storage.lsm import BLOCK_SIZE, BloomFilter, Run, Storage
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        super(TestStorage, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.storage = self.open()
+        self.values = []
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.directory)
+        super(TestStorage, self).tearDown()
+
+    def open(self):
+        return Storage(self.directory, memtable_size=64, fanout=2,
+                background_compaction=False)
+
+    def test_set_get_delete(self):
+        self.values.append(self.storage.get('key1'))
+        self.storage.set('key1', 'value1')
+        self.storage.flush()
+        self.values.append(self.storage.get('key1'))
+        self.values.append(self.storage.exists('key1'))
+        self.values.append(self.storage.delete('key1'))
+        self.storage.flush()
+        self.values.append(self.storage.get('key1'))
+        self.values.append(self.storage.delete('key1'))
+        self.assertEqual(self.values, [None, 'value1', True, True, None,
+                False])
+
+    def test_range_merges_runs(self):
+        for i in range(0, 50):
+            self.storage.set('key%02d' % i, str(i))
+        self.storage.delete_range('key10', 'key20')
+        self.storage.set('key15', 'new')
+        self.values.append(len(self.storage.range()))
+        self.values.append(self.storage.scan('key1'))
+        self.assertEqual(self.values, [41, [('key15', 'new')]])
+
+    def test_run_blocks(self):
+        path = os.path.join(self.directory, 'test.run')
+        items = (('key%05d' % i, None if i % 7 == 0 else 'v' * (i % 100))
+                for i in range(0, 5000))
+        run = Run.write(path, items, 0.01, 5000)
+        self.values.append(len(run))
+        # one index key per block, not per record
+        self.values.append(1 < len(run.keys) < 5000 * 60 // BLOCK_SIZE)
+        self.values.append(run.lookup('key00003'))
+        self.values.append(run.lookup('key00007'))
+        self.values.append(run.lookup('key04999'))
+        self.values.append(run.lookup('key00003x'))
+        self.values.append(run.lookup('a'))
+        self.values.append(list(run.range('key01234', 'key01237x')))
+        self.values.append(len(list(run.range())))
+        self.values.append([key for key, _ in run.range('key04998')])
+        run.close()
+        self.assertEqual(self.values, [5000, True, (True, 'vvv'),
+                (True, None), (True, 'v' * 99), (False, None),
+                (False, None), [('key01234', 'v' * 34), ('key01235', 'v' * 35),
+                ('key01236', 'v' * 36), ('key01237', 'v' * 37)], 5000,
+                ['key04998', 'key04999']])
+
+    def test_reopen_and_compaction(self):
+        for i in range(0, 200):
+            self.storage.set('key%03d' % i, str(i))
+        for i in range(0, 200, 2):
+            self.storage.delete('key%03d' % i)
+        self.storage.close()
+        self.values.append(len(self.storage.levels[0]) <= 2)
+        self.storage = self.open()
+        self.values.append(len(self.storage.range()))
+        self.values.append(self.storage.get('key001'))
+        self.values.append(self.storage.get('key002'))
+        self.assertEqual(self.values, [True, 100, '1', None])
+
+    def test_coloradoes(self):
+        database = Coloradoes(self.storage)
+        database.command_hmset('hash', 'field1', 'value1', 'field2', 'value2')
+        self.storage.flush()
+        database.command_hset('hash', 'field3', 'value3')
+        self.values.append(database.command_hgetall('hash'))
+        database.command_del('hash')
+        self.values.append(self.storage.scan('\0\0\0\0H'))
+        self.assertEqual(self.values, [['field1', 'value1', 'field2',
+                'value2', 'field3', 'value3'], []])
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_bloom(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(0, 1000):
+            bloom.add(str(i))
+        self.assertTrue(all(str(i) in bloom for i in range(0, 1000)))
+        false_positives = sum(str(i) in bloom for i in range(1000, 11000))
+        self.assertLess(false_positives, 300)
@@ -1,5 +1,6 @@
+import random
 import unittest
-from ..storage.memory import Storage
+from ..storage.memory import SortedKeys, Storage
 
 
 class TestStorage(unittest.TestCase):
@@ -25,3 +26,100 @@ class TestStorage(unittest.TestCase):
         self.values.append(self.storage.delete('key1'))
         self.values.append(self.storage.delete('key1'))
         self.assertEqual(self.values, [None, 1, 0])
+
+    def test_range(self):
+        for key in ('b', 'a', 'd', 'c'):
+            self.storage.set(key, key.upper())
+        self.values.append(self.storage.range('b', 'd'))
+        self.values.append(self.storage.range())
+        self.values.append(self.storage.range('c'))
+        self.assertEqual(self.values, [[('b', 'B'), ('c', 'C')],
+                [('a', 'A'), ('b', 'B'), ('c', 'C'), ('d', 'D')],
+                [('c', 'C'), ('d', 'D')]])
+
+    def test_scan(self):
+        for key in ('ab', 'a', 'b', 'a\xff', 'aa'):
+            self.storage.set(key, '1')
+        self.values.append([k for k, _ in self.storage.scan('a')])
+        self.values.append([k for k, _ in self.storage.scan('a\xff')])
+        self.values.append([k for k, _ in self.storage.scan('')])
+        self.assertEqual(self.values, [['a', 'aa', 'ab', 'a\xff'], ['a\xff'],
+                ['a', 'aa', 'ab', 'a\xff', 'b']])
+
+    def test_delete_range(self):
+        for key in ('a', 'b', 'c', 'd'):
+            self.storage.set(key, '1')
+        self.values.append(self.storage.delete('c'))
+        self.values.append(self.storage.delete_range('b', 'z'))
+        self.values.append(self.storage.exists('b'))
+        self.values.append(self.storage.exists('d'))
+        self.values.append(self.storage.range())
+        self.assertEqual(self.values, [True, 2, False, False, [('a', '1')]])
+
+    def test_get_set_delete_many(self):
+        self.values.append(self.storage.set_many([('a', 1), ('b', 'B')]))
+        self.values.append(self.storage.get_many(['a', 'c', 'b']))
+        self.values.append(self.storage.delete_many(['a', 'c']))
+        self.values.append(self.storage.range())
+        self.assertEqual(self.values, [None, [1, None, 'B'], 1,
+                [('b', 'B')]])
+
+    def test_native_values(self):
+        data = bytearray('x' * (4 << 20))
+        self.storage.set('bytes', data)
+        self.storage.set('int', 5)
+        self.storage.set('float', 1.5)
+        self.values.append(self.storage.get('bytes') is data)
+        self.values.append(self.storage.get('int'))
+        self.values.append(self.storage.get('float'))
+        self.values.append(self.storage.used_memory())
+        self.assertEqual(self.values, [True, 5, 1.5, (4 << 20) + 29])
+
+    def test_get_view(self):
+        data = bytearray('value')
+        self.storage.set('key', data)
+        view = self.storage.get_view('key')
+        data[0] = 'V'
+        self.values.append(view[:2].tobytes())
+        self.values.append(self.storage.get_view('missing'))
+        self.storage.set('int', 42)
+        self.values.append(self.storage.get_view('int').tobytes())
+        self.assertEqual(self.values, ['Va', None, '42'])
+
+    def test_sorted_keys(self):
+        # small blocks, so they are split, merged and ranges span many
+        keys = SortedKeys()
+        keys.LOAD = 4
+        expected = set()
+        generator = random.Random(42)
+        for i in range(0, 2000):
+            key = '%03d' % generator.randint(0, 500)
+            operation = generator.random()
+            if operation < 0.5:
+                if key not in expected:
+                    keys.add(key)
+                    expected.add(key)
+            elif operation < 0.8:
+                if key in expected:
+                    keys.remove(key)
+                    expected.remove(key)
+            elif operation < 0.9:
+                added = set('%03d' % generator.randint(0, 500)
+                        for _ in range(0, generator.randint(1, 50)))
+                keys.update(added - expected)
+                expected |= added
+            else:
+                end = '%03d' % generator.randint(0, 500)
+                removed = keys.delete_range(key, end)
+                self.assertEqual(removed, sorted(k for k in expected
+                            if key <= k < end))
+                expected -= set(removed)
+            self.assertEqual(len(keys), len(expected))
+        self.assertEqual(list(keys), sorted(expected))
+        self.assertEqual(keys.range('100', '200'),
+                sorted(k for k in expected if '100' <= k < '200'))
+        self.assertEqual(keys.range('100', None, 5),
+                sorted(k for k in expected if '100' <= k)[:5])
+        self.assertTrue(all(len(block) <= 2 * keys.LOAD
+                    for block in keys.blocks))
+        self.assertEqual(keys.maxes, [block[-1] for block in keys.blocks])
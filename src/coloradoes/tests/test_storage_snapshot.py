@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import Coloradoes
+from ..storage import snapshot
+from ..storage.memory import Storage
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dump.snapshot')
+        self.database = Coloradoes(Storage())
+        self.values = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestSnapshot, self).tearDown()
+
+    def test_dump_load(self):
+        self.database.command_set('key', 'value')
+        self.database.command_rpush('list', 'a')
+        self.database.command_rpush('list', 'b')
+        self.database.command_sadd('set', '1', '2')
+        self.values.append(snapshot.dump(self.database.storage, self.path))
+        database = Coloradoes(Storage())
+        self.values.append(snapshot.load(database.storage, self.path))
+        self.values.append(database.command_get('key'))
+        self.values.append(database.command_lrange('list', 0, -1))
+        self.values.append(sorted(database.command_smembers('set')))
+        self.assertEqual(self.values, [13, 13, 'value', ['a', 'b'],
+                ['1', '2']])
+
+    def test_large_value(self):
+        value = 'x' * (3 * snapshot.READ_CHUNK + 7)
+        self.database.command_set('key', value)
+        snapshot.dump(self.database.storage, self.path)
+        database = Coloradoes(Storage())
+        snapshot.load(database.storage, self.path)
+        self.assertEqual(database.command_get('key'), value)
+
+    def test_checksum(self):
+        self.database.command_set('key', 'value')
+        snapshot.dump(self.database.storage, self.path)
+        with open(self.path, 'r+b') as fp:
+            fp.seek(-8, os.SEEK_END)
+            fp.write('X')
+        with self.assertRaises(ValueError):
+            snapshot.load(Storage(), self.path)
+
+    def test_truncated(self):
+        self.database.command_set('key', 'value')
+        snapshot.dump(self.database.storage, self.path)
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(os.path.getsize(self.path) - 10)
+        with self.assertRaises(ValueError):
+            snapshot.load(Storage(), self.path)
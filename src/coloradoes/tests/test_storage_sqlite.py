@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import Coloradoes
+from ..storage.sqlite import Storage
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        super(TestStorage, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'coloradoes.db')
+        self.storage = Storage(self.path)
+        self.values = []
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.directory)
+        super(TestStorage, self).tearDown()
+
+    def test_set_get_delete(self):
+        self.values.append(self.storage.get('key\0'))
+        self.values.append(self.storage.set('key\0', 1))
+        self.values.append(self.storage.get('key\0'))
+        self.values.append(self.storage.exists('key\0'))
+        self.values.append(self.storage.delete('key\0'))
+        self.values.append(self.storage.delete('key\0'))
+        self.assertEqual(self.values, [None, None, '1', True, True, False])
+
+    def test_many(self):
+        self.storage.set_many([('a', 'A'), ('b', 'B'), ('c', '\xff')])
+        self.values.append(self.storage.get_many(['c', 'x', 'a']))
+        self.values.append(self.storage.delete_many(['a', 'x']))
+        self.values.append(self.storage.range())
+        self.values.append(self.storage.delete_range('b', 'c'))
+        self.values.append(self.storage.scan(''))
+        self.assertEqual(self.values, [['\xff', None, 'A'], 1,
+                [('b', 'B'), ('c', '\xff')], 1, [('c', '\xff')]])
+
+    def test_transaction(self):
+        self.storage.begin()
+        self.storage.set('key', 'value')
+        other = Storage(self.path)
+        self.values.append(other.get('key'))
+        self.storage.commit()
+        self.values.append(other.get('key'))
+        other.close()
+        self.assertEqual(self.values, [None, 'value'])
+
+    def test_coloradoes_restart(self):
+        database = Coloradoes(self.storage)
+        database.command_zadd('zset', '1', 'a', '2', 'b')
+        database.command_hmset('hash', 'field', 'value')
+        self.storage.close()
+        self.storage = Storage(self.path)
+        database = Coloradoes(self.storage)
+        self.values.append(database.command_zrange('zset', '-inf', '+inf'))
+        self.values.append(database.command_hgetall('hash'))
+        self.assertEqual(self.values, [['a', 'b'], ['field', 'value']])
@@ -1,3 +1,5 @@
+import struct
+import time
 import unittest
 
 from .. import Coloradoes
@@ -54,8 +56,10 @@ class TestStorage(unittest.TestCase):
         self.values.append(self.database.command_get('key'))
         self.values.append(self.database.command_setrange('key', 6, 'bro'))
         self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.command_setrange('key', 16, ''))
+        self.values.append(self.database.command_get('key'))
         self.assertEqual(self.values, [True, 11, 'hello world', 11,
-                'hello brold'])
+                'hello brold', 11, 'hello brold'])
 
     def test_getbit_setbit(self):
         self.values.append(self.database.command_set('key', 'abc'))
@@ -106,13 +110,58 @@ class TestStorage(unittest.TestCase):
         self.values.append(self.database.command_get('key2'))
         self.assertEqual(self.values, [True, 2, 'value', 'value2'])
 
+    def test_set_options(self):
+        self.values.append(self.database.command_set('key', 'a', 'EX', '100'))
+        self.values.append(self.database.command_ttl('key') > time.time())
+        self.values.append(self.database.command_set('key', 'b', 'NX'))
+        self.values.append(self.database.command_set('key', 'c', 'xx'))
+        self.values.append(self.database.command_ttl('key'))
+        self.values.append(self.database.command_set('other', 'd', 'XX'))
+        self.values.append(self.database.command_set('other', 'e', 'PX',
+                    '100000', 'NX'))
+        self.values.append(self.database.command_mget('key', 'other'))
+        self.assertEqual(self.values, [True, True, None, True, None, None,
+                True, ['c', 'e']])
+        for args in (('EX', 'x'), ('EX', '0'), ('EX', '10', 'PX', '10'),
+                ('NX', 'XX'), ('EX', ), ('KEEP', )):
+            self.assertRaises(ValueError, self.database.command_set, 'key',
+                    'f', *args)
+        # nothing changed
+        self.assertEqual(self.database.command_get('key'), 'c')
+
     def test_msetnx(self):
         self.values.append(self.database.command_set('key', '0'))
         self.values.append(self.database.command_msetnx('key', 'value',
                     'key2', 'value2'))
         self.values.append(self.database.command_get('key'))
         self.values.append(self.database.command_get('key2'))
-        self.assertEqual(self.values, [True, 1, '0', 'value2'])
+        self.values.append(self.database.command_msetnx('key2', 'value2',
+                    'key3', 'value3'))
+        self.values.append(self.database.command_mget('key2', 'key3'))
+        self.assertEqual(self.values, [True, 0, '0', None, 1,
+                ['value2', 'value3']])
+
+    def test_mset_bulk(self):
+        self.database.id_block_size = 16
+        self.database.command_set('key0', 'old')
+        self.database.command_rpush('list', 'a')
+        args = []
+        for i in range(0, 100):
+            args.extend(('key%d' % i, 'value%d' % i))
+        args.extend(('list', 'string', 'key1', 'last'))
+        self.values.append(self.database.command_mset(*args))
+        self.values.append(self.database.command_type('list'))
+        self.values.append(self.database.command_mget('key0', 'key1',
+                    'key99', 'list', 'missing', 'key99'))
+        self.values.append(len(set(self.database.get_key('key%d' % i)[0]
+                        for i in range(0, 100))))
+        self.assertEqual(self.values, [102, 'string', ['value0', 'last',
+                'value99', 'string', None, 'value99'], 100])
+
+    def test_mget_wrong_type(self):
+        self.database.command_rpush('list', 'a')
+        self.assertRaises(ValueError, self.database.command_mget, 'key',
+                'list')
 
     def test_mget(self):
         self.values.append(self.database.command_set('key0', '0'))
@@ -160,3 +209,43 @@ class TestStorage(unittest.TestCase):
         self.values.append(self.database.command_bitop('not', 'key2', 'key1'))
         self.values.append(self.database.command_get('key2'))
         self.assertEqual(self.values, [True, 3, '\x99\x90\x90'])
+
+    def test_binary_value(self):
+        self.values.append(self.database.command_set('key', bytearray('abc')))
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.command_getrange('key', 1, 1))
+        self.values.append(self.database.command_strlen('key'))
+        self.values.append(self.database.command_incr('counter'))
+        self.values.append(self.database.command_get('counter'))
+        self.assertEqual(self.values, [True, 'abc', 'b', 3, '1', '1'])
+
+    def test_native_counter(self):
+        self.values.append(self.database.command_incrby('key', 5))
+        id = self.database.get_key('key')[0]
+        self.values.append(self.database.command_incr('key'))
+        self.values.append(self.database.get_key('key')[0] == id)
+        self.values.append(self.database.get(struct.pack('!ici', 0, 'S', id)))
+        self.values.append(self.database.command_strlen('key'))
+        self.values.append(self.database.command_get('key'))
+        self.assertEqual(self.values, ['5', '6', True, 6, 1, '6'])
+
+    def test_increment_errors(self):
+        self.database.command_set('key', 'abc')
+        self.assertRaises(ValueError, self.database.command_incr, 'key')
+        self.database.command_set('key', str((1 << 63) - 1))
+        self.assertRaises(ValueError, self.database.command_incr, 'key')
+        self.assertRaises(ValueError, self.database.command_incrby, 'new',
+                'x')
+        self.values.append(self.database.get_key('new')[0])
+        self.database.command_set('key', '1.5')
+        self.assertRaises(ValueError, self.database.command_incr, 'key')
+        self.assertEqual(self.values, [None])
+
+    def test_incrbyfloat(self):
+        self.values.append(self.database.command_incrbyfloat('key', '10.5'))
+        self.values.append(self.database.command_incrbyfloat('key', '0.1'))
+        self.values.append(self.database.command_incrbyfloat('key', '-0.6'))
+        self.values.append(self.database.command_get('key'))
+        self.database.command_set('key', '5.0e3')
+        self.values.append(self.database.command_incrbyfloat('key', '2.0e2'))
+        self.assertEqual(self.values, ['10.5', '10.6', '10', '10', '5200'])
@@ -0,0 +1,116 @@
+import unittest
+
+from .. import Coloradoes
+from ..storage.memory import Storage
+from ..types.t_string import CHUNK_SIZE
+
+
+class TestStringChunks(unittest.TestCase):
+    def setUp(self):
+        super(TestStringChunks, self).setUp()
+        self.storage = Storage()
+        self.database = Coloradoes(self.storage)
+        self.values = []
+        # a bit over two chunks
+        self.value = ''.join(chr(i % 251) for i in range(0,
+                    2 * CHUNK_SIZE + 100))
+
+    def test_set_get(self):
+        self.database.command_set('key', self.value)
+        self.values.append(self.database.command_get('key') == self.value)
+        self.values.append(self.database.command_strlen('key'))
+        self.values.append(self.database.command_mget('key', 'missing') ==
+                [self.value, None])
+        self.values.append(len(self.storage.keys))
+        self.assertEqual(self.values, [True, len(self.value), True, 6])
+
+    def test_getrange(self):
+        self.database.command_set('key', self.value)
+        for start, end in ((0, -1), (10, 20), (CHUNK_SIZE - 5,
+                    CHUNK_SIZE + 5), (-50, -1), (-50, -10), (5, 1),
+                    (0, 10 * CHUNK_SIZE)):
+            stop = None if end == -1 else end + 1
+            self.values.append(self.database.command_getrange('key', start,
+                        end) == self.value[start:stop])
+        self.assertEqual(self.values, [True] * 7)
+
+    def test_append(self):
+        self.values.append(self.database.command_append('key', 'abc'))
+        expected = 'abc'
+        for i in range(0, 5):
+            chunk = str(i) * (CHUNK_SIZE / 2 + 7)
+            expected += chunk
+            self.values.append(self.database.command_append('key', chunk) ==
+                    len(expected))
+        self.values.append(self.database.command_get('key') == expected)
+        self.values.append(self.database.command_strlen('key'))
+        self.assertEqual(self.values, [3] + [True] * 6 + [len(expected)])
+
+        # a value filling whole chunks
+        self.values = []
+        self.database.command_set('key', 'a' * 2 * CHUNK_SIZE)
+        self.values.append(self.database.command_append('key', 'xyz'))
+        self.values.append(self.database.command_get('key') ==
+                'a' * 2 * CHUNK_SIZE + 'xyz')
+        self.values.append(self.database.command_getrange('key', -5, -1))
+        self.values.append(self.database.command_setrange('key',
+                    3 * CHUNK_SIZE, 'end'))
+        self.values.append(self.database.command_getrange('key',
+                    3 * CHUNK_SIZE - 1, -1))
+        self.assertEqual(self.values, [2 * CHUNK_SIZE + 3, True, 'aaxyz',
+                3 * CHUNK_SIZE + 3, '\0end'])
+
+    def test_setrange(self):
+        self.database.command_set('key', self.value)
+        expected = self.value
+        for start, value in ((10, 'xyz'), (CHUNK_SIZE - 1, 'ab'),
+                (len(self.value) - 1, 'tail'), (len(expected) + 10, 'far'),
+                (3 * CHUNK_SIZE, '')):
+            if value:
+                expected = expected.ljust(start, '\0')
+            expected = expected[:start] + value + \
+                    expected[start + len(value):]
+            self.values.append(self.database.command_setrange('key', start,
+                        value) == len(expected))
+        self.values.append(self.database.command_get('key') == expected)
+        self.assertEqual(self.values, [True] * 6)
+
+    def test_setrange_grows_inline(self):
+        self.database.command_set('key', 'hello')
+        self.values.append(self.database.command_setrange('key', CHUNK_SIZE,
+                    'world'))
+        self.values.append(self.database.command_getrange('key', -5, -1))
+        self.values.append(self.database.command_getrange('key', 0, 6))
+        self.assertEqual(self.values, [CHUNK_SIZE + 5, 'world',
+                'hello\0\0'])
+
+    def test_overwrite_and_delete(self):
+        self.database.command_set('key', self.value)
+        self.database.command_set('key', 'small')
+        self.values.append(self.database.command_get('key'))
+        self.values.append(self.database.command_setbit('key', 0, '1'))
+        self.database.command_set('key', self.value)
+        self.values.append(self.database.command_del('key'))
+        self.values.append(len(self.storage.keys))
+        self.assertEqual(self.values, ['small', 5, 1, 1])
+
+    def test_bitmap_on_chunked(self):
+        self.database.command_set('key', '\xff' * (CHUNK_SIZE + 1))
+        self.values.append(self.database.command_bitcount('key'))
+        self.values.append(self.database.command_setbit('key', 0, '0'))
+        self.values.append(self.database.command_bitcount('key'))
+        self.values.append(len(self.storage.keys))
+        self.assertEqual(self.values, [8 * (CHUNK_SIZE + 1), CHUNK_SIZE + 1,
+                8 * (CHUNK_SIZE + 1) - 1, 3])
+
+    def test_unlink_is_lazy(self):
+        self.database.command_set('key', self.value)
+        self.database.lazyfree_batch = 1
+        self.database.command_unlink('key')
+        self.values.append(self.database.lazyfree_stats()['pending_objects'])
+        self.database.command_set('small', 'value')
+        self.database.lazyfree_flush()
+        self.database.command_unlink('small')
+        self.values.append(self.database.lazyfree_stats()['pending_objects'])
+        self.values.append(len(self.storage.keys))
+        self.assertEqual(self.values, [1, 0, 1])
@@ -0,0 +1,171 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from ..locking import RWLock, StripedLocks
+from ..threadsafe import ThreadSafeColoradoes
+from ..storage import aof, sqlite
+from ..storage.memory import Storage
+
+THREADS = 8
+ITERATIONS = 200
+
+
+class TestThreadSafe(unittest.TestCase):
+    def setUp(self):
+        super(TestThreadSafe, self).setUp()
+        self.database = ThreadSafeColoradoes(Storage())
+        self.values = []
+
+    def _run(self, target):
+        threads = [threading.Thread(target=target, args=(i, ))
+                for i in range(0, THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_incr(self):
+        def work(i):
+            for _ in range(0, ITERATIONS):
+                self.database.command_incr('counter')
+                self.database.command_incr('counter%d' % i)
+        self._run(work)
+        self.values.append(self.database.command_get('counter'))
+        self.values.append(self.database.command_get('counter3'))
+        self.assertEqual(self.values, [str(THREADS * ITERATIONS),
+                str(ITERATIONS)])
+
+    def test_unique_ids(self):
+        def work(i):
+            for j in range(0, ITERATIONS):
+                self.database.command_sadd('set%d-%d' % (i, j), 'member')
+        self._run(work)
+        ids = set()
+        for i in range(0, THREADS):
+            for j in range(0, ITERATIONS):
+                ids.add(self.database.get_key('set%d-%d' % (i, j))[0])
+        self.values.append(len(ids))
+        self.assertEqual(self.values, [THREADS * ITERATIONS])
+
+    def test_hash(self):
+        def work(i):
+            for j in range(0, ITERATIONS):
+                self.database.command_hset('hash', '%d-%d' % (i, j), str(j))
+        self._run(work)
+        self.values.append(self.database.command_hlen('hash'))
+        self.values.append(len(self.database.command_hkeys('hash')))
+        self.assertEqual(self.values, [THREADS * ITERATIONS] * 2)
+
+    def test_select_per_thread(self):
+        def work(i):
+            self.database.command_select(i)
+            for _ in range(0, ITERATIONS):
+                self.database.command_incr('counter')
+        self._run(work)
+        for i in range(0, THREADS):
+            self.database.command_select(i)
+            self.values.append(self.database.command_get('counter'))
+        self.assertEqual(self.values, [str(ITERATIONS)] * THREADS)
+
+    def test_pipeline(self):
+        def work(i):
+            for _ in range(0, ITERATIONS / 10):
+                pipeline = self.database.pipeline()
+                pipeline.command_incr('a').command_incr('b')
+                pipeline.execute()
+        self._run(work)
+        self.values.append(self.database.command_mget('a', 'b'))
+        self.assertEqual(self.values, [[str(THREADS * ITERATIONS / 10)] * 2])
+
+
+class TestDurability(unittest.TestCase):
+    # every write must be committed once its command returns, whatever the
+    # other threads are doing
+    def setUp(self):
+        super(TestDurability, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data')
+        self.values = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(TestDurability, self).tearDown()
+
+    def _run(self, database, committed):
+        def work(i):
+            for j in range(0, ITERATIONS / 10):
+                value = 'value-%d-%d' % (i, j)
+                database.command_set('key%d' % i, value)
+                if not committed(value):
+                    self.values.append(value)
+        threads = [threading.Thread(target=work, args=(i, ))
+                for i in range(0, THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.values, [])
+
+    def test_sqlite(self):
+        storage = sqlite.Storage(self.path)
+        local = threading.local()
+
+        def committed(value):
+            # read through a connection of its own
+            if not hasattr(local, 'connection'):
+                local.connection = sqlite3.connect(self.path)
+            return local.connection.execute('SELECT 1 FROM storage WHERE '
+                    'value = ?', (buffer(value), )).fetchone() is not None
+        try:
+            self._run(ThreadSafeColoradoes(storage), committed)
+        finally:
+            storage.close()
+
+    def test_aof(self):
+        storage = aof.Storage(self.path, fsync='no')
+
+        def committed(value):
+            with open(self.path, 'rb') as fp:
+                return value in fp.read()
+        try:
+            self._run(ThreadSafeColoradoes(storage), committed)
+        finally:
+            storage.close()
+
+
+class TestLocks(unittest.TestCase):
+    def test_concurrent_readers(self):
+        lock = RWLock()
+        lock.acquire_read()
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(
+                    lock.acquire_read()))
+        thread.start()
+        thread.join(1)
+        self.assertEqual(len(acquired), 1)
+
+    def test_writer_excludes(self):
+        lock = RWLock()
+        lock.acquire_read()
+        acquired = []
+        thread = threading.Thread(target=lambda: acquired.append(
+                    lock.acquire_write()))
+        thread.daemon = True
+        thread.start()
+        thread.join(0.1)
+        self.assertEqual(acquired, [])
+        lock.release_read()
+        thread.join(1)
+        self.assertEqual(len(acquired), 1)
+
+    def test_striped_release(self):
+        locks = StripedLocks(4)
+        with locks.acquire(['a', 'b', 'c'], True):
+            pass
+        held = locks.acquire_all()
+        self.assertEqual(len(held.locks), 4)
+        held.release()
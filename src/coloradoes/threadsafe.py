@@ -0,0 +1,132 @@
+import threading
+import time
+
+from .coloradoes import Coloradoes
+from .commands import COMMANDS
+from .locking import StripedLocks, Synchronized, SynchronizedTransactions
+
+
+def _local_property(name, default):
+    def getter(self):
+        return getattr(self.local, name, default)
+
+    def setter(self, value):
+        setattr(self.local, name, value)
+    return property(getter, setter)
+
+
+class ThreadSafeColoradoes(Coloradoes):
+    # A Coloradoes that can be shared by many threads, each one behaving as
+    # a separate client with its own selected database.
+    # Commands lock their keys, as reported by the command registry, in a
+    # set of striped RWLocks: commands on different keys and read commands
+    # on the same keys run concurrently, writes to a key are serialized.
+    # Storage calls are serialized; on storages batching the writes of
+    # every thread in one transaction, whole commands are, so each one is
+    # committed when it returns. IDs are allocated under a lock and
+    # eviction, active expiration and lazy freeing run between commands
+    # with every stripe locked.
+    database = _local_property('database', 0)
+    call_depth = _local_property('call_depth', 0)
+    locked = _local_property('locked', False)
+
+    def __init__(self, storage=None, lock_stripes=256, **kwargs):
+        self.local = threading.local()
+        self.locks = StripedLocks(lock_stripes)
+        self.id_lock = threading.Lock()
+        self.housekeeping_lock = threading.Lock()
+        if storage is not None and storage.transactional:
+            storage = SynchronizedTransactions(storage)
+        elif storage is not None:
+            storage = Synchronized(storage)
+        super(ThreadSafeColoradoes, self).__init__(storage, **kwargs)
+        if self.evictor is not None:
+            self.evictor = Synchronized(self.evictor)
+
+    def get_ids(self, count):
+        with self.id_lock:
+            return super(ThreadSafeColoradoes, self).get_ids(count)
+
+    def evict(self):
+        if self.locked:
+            # deferred until the keys of the running command are released
+            return 0
+        used = self.used_memory()
+        if used is None or used <= self.maxmemory:
+            return 0
+        return self._exclusive(super(ThreadSafeColoradoes, self).evict) or 0
+
+    def _cron(self):
+        if self.locked:
+            return
+        due = self.lazyfree_queue or (self.active_expire_hz > 0 and
+                time.time() - self.last_expire_cycle >=
+                1.0 / self.active_expire_hz)
+        if due:
+            self._exclusive(super(ThreadSafeColoradoes, self)._cron)
+
+    def _exclusive(self, func):
+        # only one thread does the housekeeping, the others carry on
+        if not self.housekeeping_lock.acquire(False):
+            return None
+        try:
+            with self.locks.acquire_all():
+                self.storage.begin()
+                try:
+                    return func()
+                finally:
+                    self.storage.commit()
+        finally:
+            self.housekeeping_lock.release()
+
+    def execute(self, name, *args, **kwargs):
+        command = COMMANDS.get(name)
+        if self.call_depth > 0 or command is None or \
+                not command.check_arity(len(args)):
+            # nested commands run under the locks of the outer one
+            return super(ThreadSafeColoradoes, self).execute(name, *args,
+                    **kwargs)
+        if self.evictor is not None:
+            self.evict()
+        database = self.database
+        locks = self.locks.acquire([(database, key)
+                for key in command.keys(args)], command.write)
+        self.locked = True
+        try:
+            return super(ThreadSafeColoradoes, self).execute(name, *args,
+                    **kwargs)
+        finally:
+            self.locked = False
+            locks.release()
+            self._cron()
+
+    def execute_many(self, commands, watched=None):
+        if self.call_depth > 0:
+            return super(ThreadSafeColoradoes, self).execute_many(commands,
+                    watched)
+        if self.evictor is not None:
+            # eviction is deferred while the batch holds its locks
+            self.evict()
+        # the whole batch runs under the locks of every key it touches,
+        # including the watched ones so they cannot change in between
+        items = list(watched or ())
+        write = False
+        database = self.database
+        for name, args, _ in commands:
+            command = COMMANDS.get(name)
+            if command is None:
+                continue
+            if name == 'select':
+                database = int(args[0]) if args else database
+                continue
+            items.extend((database, key) for key in command.keys(args))
+            write = write or command.write
+        locks = self.locks.acquire(items, write)
+        self.locked = True
+        try:
+            return super(ThreadSafeColoradoes, self).execute_many(commands,
+                    watched)
+        finally:
+            self.locked = False
+            locks.release()
+            self._cron()
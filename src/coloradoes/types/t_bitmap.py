@@ -0,0 +1,295 @@
+from binascii import hexlify, unhexlify
+import re
+
+from ..errors import *
+from ..storage import to_bytes
+from .t_string import TYPE, _read, _str_key, _view, _write
+
+# Bitmaps are strings. Whole values are handled at C speed: bits are counted
+# by translating every byte into its number of set bits and bitwise
+# operations run on the values read as big integers. Writes modify a
+# bytearray copy of the value, which is always stored inline and kept as it
+# is by memory storages, so further writes to the same bitmap happen in
+# place.
+
+# byte -> number of bits set in it
+POPCOUNT = ''.join(chr(bin(i).count('1')) for i in range(0, 256))
+MAX_BIT_OFFSET = (512 << 20) * 8 - 1
+BITFIELD_TYPE = re.compile(r'^([iu])(\d+)$')
+
+OVERFLOW_WRAP = 'WRAP'
+OVERFLOW_SAT = 'SAT'
+OVERFLOW_FAIL = 'FAIL'
+
+def _get(db, key):
+    # Returns (string id, memoryview of the value), a missing key being an
+    # empty bitmap
+    id, type = db.get_key(key)[:2]
+    if id is None:
+        return None, memoryview('')
+    if type != TYPE:
+        raise ValueError(WRONG_TYPE)
+    return id, _view(db, id)
+
+def _load(db, key):
+    # Returns (string id, bytearray ready to be modified in place, whether
+    # the value is chunked)
+    id, type = db.get_key(key)[:2]
+    if id is None:
+        return None, bytearray(), False
+    if type != TYPE:
+        raise ValueError(WRONG_TYPE)
+    value = db.get(_str_key(db, id))
+    chunked = value is None
+    if chunked:
+        value = _read(db, id)
+    if not isinstance(value, bytearray):
+        value = bytearray(to_bytes(value))
+    return id, value, chunked
+
+def _store(db, key, id, value, chunked=False):
+    if id is None:
+        id = db.set_key(key, TYPE, check=False)
+    _write(db, id, value, chunked=chunked, inline=True)
+
+def _extend(value, length):
+    # Values only grow through a copy: the storage accounts for their size
+    # when they are set, so a stored bytearray must not be resized behind
+    # its back
+    if len(value) >= length:
+        return value
+    return value + bytearray(length - len(value))
+
+def _bit_offset(offset):
+    try:
+        offset = int(offset)
+    except ValueError:
+        raise ValueError(INVALID_BIT_OFFSET)
+    if offset < 0 or offset > MAX_BIT_OFFSET:
+        raise ValueError(INVALID_BIT_OFFSET)
+    return offset
+
+def _bit(value):
+    if str(value) not in ('0', '1'):
+        raise ValueError(INVALID_BIT_VALUE)
+    return int(value)
+
+def _byte_range(length, start, end):
+    # Redis style inclusive range with negative indexes, as a slice
+    start, end = int(start), int(end)
+    if start < 0:
+        start = max(0, start + length)
+    if end < 0:
+        end += length
+    end = min(end, length - 1)
+    if start > end:
+        return 0, 0
+    return start, end + 1
+
+def _to_int(data):
+    return int(hexlify(data), 16) if len(data) else 0
+
+def _from_int(number, length):
+    return bytearray(unhexlify('%0*x' % (length * 2, number))) if length \
+            else bytearray()
+
+def command_bitcount(db, key, start=None, end=None):
+    if start is not None and end is None:
+        raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format('BITCOUNT'))
+    view = _get(db, key)[1]
+    if start is not None:
+        start, end = _byte_range(len(view), start, end)
+        view = view[start:end]
+    return sum(bytearray(view.tobytes().translate(POPCOUNT)))
+
+def command_bitop(db, operation, destkey, *keys):
+    op = operation.upper()
+    if op == 'NOT':
+        if len(keys) != 1:
+            raise ValueError(SINGLE_SOURCE_KEY.format('BITOP NOT'))
+    elif op not in ('AND', 'OR', 'XOR'):
+        raise ValueError(SYNTAX_ERROR)
+
+    values = [_get(db, key)[1] for key in keys]
+    length = max(len(value) for value in values)
+    result = None
+    for value in values:
+        # shorter values are padded with zero bytes on the right
+        number = _to_int(value) << ((length - len(value)) * 8)
+        if result is None:
+            result = number
+        elif op == 'AND':
+            result &= number
+        elif op == 'OR':
+            result |= number
+        else:
+            result ^= number
+    if op == 'NOT':
+        result ^= (1 << (length * 8)) - 1
+
+    if length == 0:
+        db.command_del(destkey)
+        return 0
+    id, type = db.get_key(destkey)[:2]
+    if id is not None:
+        db.delete_key(destkey, id=id, type=type)
+    _store(db, destkey, None, _from_int(result, length))
+    return length
+
+def command_getbit(db, key, offset):
+    offset = _bit_offset(offset)
+    view = _get(db, key)[1]
+    byte = offset >> 3
+    if byte >= len(view):
+        return 0
+    return (ord(view[byte]) >> (7 - (offset & 7))) & 1
+
+def command_setbit(db, key, offset, onoff):
+    offset = _bit_offset(offset)
+    bit = _bit(onoff)
+    id, value, chunked = _load(db, key)
+    byte = offset >> 3
+    value = _extend(value, byte + 1)
+    mask = 1 << (7 - (offset & 7))
+    if bit:
+        value[byte] |= mask
+    else:
+        value[byte] &= ~mask & 0xff
+    _store(db, key, id, value, chunked)
+    return len(value)
+
+def command_bitpos(db, key, bit, start=None, end=None):
+    bit = _bit(bit)
+    view = _get(db, key)[1]
+    length = len(view)
+    if start is None:
+        first, last = 0, length
+    else:
+        first, last = _byte_range(length, start, -1 if end is None else end)
+    data = view[first:last].tobytes()
+    # skip the bytes that cannot hold the bit at C speed
+    skip = len(data) - len(data.lstrip('\xff' if bit == 0 else '\0'))
+    if skip == len(data):
+        if bit == 0 and end is None and (start is None or first < last):
+            # without an end the string is considered padded with zeros on
+            # the right
+            return last * 8
+        return -1
+    byte = ord(data[skip])
+    if bit == 0:
+        byte = ~byte & 0xff
+    # position of the highest set bit of the byte
+    return (first + skip) * 8 + 8 - byte.bit_length()
+
+def _bitfield_type(type):
+    match = BITFIELD_TYPE.match(type.lower())
+    if match is None:
+        raise ValueError(INVALID_BITFIELD_TYPE)
+    signed = match.group(1) == 'i'
+    bits = int(match.group(2))
+    if bits < 1 or (signed and bits > 64) or (not signed and bits > 63):
+        raise ValueError(INVALID_BITFIELD_TYPE)
+    return signed, bits
+
+def _bitfield_offset(offset, bits):
+    # "#n" addresses the n-th field of the given width
+    if offset.startswith('#'):
+        return _bit_offset(int(offset[1:]) * bits)
+    return _bit_offset(offset)
+
+def _read_field(data, offset, bits, signed):
+    first = offset >> 3
+    last = (offset + bits - 1) >> 3
+    chunk = data[first:last + 1]
+    if len(chunk) < last - first + 1:
+        # missing bytes read as zeros
+        chunk = to_bytes(chunk) + '\0' * (last - first + 1 - len(chunk))
+    number = _to_int(chunk)
+    shift = (last + 1) * 8 - (offset + bits)
+    number = (number >> shift) & ((1 << bits) - 1)
+    if signed and number >> (bits - 1):
+        number -= 1 << bits
+    return number
+
+def _write_field(value, offset, bits, number):
+    first = offset >> 3
+    last = (offset + bits - 1) >> 3
+    width = last - first + 1
+    shift = (last + 1) * 8 - (offset + bits)
+    mask = ((1 << bits) - 1) << shift
+    current = _to_int(value[first:last + 1])
+    current = (current & ~mask) | ((number << shift) & mask)
+    value[first:last + 1] = _from_int(current, width)
+
+def _overflow(number, bits, signed, policy):
+    # Returns the value to store, or None when the operation must fail
+    if signed:
+        low, high = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    else:
+        low, high = 0, (1 << bits) - 1
+    if low <= number <= high:
+        return number
+    if policy == OVERFLOW_FAIL:
+        return None
+    if policy == OVERFLOW_SAT:
+        return high if number > high else low
+    number &= (1 << bits) - 1
+    if signed and number >> (bits - 1):
+        number -= 1 << bits
+    return number
+
+def command_bitfield(db, key, *args):
+    # Parse everything first so a syntax error changes nothing
+    operations = []
+    policy = OVERFLOW_WRAP
+    arguments = list(args)
+    i = 0
+    try:
+        while i < len(arguments):
+            op = arguments[i].upper()
+            if op == 'OVERFLOW':
+                policy = arguments[i + 1].upper()
+                if policy not in (OVERFLOW_WRAP, OVERFLOW_SAT, OVERFLOW_FAIL):
+                    raise ValueError(SYNTAX_ERROR)
+                i += 2
+                continue
+            if op not in ('GET', 'SET', 'INCRBY'):
+                raise ValueError(SYNTAX_ERROR)
+            signed, bits = _bitfield_type(arguments[i + 1])
+            offset = _bitfield_offset(str(arguments[i + 2]), bits)
+            if op == 'GET':
+                operations.append((op, signed, bits, offset, None, policy))
+                i += 3
+            else:
+                try:
+                    number = int(arguments[i + 3])
+                except ValueError:
+                    raise ValueError(NOT_AN_INTEGER)
+                operations.append((op, signed, bits, offset, number, policy))
+                i += 4
+    except IndexError:
+        raise ValueError(SYNTAX_ERROR)
+
+    if all(operation[0] == 'GET' for operation in operations):
+        view = _get(db, key)[1]
+        return [_read_field(view, offset, bits, signed)
+                for _, signed, bits, offset, _, _ in operations]
+
+    id, value, chunked = _load(db, key)
+    value = _extend(value, max((offset + bits + 7) >> 3
+            for op, _, bits, offset, _, _ in operations if op != 'GET'))
+    replies = []
+    for op, signed, bits, offset, number, policy in operations:
+        current = _read_field(value, offset, bits, signed)
+        if op == 'GET':
+            replies.append(current)
+            continue
+        new = _overflow(number if op == 'SET' else current + number, bits,
+                signed, policy)
+        if new is None:
+            replies.append(None)
+            continue
+        _write_field(value, offset, bits, new)
+        replies.append(current if op == 'SET' else new)
+    _store(db, key, id, value, chunked)
+    return replies
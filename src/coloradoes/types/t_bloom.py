@@ -0,0 +1,197 @@
+from hashlib import md5
+import math
+import struct
+
+from ..errors import *
+from ..storage import to_bytes
+
+# Scalable Bloom filters. A filter is a chain of sub-filters, each one a
+# packed bit array stored as a single record; once the last one holds its
+# capacity a new one, expansion times larger and with a tighter error rate,
+# is added, so the error rate of the whole chain stays bounded. The info
+# record holds the error rate and expansion of the filter followed by the
+# capacity, number of items, number of bits and number of hashes of every
+# sub-filter. Items are hashed once and probed with double hashing in every
+# sub-filter.
+
+TYPE = 'B'
+STRUCT_BLOOM = '!ici'
+STRUCT_BLOOM_INFO = '!dI'
+STRUCT_SUB_FILTER = '!QQQB'
+STRUCT_SUB_FILTER_KEY = '!I'
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_CAPACITY = 100
+DEFAULT_EXPANSION = 2
+# error rate of every sub-filter relative to the previous one
+TIGHTENING_RATIO = 0.5
+
+def _bloom_key(db, id):
+    return struct.pack(STRUCT_BLOOM, db.database, TYPE, id)
+
+def _bits_key(db, id, n):
+    return _bloom_key(db, id) + 'F' + struct.pack(STRUCT_SUB_FILTER_KEY, n)
+
+def _get_info(db, id):
+    # Returns (error rate, expansion, sub-filters), every sub-filter being a
+    # [capacity, items, bits, hashes] list; an expansion of 0 means the
+    # filter does not scale
+    data = to_bytes(db.get(_bloom_key(db, id)))
+    start = struct.calcsize(STRUCT_BLOOM_INFO)
+    size = struct.calcsize(STRUCT_SUB_FILTER)
+    error_rate, expansion = struct.unpack(STRUCT_BLOOM_INFO, data[:start])
+    filters = [list(struct.unpack(STRUCT_SUB_FILTER, data[i:i + size]))
+            for i in xrange(start, len(data), size)]
+    return error_rate, expansion, filters
+
+def _set_info(db, id, error_rate, expansion, filters):
+    db.set(_bloom_key(db, id), struct.pack(STRUCT_BLOOM_INFO, error_rate,
+                expansion) + ''.join(struct.pack(STRUCT_SUB_FILTER, *f)
+                for f in filters))
+
+def _sub_filter(capacity, error_rate):
+    # [capacity, items, bits, hashes] of an optimal filter
+    bits = int(math.ceil(-capacity * math.log(error_rate) /
+                (math.log(2) ** 2)))
+    # whole bytes
+    bits = max(8, (bits + 7) & ~7)
+    hashes = max(1, int(math.ceil(-math.log(error_rate, 2))))
+    return [capacity, 0, bits, hashes]
+
+def _create(db, key, error_rate, capacity, expansion):
+    id = db.set_key(key, TYPE, check=False)
+    filters = [_sub_filter(capacity, error_rate)]
+    _set_info(db, id, error_rate, expansion, filters)
+    db.set(_bits_key(db, id, 0), bytearray(filters[0][2] >> 3))
+    return id
+
+def _get_id(db, key):
+    id, type = db.get_key(key)[:2]
+    if type not in (None, TYPE):
+        raise ValueError(WRONG_TYPE)
+    return id
+
+def _hashes(item):
+    # the two hashes every probe position derives from
+    h1, h2 = struct.unpack('<QQ', md5(to_bytes(item)).digest())
+    return h1, h2 | 1
+
+def _positions(hashes, bits, count):
+    h1, h2 = hashes
+    return [(h1 + i * h2) % bits for i in xrange(0, count)]
+
+def _contains(data, positions):
+    for position in positions:
+        if not data[position >> 3] & (1 << (position & 7)):
+            return False
+    return True
+
+def _load_bits(db, id, filters):
+    # bytearrays ready to be modified in place, one per sub-filter
+    bits = []
+    for data in db.get_many([_bits_key(db, id, n)
+            for n in xrange(0, len(filters))]):
+        if not isinstance(data, bytearray):
+            data = bytearray(to_bytes(data))
+        bits.append(data)
+    return bits
+
+def _exists(db, key, items):
+    id = _get_id(db, key)
+    if id is None:
+        return [0] * len(items)
+    filters = _get_info(db, id)[2]
+    bits = _load_bits(db, id, filters)
+    result = []
+    for item in items:
+        hashes = _hashes(item)
+        result.append(int(any(_contains(data, _positions(hashes, f[2], f[3]))
+                    for f, data in zip(filters, bits))))
+    return result
+
+def _add(db, key, items):
+    # Returns 1 for every item added and 0 for the ones that may have been
+    # there already, or the error when a non scaling filter is full
+    id = _get_id(db, key)
+    if id is None:
+        id = _create(db, key, DEFAULT_ERROR_RATE, DEFAULT_CAPACITY,
+                DEFAULT_EXPANSION)
+    error_rate, expansion, filters = _get_info(db, id)
+    bits = _load_bits(db, id, filters)
+    changed = set()
+    result = []
+    for item in items:
+        hashes = _hashes(item)
+        if any(_contains(data, _positions(hashes, f[2], f[3]))
+                for f, data in zip(filters, bits)):
+            result.append(0)
+            continue
+        last = filters[-1]
+        if last[1] >= last[0]:
+            if expansion == 0:
+                result.append(ValueError(FILTER_FULL))
+                continue
+            last = _sub_filter(last[0] * expansion, error_rate *
+                    TIGHTENING_RATIO ** len(filters))
+            filters.append(last)
+            bits.append(bytearray(last[2] >> 3))
+        data = bits[-1]
+        for position in _positions(hashes, last[2], last[3]):
+            data[position >> 3] |= 1 << (position & 7)
+        last[1] += 1
+        changed.add(len(filters) - 1)
+        result.append(1)
+    if changed:
+        _set_info(db, id, error_rate, expansion, filters)
+        db.set_many((_bits_key(db, id, n), bits[n]) for n in sorted(changed))
+    return result
+
+def command_bf_reserve(db, key, error_rate, capacity, *args):
+    try:
+        error_rate = float(error_rate)
+    except ValueError:
+        raise ValueError(INVALID_ERROR_RATE)
+    if not 0 < error_rate < 1:
+        raise ValueError(INVALID_ERROR_RATE)
+    try:
+        capacity = int(capacity)
+    except ValueError:
+        raise ValueError(INVALID_CAPACITY)
+    if capacity <= 0:
+        raise ValueError(INVALID_CAPACITY)
+    expansion = DEFAULT_EXPANSION
+    arguments = [str(arg) for arg in args]
+    i = 0
+    while i < len(arguments):
+        option = arguments[i].upper()
+        if option == 'NONSCALING':
+            expansion = 0
+            i += 1
+        elif option == 'EXPANSION' and i + 1 < len(arguments):
+            try:
+                expansion = int(arguments[i + 1])
+            except ValueError:
+                raise ValueError(NOT_AN_INTEGER)
+            if expansion < 1:
+                raise ValueError(NOT_AN_INTEGER)
+            i += 2
+        else:
+            raise ValueError(SYNTAX_ERROR)
+    if _get_id(db, key) is not None:
+        raise ValueError(ITEM_EXISTS)
+    _create(db, key, error_rate, capacity, expansion)
+    return True
+
+def command_bf_add(db, key, item):
+    result = _add(db, key, [item])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def command_bf_madd(db, key, *items):
+    return _add(db, key, items)
+
+def command_bf_exists(db, key, item):
+    return _exists(db, key, [item])[0]
+
+def command_bf_mexists(db, key, *items):
+    return _exists(db, key, items)
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import struct
 
 from ..errors import *
@@ -51,6 +52,14 @@ def _position(db, id, field):
 def _contains(db, id, field):
     return _position(db, id, field) is not None
 
+def _fields(db, id):
+    # A single scan over the field records, ordered by their stored position
+    prefix = _hash_field_key(db, id, '')
+    start = len(prefix)
+    entries = sorted((data[:4], key[start:], data[4:])
+            for key, data in db.scan(prefix))
+    return [(field, value) for _, field, value in entries]
+
 def command_hset(db, key, field, value, id=None, replace=True):
     if id is None:
         id, type = db.get_key(key)[:2]
@@ -66,6 +75,9 @@ def command_hset(db, key, field, value, id=None, replace=True):
             position = _get_info(db, id)['cardinality']
         elif not replace:
             return False
+        else:
+            _add(db, id, position, field, value)
+            return True
 
     _set_info(db, id, position + 1)
     _add(db, id, position, field, value)
@@ -102,17 +114,18 @@ def command_hdel(db, key, *args, **kwargs):
         position = _position(db, id, field)
         if position is not None:
             last_position = cardinality - del_count - 1
-            if position == last_position:
-                # is the last element
-                last_field = field
-                db.delete(_hash_field_key(db, id, last_field))
-            else:
+            db.delete(_hash_field_key(db, id, field))
+            if position != last_position:
                 # copy the last element to replace the one to delete
                 last_field = db.get(_hash_index_key(db, id, last_position))
                 last_value = db.get(_hash_field_key(db, id, last_field))[4:]
                 _add(db, id, position, last_field, last_value)
             db.delete(_hash_index_key(db, id, last_position))
             del_count += 1
+    if del_count == cardinality:
+        db.delete_key(key, id=id, type=TYPE)
+    elif del_count > 0:
+        _set_info(db, id, cardinality - del_count)
     return del_count
 
 def command_hexists(db, key, field):
@@ -131,11 +144,8 @@ def command_hgetall(db, key):
     elif type != TYPE:
         raise ValueError(WRONG_TYPE)
 
-    cardinality = _get_info(db, id)['cardinality']
     retval = []
-    for position in range(0, cardinality):
-        field = db.get(_hash_index_key(db, id, position))
-        value = db.get(_hash_field_key(db, id, field))[4:]
+    for field, value in _fields(db, id):
         retval.extend((field, value))
     return retval
 
@@ -178,12 +188,7 @@ def command_hkeys(db, key):
     elif type != TYPE:
         raise ValueError(WRONG_TYPE)
 
-    cardinality = _get_info(db, id)['cardinality']
-    retval = []
-    for position in range(0, cardinality):
-        field = db.get(_hash_index_key(db, id, position))
-        retval.append(field)
-    return retval
+    return [field for field, _ in _fields(db, id)]
 
 def command_hlen(db, key):
     id, type = db.get_key(key)[:2]
@@ -201,11 +206,8 @@ def command_hmget(db, key, *args):
     elif type != TYPE:
         raise ValueError(WRONG_TYPE)
 
-    retval = []
-    for field in args:
-        data = db.get(_hash_field_key(db, id, field))
-        retval.append(None if data is None else data[4:])
-    return retval
+    return [None if data is None else data[4:] for data in
+            db.get_many([_hash_field_key(db, id, field) for field in args])]
 
 def command_hmset(db, key, *args):
     id, type = db.get_key(key)[:2]
@@ -215,13 +217,29 @@ def command_hmset(db, key, *args):
     if len(args) % 2 != 0:
         raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format('hmset'))
 
-    arguments = list(args)
-    while len(arguments) > 0:
-        field = arguments.pop(0)
-        value = arguments.pop(0)
-        command_hset(db, key, field, value, id=id)
-        if id is None:
-            id = db.get_key(key)[0]
+    fields = OrderedDict(zip(args[::2], args[1::2]))
+    if id is None:
+        id = db.set_key(key, TYPE)
+        cardinality = 0
+        positions = [None] * len(fields)
+    else:
+        cardinality = _get_info(db, id)['cardinality']
+        positions = db.get_many([_hash_field_key(db, id, field)
+                for field in fields])
+
+    records = []
+    for (field, value), data in zip(fields.items(), positions):
+        if data is None:
+            position = cardinality
+            cardinality += 1
+            records.append((_hash_index_key(db, id, position), field))
+        else:
+            position, = struct.unpack(STRUCT_KEY_HASH_VALUE, data[:4])
+        records.append((_hash_field_key(db, id, field),
+                struct.pack(STRUCT_KEY_HASH_VALUE, position) + value))
+    records.append((_hash_key(db, id),
+            struct.pack(STRUCT_KEY_HASH_VALUE, cardinality)))
+    db.set_many(records)
     return True
 
 def command_hvals(db, key):
@@ -231,10 +249,4 @@ def command_hvals(db, key):
     elif type != TYPE:
         raise ValueError(WRONG_TYPE)
 
-    cardinality = _get_info(db, id)['cardinality']
-    retval = []
-    for position in range(0, cardinality):
-        field = db.get(_hash_index_key(db, id, position))
-        value = db.get(_hash_field_key(db, id, field))[4:]
-        retval.append(value)
-    return retval
+    return [value for _, value in _fields(db, id)]
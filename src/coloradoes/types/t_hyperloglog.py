@@ -0,0 +1,225 @@
+from binascii import hexlify, unhexlify
+from hashlib import md5
+import math
+import struct
+
+from ..errors import *
+from ..storage import to_bytes
+from .t_string import TYPE, _str_key
+
+# HyperLogLogs are strings, like in Redis: a header holding the encoding and
+# the cached cardinality, followed by the registers. Small counters use the
+# sparse encoding, the (index, value) pairs of the registers that are not
+# zero; once it grows over SPARSE_MAX_BYTES it becomes dense, one byte per
+# register. A dense counter is handled as the bytearray of the whole string,
+# which memory storages keep as it is, so adding to it changes its registers
+# in place; merging and counting run over all the registers at once.
+
+P = 14
+REGISTERS = 1 << P
+# bits of the hash left for the run of zeros
+Q = 64 - P
+ALPHA_INF = 0.5 / math.log(2)
+
+MAGIC = 'HYLL'
+DENSE = 'D'
+SPARSE = 'S'
+STRUCT_HEADER = '!4scq'
+HEADER_SIZE = struct.calcsize(STRUCT_HEADER)
+STRUCT_SPARSE = '!HB'
+SPARSE_SIZE = struct.calcsize(STRUCT_SPARSE)
+SPARSE_MAX_BYTES = 3000
+# cached cardinality of a counter changed since it was last counted
+STALE = -1
+# the high bit of every register of a dense counter read as an integer
+HIGH_BITS = int('80' * REGISTERS, 16)
+
+def _register(element):
+    # Returns (register index, length of the run of zeros plus one)
+    hash, = struct.unpack('<Q', md5(to_bytes(element)).digest()[:8])
+    index = hash & (REGISTERS - 1)
+    hash = (hash >> P) | (1 << Q)
+    return index, (hash & -hash).bit_length()
+
+def _decode(value):
+    # Returns (registers, cached cardinality), registers being a dict for
+    # sparse counters and the bytearray of the whole string for dense ones
+    try:
+        magic, encoding, cardinality = struct.unpack_from(STRUCT_HEADER,
+                value)
+    except (struct.error, TypeError):
+        raise ValueError(INVALID_HLL)
+    if magic != MAGIC:
+        raise ValueError(INVALID_HLL)
+    if encoding == DENSE and len(value) == HEADER_SIZE + REGISTERS:
+        if not isinstance(value, bytearray):
+            value = bytearray(to_bytes(value))
+        return value, cardinality
+    data = to_bytes(value)[HEADER_SIZE:]
+    if encoding == SPARSE and len(data) % SPARSE_SIZE == 0:
+        registers = {}
+        for i in xrange(0, len(data), SPARSE_SIZE):
+            index, count = struct.unpack_from(STRUCT_SPARSE, data, i)
+            registers[index] = count
+        return registers, cardinality
+    raise ValueError(INVALID_HLL)
+
+def _encode(registers, cardinality=STALE):
+    if isinstance(registers, dict):
+        if len(registers) * SPARSE_SIZE <= SPARSE_MAX_BYTES:
+            return struct.pack(STRUCT_HEADER, MAGIC, SPARSE, cardinality) + \
+                    ''.join(struct.pack(STRUCT_SPARSE, index, count)
+                            for index, count in sorted(registers.iteritems()))
+        registers = _dense(registers)
+    # only the header changes, the registers are not copied
+    struct.pack_into(STRUCT_HEADER, registers, 0, MAGIC, DENSE, cardinality)
+    return registers
+
+def _dense(registers):
+    dense = bytearray(HEADER_SIZE + REGISTERS)
+    for index, count in registers.iteritems():
+        dense[HEADER_SIZE + index] = count
+    return dense
+
+def _load(db, key):
+    # Returns (string id, registers, cached cardinality), a missing key
+    # being an empty sparse counter
+    id, type = db.get_key(key)[:2]
+    if id is None:
+        return None, {}, 0
+    if type != TYPE:
+        raise ValueError(WRONG_TYPE)
+    value = db.get(_str_key(db, id))
+    if value is None:
+        # a chunked string is far larger than any counter
+        raise ValueError(INVALID_HLL)
+    registers, cardinality = _decode(value)
+    return id, registers, cardinality
+
+def _store(db, key, id, registers, cardinality=STALE):
+    if id is None:
+        id = db.set_key(key, TYPE, check=False)
+    db.set(_str_key(db, id), _encode(registers, cardinality))
+
+def _to_int(dense):
+    return int(hexlify(buffer(dense, HEADER_SIZE)), 16)
+
+def _from_int(number):
+    return bytearray(HEADER_SIZE) + unhexlify('%0*x' % (REGISTERS * 2,
+                number))
+
+def _max(a, b):
+    # Register by register maximum of two dense counters read as integers:
+    # registers are below 0x80, so a register with its high bit set minus
+    # the other one keeps that bit, without borrowing from its neighbour,
+    # exactly when it is not lower
+    mask = ((((a | HIGH_BITS) - b) & HIGH_BITS) >> 7) * 0xff
+    return (a & mask) | (b & ~mask)
+
+def _merge(counters):
+    # Returns the registers of the union of the counters, without changing
+    # them
+    dense = [registers for registers in counters
+            if not isinstance(registers, dict)]
+    sparse = [registers for registers in counters
+            if isinstance(registers, dict)]
+    if dense:
+        number = _to_int(dense[0])
+        for registers in dense[1:]:
+            number = _max(number, _to_int(registers))
+        merged = _from_int(number)
+        for registers in sparse:
+            for index, count in registers.iteritems():
+                if count > merged[HEADER_SIZE + index]:
+                    merged[HEADER_SIZE + index] = count
+        return merged
+    merged = {}
+    for registers in sparse:
+        for index, count in registers.iteritems():
+            if count > merged.get(index, 0):
+                merged[index] = count
+    return merged
+
+def _histogram(registers):
+    # number of registers by value
+    if isinstance(registers, dict):
+        histogram = [0] * (Q + 2)
+        for count in registers.itervalues():
+            histogram[count] += 1
+        histogram[0] = REGISTERS - len(registers)
+        return histogram
+    return [registers.count(chr(count), HEADER_SIZE)
+            for count in xrange(0, Q + 2)]
+
+def _sigma(x):
+    if x == 1.0:
+        return float('inf')
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+def _tau(x):
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == previous:
+            return z / 3.0
+
+def _estimate(registers):
+    # Ertl's improved raw estimator, as used by Redis: no bias correction
+    # tables nor switch to linear counting are needed
+    histogram = _histogram(registers)
+    m = float(REGISTERS)
+    z = m * _tau((m - histogram[Q + 1]) / m)
+    for count in xrange(Q, 0, -1):
+        z += histogram[count]
+        z *= 0.5
+    z += m * _sigma(histogram[0] / m)
+    return int(round(ALPHA_INF * m * m / z))
+
+def command_pfadd(db, key, *elements):
+    id, registers, cardinality = _load(db, key)
+    changed = id is None
+    for element in elements:
+        index, count = _register(element)
+        if isinstance(registers, dict):
+            if count > registers.get(index, 0):
+                registers[index] = count
+                changed = True
+        elif count > registers[HEADER_SIZE + index]:
+            registers[HEADER_SIZE + index] = count
+            changed = True
+    if changed:
+        _store(db, key, id, registers)
+    return int(changed)
+
+def command_pfcount(db, key, *keys):
+    if not keys:
+        id, registers, cardinality = _load(db, key)
+        if id is None:
+            return 0
+        if cardinality == STALE:
+            # counted once until the next change
+            cardinality = _estimate(registers)
+            _store(db, key, id, registers, cardinality)
+        return cardinality
+    # the union of several counters is counted, not stored
+    return _estimate(_merge([_load(db, k)[1] for k in (key, ) + keys]))
+
+def command_pfmerge(db, destkey, *sourcekeys):
+    id, registers, _ = _load(db, destkey)
+    _store(db, destkey, id, _merge([registers] + [_load(db, key)[1]
+                for key in sourcekeys]))
+    return True
@@ -0,0 +1,59 @@
+import time
+
+from ..errors import *
+
+# names reported by TYPE, by type code
+TYPE_NAMES = {
+    'S': 'string',
+    'L': 'list',
+    'T': 'set',
+    'Z': 'zset',
+    'H': 'hash',
+    'B': 'MBbloom--',
+}
+
+
+def command_select(db, database):
+    d = int(database)
+    if d >= 0 and d < 17:
+        db.set_database(d)
+        return True
+    else:
+        raise ValueError(INVALID_DB_INDEX)
+
+
+def command_type(db, key):
+    type = db.get_key(key)[1]
+    if type is None:
+        return 'none'
+    if type not in TYPE_NAMES:
+        raise Exception('Unknown type "%s"' % type)
+    return TYPE_NAMES[type]
+
+
+def command_expire(db, key, seconds):
+    return int(db.set_expire(key, time.time() + float(seconds)))
+
+
+def command_pexpire(db, key, milliseconds):
+    return int(db.set_expire(key, time.time() +
+                float(milliseconds) / 1000.0))
+
+
+def command_expireat(db, key, timestamp):
+    return int(db.set_expire(key, float(timestamp)))
+
+
+def command_persist(db, key):
+    if db.get_key(key)[2] is None:
+        return 0
+    return int(db.set_expire(key, None))
+
+
+def command_pttl(db, key):
+    id, _, expire = db.get_key(key)
+    if id is None:
+        return -2
+    if expire is None:
+        return -1
+    return max(0, int((expire - time.time()) * 1000))
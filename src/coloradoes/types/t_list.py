@@ -111,7 +111,7 @@ def command_lrange(db, key, _start, _end):
         return []
     left, right = _get_pos(start, info), _get_pos(end, info)
 
-    return [db.get(_key(db, id, i)) for i in range(left, right + 1)]
+    return db.get_many([_key(db, id, i) for i in range(left, right + 1)])
 
 def command_lindex(db, key, _index):
     id, type = db.get_key(key)[:2]
@@ -139,8 +139,10 @@ def command_linsert(db, key, position, pivot, value):
     pos = int(position.upper() == 'AFTER')
     info = _get_info(db, id)
 
-    for i in range(info['left'], info['right'] + 1):
-        if db.get(_key(db, id, i)) == pivot:
+    positions = range(info['left'], info['right'] + 1)
+    values = db.get_many([_key(db, id, i) for i in positions])
+    for i, current in zip(positions, values):
+        if current == pivot:
             for j in range(info['left'], i + pos):
                 db.rename(_key(db, id, j), _key(db, id, j - 1))
             db.set(_key(db, id, i + pos - 1), value)
@@ -185,9 +187,10 @@ def command_lrem(db, key, _count, value):
     sign = 1 if count >= 0 else -1
     target = sign * count
 
-    for pos in lookup:
+    values = db.get_many([_key(db, id, pos) for pos in lookup])
+    for pos, current in zip(lookup, values):
         key = _key(db, id, pos)
-        if db.get(key) == value and (target > deleted or target == 0):
+        if current == value and (target > deleted or target == 0):
             deleted += 1
         elif deleted > 0:
             db.rename(key, _key(db, id, pos - sign * deleted))
@@ -226,8 +229,6 @@ def command_ltrim(db, key, _start, _end):
         db.delete_key(key, id=id, type=type)
         return
     left, right = _get_pos(start, info), _get_pos(end, info)
-    for i in range(info['left'], left):
-        db.delete(_key(db, id, i))
-    for i in range(right + 1, info['right'] + 1):
-        db.delete(_key(db, id, i))
+    db.delete_many([_key(db, id, i) for i in range(info['left'], left)] +
+            [_key(db, id, i) for i in range(right + 1, info['right'] + 1)])
     _set_info(db, id, left, right)
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import random
 import struct
 
@@ -35,13 +36,14 @@ def _set_info(db, id, cardinality):
     assert cardinality > 0
     db.set(_set_key(db, id), struct.pack(STRUCT_KEY_SET_VALUE, cardinality))
 
-def _add(db, id, position, value):
-    db.set(_set_key(db, id, position), value)
-    db.set(_set_element_key(db, id, value), position)
-
 def _get(db, id, position):
     return db.get(_set_key(db, id, position))
 
+def _members(db, id):
+    # Index records sort by position, so one prefix scan returns them in order
+    prefix = struct.pack(STRUCT_SET_ELEMENT_PREFIX, db.database, TYPE, id, 'I')
+    return [value for _, value in db.scan(prefix)]
+
 def _position(db, id, value):
     pos = db.get(_set_element_key(db, id, value))
     if pos is None:
@@ -58,28 +60,32 @@ def command_sadd(db, key, *args, **kwargs):
         if type not in (None, TYPE):
             raise ValueError(WRONG_TYPE)
 
-    members = set(args)
+    members = list(OrderedDict.fromkeys(args))
 
-    added = 0
     info = _get_info(db, id)
     if info is None:
+        if len(members) == 0:
+            return 0
         id = db.set_key(key, TYPE)
-        _add(db, id, 0, members.pop())
-        cardinality = 1
-        added += 1
+        cardinality = 0
     else:
         cardinality = info['cardinality']
+        positions = db.get_many([_set_element_key(db, id, member)
+                for member in members])
+        members = [member for member, position in zip(members, positions)
+                if position is None]
+        if len(members) == 0:
+            return 0
 
+    records = []
     for member in members:
-        if _contains(db, id, member):
-            continue
-        _add(db, id, cardinality, member)
+        records.append((_set_key(db, id, cardinality), member))
+        records.append((_set_element_key(db, id, member), cardinality))
         cardinality += 1
-        added += 1
-
-    if added != 0:
-        _set_info(db, id, cardinality)
-    return added
+    records.append((_set_key(db, id),
+            struct.pack(STRUCT_KEY_SET_VALUE, cardinality)))
+    db.set_many(records)
+    return len(members)
 
 def command_smembers(db, key, id=None):
     if id is None:
@@ -88,9 +94,8 @@ def command_smembers(db, key, id=None):
             return []
         elif type != TYPE:
             raise ValueError(WRONG_TYPE)
-    info = _get_info(db, id)
 
-    return [_get(db, id, i) for i in range(0, info['cardinality'])]
+    return _members(db, id)
 
 def command_scard(db, key):
     id, type = db.get_key(key)[:2]
@@ -121,8 +126,9 @@ def command_srandmember(db, key, _count=1):
     if count == 1:
         return _get(db, id, random.randint(0, cardinality - 1))
     elif count >= cardinality:
-        return [_get(db, id, i) for i in range(0, cardinality)]
-    return [_get(db, id, i) for i in random.sample(xrange(cardinality), count)]
+        return _members(db, id)
+    return db.get_many([_set_key(db, id, i)
+            for i in random.sample(xrange(cardinality), count)])
 
 def command_spop(db, key, _count=1):
     id, type = db.get_key(key)[:2]
@@ -171,9 +177,17 @@ def command_srem(db, key, *args, **kwargs):
         if pos is not None:
             found += 1
             db.delete(element_key)
-            db.rename(_set_key(db, id, cardinality - found),
-                    _set_key(db, id, int(pos)))
-    if found > 0:
+            last = cardinality - found
+            if last != int(pos):
+                # move the last element into the freed position
+                moved = _get(db, id, last)
+                db.rename(_set_key(db, id, last), _set_key(db, id, int(pos)))
+                db.set(_set_element_key(db, id, moved), int(pos))
+            else:
+                db.delete(_set_key(db, id, last))
+    if found == cardinality:
+        db.delete_key(key, id=id, type=TYPE)
+    elif found > 0:
         _set_info(db, id, cardinality - found)
     return found
 
@@ -202,7 +216,7 @@ def _fetch_keys_data(db, *args, **kwargs):
         id, type = db.get_key(key)[:2]
         if type is None:
             if include_empty:
-                keys.append(key, None, None, 0)
+                keys.append((key, None, None, 0))
             continue
         if type != TYPE:
             raise ValueError(WRONG_TYPE)
@@ -210,6 +224,22 @@ def _fetch_keys_data(db, *args, **kwargs):
         keys.append((key, id, type, info['cardinality']))
     return keys
 
+def _filter(db, id, values, contained):
+    # Keep the values whose membership in set `id` is `contained`, probing
+    # all of them with a single batched fetch
+    positions = db.get_many([_set_element_key(db, id, value)
+            for value in values])
+    return [value for value, position in zip(values, positions)
+            if (position is not None) == contained]
+
+def _store(db, destination, members):
+    if destination is None:
+        return members
+    db.command_del(destination)
+    if len(members) == 0:
+        return 0
+    return command_sadd(db, destination, *members)
+
 def command_sunion(db, *args):
     retval = set()
     for key in args:
@@ -217,98 +247,46 @@ def command_sunion(db, *args):
     return list(retval)
 
 def command_sunionstore(db, destination, *args):
-    db.command_del(destination)
-    keys = _fetch_keys_data(db, *args)
-
-    destination_id = None
-    for (key, id, type, cardinality) in keys:
-        for i in range(0, cardinality):
-            command_sadd(db, destination, _get(db, id, i), id=destination_id)
-            # was it created by this SADD call?
-            if destination_id is None:
-                destination_id = db.get_key(destination)[0]
-
-def _is_inter(db, value, keys):
-    for (key, _id, type, _) in keys:
-        if not _contains(db, _id, value):
-            return False
-    return True
+    return _store(db, destination, command_sunion(db, *args))
 
 def _sinter(db, *args, **kwargs):
     destination = kwargs.get('destination', None)
     keys = _fetch_keys_data(db, *args, include_empty=True)
 
-    if destination is None:
-        retval = []
-    else:
-        retval = 0
-
-    if len(keys) == 0:
-        return retval
-
-    # Sort sets from the smallest to largest, this will improve our
-    # algorithm's performance
-    keys = sorted(keys, cmp=lambda x, y: cmp(x[3], y[3]))
-    (_, id, _, cardinality) = keys.pop(0)
-    destination_id = None
-
-    for i in range(0, cardinality):
-        value = _get(db, id, i)
-        if _is_inter(db, value, keys):
-            if destination is None:
-                retval.append(value)
-            else:
-                retval += command_sadd(db, destination, value,
-                        id=destination_id)
-                if destination_id is None:
-                    destination_id = db.get_key(destination)[0]
-    return retval
+    retval = []
+    if len(keys) > 0 and all(key[3] > 0 for key in keys):
+        # Sort sets from the smallest to largest, this will improve our
+        # algorithm's performance
+        keys = sorted(keys, key=lambda x: x[3])
+        retval = _members(db, keys[0][1])
+        for (_, id, _, _) in keys[1:]:
+            if len(retval) == 0:
+                break
+            retval = _filter(db, id, retval, True)
+    return _store(db, destination, retval)
 
 def command_sinter(db, *args):
     return _sinter(db, *args)
 
 def command_sinterstore(db, destination, *args):
-    db.command_del(destination)
     return _sinter(db, *args, destination=destination)
 
 def _sdiff(db, key, *args, **kwargs):
     destination = kwargs.get('destination', None)
-    if destination is None:
-        retval = []
-    else:
-        retval = 0
 
     id, type = db.get_key(key)[:2]
-    if type is None:
-        return retval
-    elif type != TYPE:
+    if type not in (None, TYPE):
         raise ValueError(WRONG_TYPE)
 
-    info = _get_info(db, id)
-    cardinality = info['cardinality']
-
-    keys = _fetch_keys_data(db, *args, include_empty=False)
-    destination_id = None
-    for i in range(0, cardinality):
-        value = _get(db, id, i)
-        contained = False
-        for (key, _id, type, _) in keys:
-            if _contains(db, _id, value):
-                contained = True
-                break
-        if not contained:
-            if destination is None:
-                retval.append(value)
-            else:
-                retval += command_sadd(db, destination, value,
-                        id=destination_id)
-                if destination_id is None:
-                    destination_id = db.get_key(destination)[0]
-    return retval
+    retval = [] if type is None else _members(db, id)
+    for (_, _id, _, _) in _fetch_keys_data(db, *args):
+        if len(retval) == 0:
+            break
+        retval = _filter(db, _id, retval, False)
+    return _store(db, destination, retval)
 
 def command_sdiff(db, key, *args):
     return _sdiff(db, key, *args)
 
 def command_sdiffstore(db, destination, key, *args):
-    db.command_del(destination)
     return _sdiff(db, key, *args, destination=destination)
@@ -1,209 +1,374 @@
+import math
 import struct
 import time
 
 from ..errors import *
+from ..storage import prefix_end, to_bytes
 
+TYPE = 'S'
+MIN_INTEGER = -(1 << 63)
+MAX_INTEGER = (1 << 63) - 1
 STRUCT_STRING = '!ici'
+STRUCT_CHUNK = '!I'
+CHUNK_SIZE = 64 << 10
 
 def _str_key(db, id):
-    return struct.pack(STRUCT_STRING, db.database, 'S', id)
+    return struct.pack(STRUCT_STRING, db.database, TYPE, id)
+
+def _to_str(value):
+    # storages may hand back numbers, bytearrays or memoryviews
+    return None if value is None else to_bytes(value)
+
+# Values up to CHUNK_SIZE bytes are stored inline, as a single record under
+# the string key. Longer values are split in CHUNK_SIZE chunks stored under
+# the string key followed by 'C' and the chunk number, with the total length
+# under the string key followed by 'L', so appends and ranges only read and
+# write the chunks they touch.
+
+def _length_key(str_key):
+    return str_key + 'L'
+
+def _chunk_key(str_key, n):
+    return str_key + 'C' + struct.pack(STRUCT_CHUNK, n)
+
+def _chunks(db, str_key, first, last):
+    # bytes of chunks first to last included; the chunk after the last one
+    # of a value filling whole chunks is missing and reads as empty
+    return ''.join(to_bytes(chunk) for chunk in db.get_many(
+            [_chunk_key(str_key, n) for n in range(first, last + 1)])
+            if chunk is not None)
+
+def _write_chunks(db, str_key, data, first):
+    # writes data starting at the beginning of chunk `first`
+    db.set_many((_chunk_key(str_key, first + i // CHUNK_SIZE),
+            data[i:i + CHUNK_SIZE]) for i in range(0, len(data), CHUNK_SIZE))
+
+def _is_large(value):
+    return isinstance(value, (str, bytearray)) and len(value) > CHUNK_SIZE
+
+def _read(db, id):
+    # the whole value, inline values being returned as stored
+    str_key = _str_key(db, id)
+    value = db.get(str_key)
+    if value is not None:
+        return value
+    length = db.get(_length_key(str_key))
+    if length is None:
+        return None
+    return _chunks(db, str_key, 0, (int(length) - 1) // CHUNK_SIZE)
+
+def _view(db, id):
+    view = db.get_view(_str_key(db, id))
+    if view is None:
+        view = memoryview(_read(db, id) or '')
+    return view
+
+def _length(db, str_key):
+    # None for inline values
+    length = db.get(_length_key(str_key))
+    return None if length is None else int(length)
+
+def _write(db, id, value, chunked=None, inline=False):
+    # Replaces the value, chunked tells whether the current one is chunked
+    # and inline forces the inline encoding
+    str_key = _str_key(db, id)
+    if chunked is None:
+        chunked = db.exists(_length_key(str_key))
+    if chunked:
+        chunk_prefix = str_key + 'C'
+        db.delete_range(chunk_prefix, prefix_end(chunk_prefix))
+        db.delete(_length_key(str_key))
+    if inline or not _is_large(value):
+        db.set(str_key, value)
+        return
+    if not chunked:
+        db.delete(str_key)
+    _write_chunks(db, str_key, value, 0)
+    db.set(_length_key(str_key), len(value))
 
 def command_setex(db, key, ttl, value):
-    return command_set(db, key, value, expire=time.time() + float(ttl))
+    return _set(db, key, value, expire=time.time() + float(ttl))
 
 def command_psetex(db, key, ttl, value):
-    return command_set(db, key, value, expire=time.time() +
-            (float(ttl) / 1000.0))
+    return _set(db, key, value, expire=time.time() + (float(ttl) / 1000.0))
 
 def command_ttl(db, key):
     return db.get_key(key)[2]
 
 def command_setnx(db, key, value):
-    return command_set(db, key, value, replace=False)
+    return _set(db, key, value, replace=False)
 
-def command_set(db, key, value, expire=None, replace=True):
+def _set(db, key, value, expire=None, replace=True, create=True):
+    # replace allows overwriting an existing key, create setting a missing
+    # one; returns whether the value was set
     old_id, old_type = db.get_key(key)[:2]
     if old_id is not None:
         if not replace:
             return False
         db.delete_key(key, id=old_id, type=old_type)
-    id = db.set_key(key, 'S', expire=expire)
-    db.set(_str_key(db, id), value)
+    elif not create:
+        return False
+    id = db.set_key(key, TYPE, expire=expire, check=False)
+    _write(db, id, value, chunked=False)
     return True
 
+def _set_options(args):
+    # Parses the EX/PX/NX/XX options of SET, before anything is changed
+    expire = None
+    replace = create = True
+    i = 0
+    while i < len(args):
+        option = str(args[i]).upper()
+        if option in ('EX', 'PX') and expire is None and i + 1 < len(args):
+            try:
+                ttl = int(args[i + 1])
+            except ValueError:
+                raise ValueError(NOT_AN_INTEGER)
+            if ttl <= 0:
+                raise ValueError(INVALID_EXPIRE_TIME.format('set'))
+            expire = time.time() + (ttl if option == 'EX' else ttl / 1000.0)
+            i += 2
+        elif option == 'NX' and create:
+            replace = False
+            i += 1
+        elif option == 'XX' and replace:
+            create = False
+            i += 1
+        else:
+            raise ValueError(SYNTAX_ERROR)
+    return expire, replace, create
+
+def command_set(db, key, value, *args):
+    # None when NX or XX prevented the value from being set
+    expire, replace, create = _set_options(args)
+    return True if _set(db, key, value, expire, replace, create) else None
+
 def command_get(db, key):
     id, type = db.get_key(key)[:2]
     if id is None:
         return None
-    if type != 'S':
+    if type != TYPE:
         raise ValueError(WRONG_TYPE)
-    return db.get(_str_key(db, id))
+    return _to_str(_read(db, id))
 
-def command_del(db, *args):
+def command_del(db, *args, **kwargs):
+    lazy = kwargs.get('lazy', None)
     deleted = 0
     for key in args:
         id, type = db.get_key(key)[:2]
         if id is not None:
-            db.delete_key(key, id=id, type=type)
+            db.delete_key(key, id=id, type=type, lazy=lazy)
             deleted += 1
     return deleted
 
+def command_unlink(db, *args):
+    return command_del(db, *args, lazy=True)
+
 def command_append(db, key, value):
     id, type = db.get_key(key)[:2]
     if id is None:
-        return command_set(db, key, value)
-    if type != 'S':
+        _set(db, key, value)
+        return len(value)
+    if type != TYPE:
         raise ValueError(WRONG_TYPE)
     str_key = _str_key(db, id)
-    old_value = db.get(db, str_key)
-    new_value = old_value + value
-    db.set(str_key, new_value)
-    return len(new_value)
+    length = _length(db, str_key)
+    if length is None:
+        new_value = to_bytes(db.get(str_key)) + value
+        _write(db, id, new_value, chunked=False)
+        return len(new_value)
+    # rewrite the tail chunk and add the ones that follow
+    tail = length // CHUNK_SIZE
+    data = _chunks(db, str_key, tail, tail) + value
+    _write_chunks(db, str_key, data, tail)
+    db.set(_length_key(str_key), length + len(value))
+    return length + len(value)
 
 def command_getrange(db, key, start=0, end=-1):
     id, type = db.get_key(key)[:2]
     if id is None:
         return ''
-    if type != 'S':
+    if type != TYPE:
         raise ValueError(WRONG_TYPE)
-    if end == -1:
-        end = None
-    else:
-        end += 1
-    return db.get(_str_key(db, id))[start:end]
+    start, end = int(start), int(end)
+    end = None if end == -1 else end + 1
+    str_key = _str_key(db, id)
+    view = db.get_view(str_key)
+    if view is not None:
+        # slice a view so only the requested bytes are copied
+        return view[start:end].tobytes()
+    start, end, _ = slice(start, end).indices(_length(db, str_key))
+    if start >= end:
+        return ''
+    first = start // CHUNK_SIZE
+    data = _chunks(db, str_key, first, (end - 1) // CHUNK_SIZE)
+    offset = first * CHUNK_SIZE
+    return data[start - offset:end - offset]
 
 def command_setrange(db, key, start, value):
     id, type = db.get_key(key)[:2]
     if id is None:
         return ''
-    if type != 'S':
+    if type != TYPE:
         raise ValueError(WRONG_TYPE)
+    start = int(start)
     str_key = _str_key(db, id)
-    old_value = db.get(str_key)
-    new_value = old_value[:start] + value + old_value[start + len(value):]
-    db.set(str_key, new_value)
-    return len(new_value)
+    length = _length(db, str_key)
+    if not value:
+        # nothing is written, not even the padding up to start
+        return len(db.get(str_key)) if length is None else length
+    if length is None:
+        old_value = to_bytes(db.get(str_key)).ljust(start, '\0')
+        new_value = old_value[:start] + value + old_value[start + len(value):]
+        _write(db, id, new_value, chunked=False)
+        return len(new_value)
+    # rewrite the chunks from the one holding start, or the current end of
+    # the value when start is past it, to the one holding the last byte
+    first = min(start, length) // CHUNK_SIZE
+    offset = first * CHUNK_SIZE
+    end = start + len(value)
+    data = _chunks(db, str_key, first, (min(end, length) - 1) // CHUNK_SIZE)
+    data = data.ljust(start - offset, '\0')
+    data = data[:start - offset] + value + data[end - offset:]
+    _write_chunks(db, str_key, data, first)
+    if end > length:
+        db.set(_length_key(str_key), end)
+        return end
+    return length
 
 def command_getset(db, key, value):
     old_value = command_get(db, key)
-    command_set(db, key, value)
+    _set(db, key, value)
     return old_value
 
-def command_incrby(db, key, increment):
+# Integer counters are stored as native ints, which memory storages keep as
+# they are: an increment is one read and one write of the value record and
+# the number is only turned into a string when read as one. Floats are
+# stored formatted, so every command sees the same digits.
+
+def _as_int(value):
+    if isinstance(value, (int, long)):
+        return value
+    try:
+        return int(to_bytes(value))
+    except ValueError:
+        raise ValueError(NOT_AN_INTEGER)
+
+def _as_float(value):
+    if isinstance(value, (int, long, float)):
+        return float(value)
+    try:
+        return float(to_bytes(value))
+    except ValueError:
+        raise ValueError(NOT_A_FLOAT)
+
+def _format_float(value):
+    value = repr(value)
+    return value[:-2] if value.endswith('.0') else value
+
+def _increment(db, key, increment, convert):
     id, type = db.get_key(key)[:2]
     if id is None:
-        command_set(db, key, int(increment))
-        return str(increment)
-    if type != 'S':
+        value = increment
+    elif type != TYPE:
         raise ValueError(WRONG_TYPE)
-    return str(db.increment_by(_str_key(db, id), int(increment)))
+    else:
+        str_key = _str_key(db, id)
+        value = convert(db.get(str_key)) + increment
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            raise ValueError(INVALID_FLOAT_INCREMENT)
+        value = _format_float(value)
+    elif not MIN_INTEGER <= value <= MAX_INTEGER:
+        raise ValueError(INCREMENT_OVERFLOW)
+    if id is None:
+        str_key = _str_key(db, db.set_key(key, TYPE, check=False))
+    db.set(str_key, value)
+    return value
+
+def command_incrby(db, key, increment):
+    return str(_increment(db, key, _as_int(increment), _as_int))
 
 def command_incr(db, key):
-    return command_incrby(db, key, 1)
+    return str(_increment(db, key, 1, _as_int))
 
 def command_decr(db, key):
-    return command_incrby(db, key, -1)
+    return str(_increment(db, key, -1, _as_int))
 
 def command_decrby(db, key, decrement):
-    return command_incrby(db, key, -int(decrement))
+    return str(_increment(db, key, -_as_int(decrement), _as_int))
 
 def command_incrbyfloat(db, key, increment):
+    return _increment(db, key, _as_float(increment), _as_float)
+
+def command_strlen(db, key):
     id, type = db.get_key(key)[:2]
     if id is None:
-        command_set(db, key, float(increment))
-        return str(increment)
-    if type != 'S':
+        return 0
+    if type != TYPE:
         raise ValueError(WRONG_TYPE)
-    return str(db.increment_by(_str_key(db, id), float(increment)))
-
-def command_strlen(db, key):
-    return len(command_get(db, key) or '')
+    str_key = _str_key(db, id)
+    view = db.get_view(str_key)
+    if view is None:
+        return _length(db, str_key)
+    return len(view)
 
 def command_mget(db, *args):
-    return [command_get(db, key) for key in args]
+    entries = db.get_keys(args)
+    ids = []
+    for id, type, _ in entries:
+        if type not in (None, TYPE):
+            raise ValueError(WRONG_TYPE)
+        if id is not None:
+            ids.append(id)
+    values = iter(db.get_many([_str_key(db, id) for id in ids]))
+    result = []
+    for id, _, _ in entries:
+        if id is None:
+            result.append(None)
+            continue
+        value = next(values)
+        if value is None:
+            # chunked
+            value = _read(db, id)
+        result.append(_to_str(value))
+    return result
+
+def _mset(db, args, replace):
+    # Sets every pair at once: the keys are looked up together, the new ones
+    # get their ids in one go and the values are written with a single
+    # storage call. Without replace nothing is set if any key exists.
+    values = {}
+    keys = []
+    for i in xrange(0, len(args), 2):
+        key = args[i]
+        if key not in values:
+            keys.append(key)
+        # the last value of a repeated key wins
+        values[key] = args[i + 1]
+    existing = [(key, id, type) for key, (id, type, _) in
+            zip(keys, db.get_keys(keys)) if id is not None]
+    if existing and not replace:
+        return False
+    if existing:
+        db.delete_keys(existing)
+    records = []
+    for key, id in zip(keys, db.set_keys(keys, TYPE)):
+        value = values[key]
+        if _is_large(value):
+            _write(db, id, value, chunked=False)
+        else:
+            records.append((_str_key(db, id), value))
+    db.set_many(records)
+    return True
 
-def command_mset(db, *args, **kwargs):
+def command_mset(db, *args):
     if len(args) % 2 == 1:
         raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format('MSET'))
-    replace = kwargs.get('replace', True)
-    arguments = list(args)  # copy
-    response = 0
-    while len(arguments) > 0:
-        key = arguments.pop(0)
-        value = arguments.pop(0)
-        response += int(command_set(db, key, value, replace=replace))
-    return response
+    _mset(db, args, True)
+    return len(args) // 2
 
 def command_msetnx(db, *args):
     if len(args) % 2 == 1:
         raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format('MSETNX'))
-    return command_mset(db, *args, replace=False)
-
-def command_bitcount(db, key, start=None, end=None):
-    if start is not None and end is None:
-        raise ValueError(WRONG_NUMBER_OF_ARGUMENTS.format('BITCOUNT'))
-    if start is None:
-        content = command_get(db, key)
-    else:
-        content = command_getrange(db, key, start, end)
-
-    if not content:
-        return 0
-
-    total = 0
-    for byte in content:
-        total += bin(ord(byte)).count('1')
-    return total
-
-def command_bitop(db, operation, destkey, *keys):
-    op = operation.upper()
-    if op == 'NOT':
-        if len(keys) != 1:
-            raise ValueError(SINGLE_SOURCE_KEY.format('BITOP NOT'))
-    elif op not in ('AND', 'OR', 'XOR'):
-        raise ValueError(SYNTAX_ERROR)
-
-    values = [command_get(db, key) for key in keys]
-    length = max((lambda x: len(x) if x else 0)(x) for x in values)
-    result = None
-    for value in values:
-        v = value.ljust(length, '\0')
-        if result is None:
-            result = v
-        else:
-            new_result = ''
-            for i in range(0, length):
-                if op == 'AND':
-                    new_result += chr(ord(result[i]) & ord(v[i]))
-                elif op == 'OR':
-                    new_result += chr(ord(result[i]) | ord(v[i]))
-                elif op == 'XOR':
-                    new_result += chr(ord(result[i]) ^ ord(v[i]))
-            result = new_result
-    if op == 'NOT':
-        result = ''.join((chr((~ord(c) + 256) % 256) for c in result))
-    command_set(db, destkey, result)
-
-    return length
-
-def command_getbit(db, key, offset):
-    bitoffset = int(offset)
-    value = command_get(db, key)
-    byte = bitoffset >> 3
-    bit = 7 - (bitoffset & 0x7)
-    if len(value) <= byte:
-        return 0
-    return int(bool((ord(value[byte]) & (1 << bit))))
-
-def command_setbit(db, key, offset, onoff):
-    bitoffset = int(offset)
-    value = command_get(db, key)
-    byte = bitoffset >> 3
-    bit = 7 - (bitoffset & 0x7)
-    if onoff == '1':
-        new_char = chr(ord(value[byte]) | (1 << bit))
-    else:
-        new_char = chr((ord(value[byte]) & ~(1 << bit)) % 256)
-    new_value = new_char.join((value[:byte], value[byte + 1:]))
-    command_set(db, key, new_value)
-    return len(new_value)
+    return int(_mset(db, args, False))
@@ -3,7 +3,7 @@ import struct
 
 from ..errors import *
 
-TYPE = 'T'
+TYPE = 'Z'
 STRUCT_ZSET_SCORE = '!d'
 STRUCT_ZSET_ITEM_COUNT = '!i'
 STRUCT_ZSET_VALUE = '!ici'
@@ -120,14 +120,19 @@ def command_zrange(db, key, start, end, withscores=''):
         if found:
             end_pos += 1
 
+    scores = [struct.unpack(STRUCT_ZSET_SCORE, data[i * 8:(i + 1) * 8])[0]
+            for i in range(start_pos, end_pos)]
+    counts = db.get_many([_zset_key_score(db, id, score) for score in scores])
+    positions = []
+    for score, count in zip(scores, counts):
+        items_in_score, = struct.unpack(STRUCT_ZSET_ITEM_COUNT, count)
+        positions.extend((score, j) for j in range(0, items_in_score))
+    members = db.get_many([_zset_key_score_position(db, id, score, j)
+            for score, j in positions])
+
     retval = []
-    for i in range(start_pos, end_pos):
-        print (i * 8, (i + 1) * 8)
-        score = struct.unpack(STRUCT_ZSET_SCORE, data[i * 8:(i + 1) * 8])[0]
-        items_in_score, = struct.unpack(STRUCT_ZSET_ITEM_COUNT,
-                db.get(_zset_key_score(db, id, score)))
-        for j in range(0, items_in_score):
-            retval.append(db.get(_zset_key_score_position(db, id, score, j)))
-            if withscores:
-                retval.append(str(score))
+    for (score, _), member in zip(positions, members):
+        retval.append(member)
+        if withscores:
+            retval.append(str(score))
     return retval